@@ -0,0 +1,126 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime
+
+from models import async_client, update_token_usage
+from config import ANALYSIS_RESULTS_FILE, ANALYSIS_BATCHES_FILE, ANALYSIS_BATCH_SIZE, ANALYSIS_POLL_INTERVAL
+
+class AnalysisQueue:
+    """
+    Offline queue for execution analyses that nobody waits on.
+
+    Requests are collected locally and submitted through the Message Batches
+    API, which is billed at a reduced rate. Submitted batch ids are persisted
+    so results can still be collected after a restart; finished results are
+    appended to a JSONL results store keyed by custom_id.
+    """
+
+    def __init__(self, results_file=ANALYSIS_RESULTS_FILE, batches_file=ANALYSIS_BATCHES_FILE,
+                 batch_size=ANALYSIS_BATCH_SIZE, poll_interval=ANALYSIS_POLL_INTERVAL, client=None):
+        self.results_file = results_file
+        self.batches_file = batches_file
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.client = client or async_client
+        self.pending = []
+        self.submitted = self._load_batches()
+        self._flush_task = None
+
+    def _load_batches(self):
+        try:
+            with open(self.batches_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_batches(self):
+        os.makedirs(os.path.dirname(self.batches_file) or ".", exist_ok=True)
+        tmp_file = self.batches_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.submitted, f)
+        os.replace(tmp_file, self.batches_file)
+
+    def enqueue(self, params, metadata=None):
+        custom_id = f"analysis-{uuid.uuid4().hex[:16]}"
+        self.pending.append({"custom_id": custom_id, "params": params, "metadata": metadata or {}})
+        if len(self.pending) >= self.batch_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+        return custom_id
+
+    async def flush(self):
+        """Submit everything pending as one batch. Returns the batch id, or None if nothing was pending."""
+        if not self.pending:
+            return None
+        pending, self.pending = self.pending, []
+        try:
+            batch = await self.client.messages.batches.create(
+                requests=[{"custom_id": item["custom_id"], "params": item["params"]} for item in pending]
+            )
+        except Exception:
+            # Put the requests back so a later flush can retry them
+            self.pending = pending + self.pending
+            raise
+        self.submitted[batch.id] = {
+            "submitted_at": datetime.now().isoformat(),
+            "metadata": {item["custom_id"]: item["metadata"] for item in pending},
+        }
+        self._save_batches()
+        return batch.id
+
+    async def _store_results(self, batch_id):
+        metadata = self.submitted[batch_id]["metadata"]
+        os.makedirs(os.path.dirname(self.results_file) or ".", exist_ok=True)
+        count = 0
+        with open(self.results_file, 'a', encoding='utf-8') as f:
+            async for entry in await self.client.messages.batches.results(batch_id):
+                record = {
+                    "custom_id": entry.custom_id,
+                    "batch_id": batch_id,
+                    "status": entry.result.type,
+                    "metadata": metadata.get(entry.custom_id, {}),
+                }
+                if entry.result.type == "succeeded":
+                    message = entry.result.message
+                    record["text"] = "".join(block.text for block in message.content if block.type == "text")
+                    update_token_usage("code_execution_batch", message.usage.input_tokens, message.usage.output_tokens, model=message.model)
+                elif entry.result.type == "errored":
+                    record["error"] = str(entry.result.error)
+                f.write(json.dumps(record) + "\n")
+                count += 1
+        return count
+
+    async def collect(self, wait=False):
+        """
+        Poll submitted batches and store the results of those that have ended.
+        With wait=True, keep polling until every submitted batch has ended.
+        Returns the number of results stored.
+        """
+        stored = 0
+        while self.submitted:
+            for batch_id in list(self.submitted):
+                batch = await self.client.messages.batches.retrieve(batch_id)
+                if batch.processing_status != "ended":
+                    continue
+                stored += await self._store_results(batch_id)
+                del self.submitted[batch_id]
+                self._save_batches()
+            if not wait or not self.submitted:
+                break
+            await asyncio.sleep(self.poll_interval)
+        return stored
+
+    def load_results(self):
+        results = {}
+        try:
+            with open(self.results_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        results[record["custom_id"]] = record
+        except FileNotFoundError:
+            pass
+        return results
+
+analysis_queue = AnalysisQueue()
@@ -0,0 +1,139 @@
+import asyncio
+import csv
+import json
+import os
+import time
+from datetime import datetime
+from rich.console import Console
+from rich.table import Table
+from rich.box import ROUNDED
+
+from session import ChatSession
+from ratelimit import limiter as shared_limiter
+from device_pool import DevicePool
+from analysis_queue import analysis_queue
+from journal import SessionJournal
+from config import (CONTINUATION_EXIT_PHRASE, CONTINUATION_PROMPT,
+                    BATCH_MAX_SESSIONS, BATCH_MAX_ITERATIONS, BATCH_ANALYSIS_MODE,
+                    JOURNAL_DIR)
+
+console = Console()
+
+def load_devices(path):
+    """
+    Load a device list from a JSON array of objects or a CSV file with a header row.
+    Every device needs at least a 'host' field.
+    """
+    with open(path, 'r', newline='') as f:
+        if path.lower().endswith('.csv'):
+            devices = [dict(row) for row in csv.DictReader(f)]
+        else:
+            devices = json.load(f)
+    if not isinstance(devices, list):
+        raise ValueError(f"Inventory {path} must contain a list of devices")
+    for device in devices:
+        if not device.get('host'):
+            raise ValueError(f"Inventory entry without a host: {device}")
+    return devices
+
+def render_goal(goal_template, device):
+    goal = goal_template.format(**device)
+    details = {key: value for key, value in device.items() if key not in ('password', 'secret')}
+    return f"{goal}\n\nTarget device: {json.dumps(details)}\nWork on this device only."
+
+async def run_device_session(goal_template, device, max_iterations, limiter, device_pool, journal_path=None):
+    session = ChatSession(console=Console(quiet=True), limiter=limiter,
+                          device_pool=device_pool, device=device, show_usage=False,
+                          analysis_mode=BATCH_ANALYSIS_MODE,
+                          journal=SessionJournal(journal_path) if journal_path else None)
+    session.automode = True
+    start = time.monotonic()
+    status = "incomplete"
+    response = ""
+    iterations = 0
+
+    try:
+        user_input = render_goal(goal_template, device)
+        for iteration_count in range(max_iterations):
+            iterations = iteration_count + 1
+            response, exit_continuation = await session.chat(user_input, current_iteration=iterations, max_iterations=max_iterations)
+            if exit_continuation or CONTINUATION_EXIT_PHRASE in response:
+                status = "complete"
+                break
+            user_input = CONTINUATION_PROMPT
+    except Exception as e:
+        status = "error"
+        response = f"Error in batch session: {str(e)}"
+
+    if session.journal:
+        session.journal.close()
+
+    return {
+        "host": device["host"],
+        "status": status,
+        "iterations": iterations,
+        "duration": time.monotonic() - start,
+        "response": response.replace(CONTINUATION_EXIT_PHRASE, "").strip(),
+    }
+
+async def run_batch(goal_template, devices, max_iterations=BATCH_MAX_ITERATIONS,
+                    max_sessions=BATCH_MAX_SESSIONS, limiter=None, device_pool=None):
+    """
+    Run the goal template against every device as independent automode sessions.
+    Sessions share the API limiter and device pool but nothing else.
+    """
+    limiter = limiter or shared_limiter
+    device_pool = device_pool or DevicePool()
+    semaphore = asyncio.Semaphore(max_sessions)
+    completed = 0
+    journal_dir = os.path.join(JOURNAL_DIR, f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+    async def run_one(device):
+        nonlocal completed
+        journal_path = os.path.join(journal_dir, f"session_{device['host'].replace(os.sep, '_')}.jsonl")
+        async with semaphore:
+            result = await run_device_session(goal_template, device, max_iterations, limiter, device_pool, journal_path)
+        completed += 1
+        console.print(f"[{completed}/{len(devices)}] {result['host']}: {result['status']} "
+                      f"in {result['duration']:.1f}s", style="green" if result["status"] == "complete" else "yellow")
+        return result
+
+    results = await asyncio.gather(*(run_one(device) for device in devices))
+
+    try:
+        batch_id = await analysis_queue.flush()
+        if batch_id:
+            console.print(f"Execution analyses submitted as message batch {batch_id}. Type 'analysis' later to collect them.", style="cyan")
+    except Exception as e:
+        console.print(f"Error submitting analysis batch: {str(e)}", style="bold red")
+
+    return results
+
+def display_batch_results(results):
+    table = Table(box=ROUNDED)
+    table.add_column("Host", style="cyan")
+    table.add_column("Status", style="magenta")
+    table.add_column("Iterations", style="magenta")
+    table.add_column("Time (s)", style="green")
+
+    for result in results:
+        table.add_row(result["host"], result["status"], str(result["iterations"]), f"{result['duration']:.1f}")
+
+    console.print(table)
+
+def save_batch_report(goal_template, results):
+    now = datetime.now()
+    filename = f"Batch_{now.strftime('%Y%m%d_%H%M%S')}.md"
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write("# Netmiko AI Batch Report\n\n")
+        f.write(f"Goal: {goal_template}\n\n")
+        f.write("Summary: " + ", ".join(f"{status}={count}" for status, count in sorted(counts.items())) + "\n\n")
+        for result in results:
+            f.write(f"## {result['host']} ({result['status']}, {result['iterations']} iterations, {result['duration']:.1f}s)\n\n")
+            f.write(f"{result['response']}\n\n")
+
+    return filename
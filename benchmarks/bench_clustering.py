@@ -0,0 +1,103 @@
+"""
+Token volume of fleet-wide command output before and after clustering.
+
+    python benchmarks/bench_clustering.py [--devices 500]
+
+Builds the stdout a script would print when running 'show version' and
+'show interfaces status' on every device of a synthetic fleet: per-device
+hostnames, addresses, serials, uptimes and counters, three software
+trains, three cabling layouts, some 24-port switches, occasional down
+ports and a handful of one-off outliers.
+Tokens are estimated at four characters each, as the API limiter does.
+"""
+import argparse
+import random
+import time
+
+from workspace import prepare
+
+prepare()
+
+from clustering import condense_output
+
+VERSIONS = ["17.9.4a", "17.9.4a", "17.9.4a", "17.6.5", "16.12.8"]
+
+def show_version(name, index, rng):
+    version = rng.choice(VERSIONS)
+    return f"""Cisco IOS XE Software, Version {version}
+Cisco IOS Software [Cupertino], Catalyst L3 Switch Software (CAT9K_IOSXE), Version {version}, RELEASE SOFTWARE (fc3)
+Technical Support: http://www.cisco.com/techsupport
+Copyright (c) 1986-2023 by Cisco Systems, Inc.
+
+ROM: IOS-XE ROMMON
+BOOTLDR: System Bootstrap, Version 17.9.1r, RELEASE SOFTWARE (P)
+
+{name} uptime is {rng.randint(1, 60)} weeks, {rng.randint(0, 6)} days, {rng.randint(0, 23)} hours, {rng.randint(0, 59)} minutes
+Uptime for this control processor is {rng.randint(1, 60)} weeks, {rng.randint(0, 6)} days, {rng.randint(0, 23)} hours
+System returned to ROM by Reload Command at {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} UTC Mon Jan {rng.randint(1, 28)} 2024
+System image file is "flash:packages.conf"
+Last reload reason: Reload Command
+
+cisco C9300-48P (X86) processor with 1338934K/6147K bytes of memory.
+Processor board ID FOC{rng.randint(1000, 9999)}X{rng.randint(100, 999)}
+1 Virtual Ethernet interface
+52 Gigabit Ethernet interfaces
+8 Ten Gigabit Ethernet interfaces
+2048K bytes of non-volatile configuration memory.
+8388608K bytes of physical memory.
+Base Ethernet MAC Address          : {':'.join(f'{rng.randint(0, 255):02x}' for _ in range(6))}
+Management IP address              : 10.{index // 250}.{index % 250}.1
+Configuration register is 0x102
+"""
+
+def show_interfaces_status(index, rng, ports):
+    lines = ["Port         Name               Status       Vlan       Duplex  Speed Type"]
+    # Closets follow one of a few cabling layouts; now and then one port is down
+    layout = random.Random(index % 3)
+    down = {rng.randint(1, ports)} if rng.random() < 0.05 else set()
+    for port in range(1, ports + 1):
+        connected = layout.random() < 0.7 and port not in down
+        lines.append(f"Gi1/0/{port:<6} {'access port':<18} {'connected' if connected else 'notconnect':<12} "
+                     f"{10 + port % 4 * 10:<10} {'a-full' if connected else 'auto':<7} {'a-1000' if connected else 'auto':<5} 10/100/1000BaseTX")
+    return "\n".join(lines)
+
+def build_run(devices, rng):
+    stdout = []
+    records = []
+    for index in range(devices):
+        name = f"sw-{index:05d}"
+        host = f"10.{index // 250}.{index % 250}.1"
+        ports = 24 if index % 50 == 7 else 48
+        outputs = [("show version", show_version(name, index, rng)), ("show interfaces status", show_interfaces_status(index, rng, ports))]
+        if index % 97 == 13:
+            # One-off outlier: a module missing from the inventory output
+            outputs[0] = ("show version", outputs[0][1].replace("8 Ten Gigabit", "4 Ten Gigabit").replace("52 Gigabit", "50 Gigabit"))
+        stdout.append(f"===== {name} ({host}) =====")
+        for command, output in outputs:
+            stdout.append(output)
+            records.append({"host": host, "method": "send_command", "command": command, "output": output})
+    return "\n".join(stdout) + "\n", records
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--show", action="store_true", help="print the condensed output")
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    stdout, records = build_run(args.devices, rng)
+    start = time.perf_counter()
+    condensed = condense_output(stdout, records)
+    elapsed = time.perf_counter() - start
+
+    if args.show:
+        print(condensed)
+    before, after = len(stdout) // 4, len(condensed) // 4
+    print(f"fleet: {args.devices} devices, {len(records)} command outputs")
+    print(f"raw stdout:      {before:10d} tokens")
+    print(f"clustered:       {after:10d} tokens ({before / after:.0f}x smaller)")
+    print(f"clustering time: {elapsed * 1e3:10.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Throughput of the compliance engine on a synthetic fleet.
+
+    python benchmarks/bench_compliance.py [--devices 5000] [--interfaces 48]
+
+Configurations come from the snapshot benchmark's generator, with a share
+of devices made non-compliant. Reports configs/s in-process and over the
+shared process pool.
+"""
+import argparse
+import random
+import time
+
+from workspace import prepare
+
+prepare()
+
+from bench_snapshots import device_config
+from compliance import compile_rules, evaluate_fleet
+from config import WORKER_PROCESSES
+
+RULES = [
+    {"id": "password-encryption", "type": "required", "line": "service password-encryption", "severity": "high"},
+    {"id": "ntp-redundancy", "type": "required", "pattern": r"^ntp server ", "min_count": 2},
+    {"id": "no-public-community", "type": "forbidden", "pattern": r"^snmp-server community (public|private)\b", "severity": "critical"},
+    {"id": "no-telnet", "type": "forbidden", "pattern": r"^transport input .*telnet", "stanza": r"^line vty", "severity": "high"},
+    {"id": "access-ports-portfast", "type": "required", "line": "spanning-tree portfast", "stanza": r"^interface GigabitEthernet",
+     "unless": r"^shutdown$"},
+    {"id": "access-vlan-range", "type": "threshold", "pattern": r"^switchport access vlan (\d+)", "stanza": r"^interface ",
+     "min": 2, "max": 999},
+    {"id": "log-buffer", "type": "threshold", "pattern": r"^logging buffered (\d+)", "min": 16000, "required": True},
+]
+
+def break_config(config, rng):
+    choice = rng.random()
+    if choice < 0.3:
+        return config.replace("snmp-server community netops RO", "snmp-server community public RO")
+    if choice < 0.6:
+        return config.replace(" transport input ssh", " transport input ssh telnet")
+    if choice < 0.8:
+        return config.replace(" spanning-tree portfast\n", "\n", 1)
+    return config.replace("service password-encryption\n", "")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=5000)
+    parser.add_argument("--interfaces", type=int, default=48)
+    parser.add_argument("--broken", type=float, default=0.1)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    configs = []
+    for index in range(args.devices):
+        config = device_config(index, args.interfaces, rng)
+        if rng.random() < args.broken:
+            config = break_config(config, rng)
+        configs.append((f"sw-{index:05d}", "cisco_ios", config))
+    size = sum(len(text) for _, _, text in configs)
+
+    compiled = compile_rules(RULES)
+    start = time.perf_counter()
+    serial = [v for host, platform, text in configs for v in compiled.evaluate(host, platform, text)]
+    serial_time = time.perf_counter() - start
+
+    evaluate_fleet(RULES, configs[:WORKER_PROCESSES], min_items=0)  # start the pool outside the timing
+    start = time.perf_counter()
+    parallel = evaluate_fleet(RULES, configs, min_items=0)
+    parallel_time = time.perf_counter() - start
+    assert parallel == serial
+
+    print(f"fleet: {args.devices} configs, {size / 1e6:.1f} MB, {len(RULES)} rules, "
+          f"{len({v.host for v in serial})} non-compliant devices, {len(serial)} violations")
+    print(f"in-process: {args.devices / serial_time:8.0f} configs/s ({size / serial_time / 1e6:.1f} MB/s)")
+    print(f"pool:       {args.devices / parallel_time:8.0f} configs/s ({WORKER_PROCESSES} workers)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+End-to-end benchmarks against a fake Messages API and simulated devices.
+
+    python benchmarks/bench_e2e.py [--scenarios chat,automode,fleet,files]
+                                   [--api-latency 0.05] [--device-latency 0.02]
+                                   [--update-baseline] [--tolerance 0.5]
+
+Nothing leaves the machine. fake_api.FakeMessagesAPI answers the SDK with
+scripted responses, and executed scripts run under exec_runtime with
+mock_devices/netmiko first on their path. Each run gets a scratch working
+directory and data dir. Scenarios:
+
+  chat      single chat turns through main.chat_with_claude, history growing
+  automode  a 25-iteration automode loop as main runs it; every iteration
+            executes a script on a simulated device and gets it analysed
+  fleet     tools.execute_tool('execute_code') fanning out over a fleet of
+            simulated Cisco and Juniper devices, repeated so that the
+            later runs use the timing profiles learned from the first ones.
+            The simulated devices follow Netmiko 4 defaults (fast_cli on)
+            and answer within TIMING_FAST_RTT, so the profiles only add
+            timeouts and the later runs gain little besides warm caches
+  files     tools.execute_tool('read_file' / 'read_multiple_files') on large
+            configuration files
+
+Reports latency percentiles, throughput, API requests and tokens, and peak
+RSS, and compares them with benchmarks/baseline.json: a regression past the
+tolerance is printed in red and the exit status is 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from fake_api import FakeMessagesAPI, text_block, tool_use_block
+from workspace import prepare
+
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+SCENARIOS = ("chat", "automode", "fleet", "files")
+ITERATION = re.compile(r"iteration (\d+) out of (\d+)")
+
+def device_script(host, device_type="cisco_ios", commands=("show version",)):
+    return f"""from netmiko import ConnectHandler
+
+device = {{"device_type": "{device_type}", "host": "{host}", "username": "bench", "password": "bench"}}
+connection = ConnectHandler(**device)
+for command in {list(commands)!r}:
+    print(connection.send_command(command))
+connection.disconnect()
+"""
+
+def fleet_script(devices):
+    hosts = [(f"10.{20 + index // 250}.{index % 250}.1", "juniper_junos" if index % 5 == 4 else "cisco_ios")
+             for index in range(devices)]
+    return f"""from concurrent.futures import ThreadPoolExecutor
+from netmiko import ConnectHandler
+
+HOSTS = {hosts!r}
+COMMANDS = {{"cisco_ios": ["show version", "show interfaces status"], "juniper_junos": ["show version", "show interfaces terse"]}}
+
+def poll(entry):
+    host, device_type = entry
+    connection = ConnectHandler(device_type=device_type, host=host, username="bench", password="bench")
+    outputs = [connection.send_command(command) for command in COMMANDS[device_type]]
+    connection.disconnect()
+    return host, outputs
+
+with ThreadPoolExecutor(max_workers=16) as pool:
+    for host, outputs in pool.map(poll, HOSTS):
+        print(f"===== {{host}} =====")
+        for output in outputs:
+            print(output)
+"""
+
+def respond(request):
+    """Scripted model: plain answers for chat turns, a device script per automode iteration."""
+    system = str(request.get("system", ""))
+    last = request["messages"][-1]["content"]
+    if isinstance(last, str) and last.startswith("Analyze this Netmiko script execution"):
+        return [text_block("The script connected, ran its commands and printed the expected output. No errors.")]
+    if isinstance(last, str) and last.startswith("Compact the older part"):
+        return [text_block("Goal: benchmark automode\nDevices: simulated switches 10.0.0.1-5\nFindings: all answer\nChanges: none\nFiles: none\nOpen: none")]
+    iteration = ITERATION.search(system)
+    if isinstance(last, list) and any(block.get("type") == "tool_result" for block in last):
+        if iteration and iteration.group(1) == iteration.group(2):
+            return [text_block("Every device answered and matches the expected version. AUTOMODE_COMPLETE")]
+        return [text_block("The device answered as expected. Continuing with the next device.")]
+    if iteration:
+        number = int(iteration.group(1))
+        return [text_block(f"Step {number}: checking the next device."),
+                tool_use_block("execute_code", {"code": device_script(f"10.0.0.{number % 5 + 1}")})]
+    return [text_block("Here is what the output shows. " + "The interface counters are stable and no errors are reported. " * 20)]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def setup(args, api_url):
+    """Scratch working directory and environment; must run before any project module is imported."""
+    return prepare({
+        "ANTHROPIC_BASE_URL": api_url,
+        # Throughput of the application, not of the client-side rate limiter
+        "API_REQUESTS_PER_MINUTE": "1000000",
+        "API_INPUT_TOKENS_PER_MINUTE": "1000000000",
+        "API_OUTPUT_TOKENS_PER_MINUTE": "1000000000",
+        "EXEC_PYTHON": sys.executable,
+        "PYTHONPATH": os.pathsep.join([os.path.join(BENCH_DIR, "mock_devices"), REPO_DIR]),
+        "MOCK_DEVICE_LATENCY": str(args.device_latency),
+        "MOCK_DEVICE_SETTLE": str(args.device_settle),
+    }, keep=args.keep_workdir)
+
+def load_app():
+    import main
+    import models
+    import tools
+    import utils
+    # Render everything as usual, into the void
+    sink = open(os.devnull, "w")
+    for module in (main, tools, utils):
+        module.console.file = sink
+    return main, models, tools
+
+def token_totals(models):
+    usage = models.get_total_token_usage().values()
+    return sum(tokens["input"] for tokens in usage), sum(tokens["output"] for tokens in usage)
+
+async def scenario_chat(app, args):
+    main, _, _ = app
+    main.session.reset()
+    latencies = []
+    for turn in range(args.chat_turns):
+        start = time.perf_counter()
+        await main.chat_with_claude(f"What do the interface counters on core-{turn % 3 + 1} tell us?")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+async def scenario_automode(app, args):
+    main, _, _ = app
+    from config import CONTINUATION_EXIT_PHRASE, CONTINUATION_PROMPT
+    main.session.reset()
+    main.session.automode = True
+    latencies = []
+    user_input = "Check the software version of every access switch."
+    try:
+        for iteration_count in range(args.iterations):
+            start = time.perf_counter()
+            response, exit_continuation = await main.chat_with_claude(user_input, current_iteration=iteration_count + 1,
+                                                                      max_iterations=args.iterations)
+            latencies.append(time.perf_counter() - start)
+            if exit_continuation or CONTINUATION_EXIT_PHRASE in response:
+                break
+            user_input = CONTINUATION_PROMPT
+    finally:
+        main.session.automode = False
+    if len(latencies) != args.iterations:
+        raise RuntimeError(f"automode stopped after {len(latencies)} of {args.iterations} iterations")
+    return latencies
+
+async def scenario_fleet(app, args):
+    main, _, tools = app
+    code = fleet_script(args.devices)
+    latencies = []
+    for run in range(args.fleet_runs):
+        start = time.perf_counter()
+        # fresh: every run reaches the devices instead of the result cache
+        result = await tools.execute_tool("execute_code", {"code": code, "fresh": True}, session=main.session)
+        latencies.append(time.perf_counter() - start)
+        if result["is_error"]:
+            raise RuntimeError(f"fleet run failed: {str(result['content'])[:500]}")
+    return latencies
+
+async def scenario_files(app, args):
+    main, _, tools = app
+    paths = []
+    for index in range(args.files):
+        path = os.path.join(os.getcwd(), f"config_{index}.txt")
+        stanza = "".join(f"interface GigabitEthernet1/0/{port}\n switchport access vlan {port % 40 + 10}\n spanning-tree portfast\n!\n"
+                         for port in range(1, 49))
+        with open(path, "w") as f:
+            while f.tell() < args.file_mb * 1024 * 1024:
+                f.write(stanza)
+        paths.append(path)
+    latencies = []
+    for _ in range(args.file_reads):
+        start = time.perf_counter()
+        await tools.execute_tool("read_multiple_files", {"paths": paths}, session=main.session)
+        await tools.execute_tool("read_file", {"path": paths[0]}, session=main.session)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def summarize(latencies, wall, requests, tokens):
+    return {
+        "runs": len(latencies),
+        "p50_s": round(percentile(latencies, 50), 4),
+        "p95_s": round(percentile(latencies, 95), 4),
+        "max_s": round(max(latencies), 4),
+        "throughput_per_s": round(len(latencies) / wall, 3) if wall else 0.0,
+        "api_requests": requests,
+        "input_tokens": tokens[0],
+        "output_tokens": tokens[1],
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def regressions(results, baseline, tolerance):
+    """(scenario, metric, value, baseline) for every metric worse than the baseline allows."""
+    found = []
+    for scenario, metrics in results.items():
+        reference = baseline.get(scenario)
+        if not reference:
+            continue
+        for metric in ("p50_s", "p95_s"):
+            # Small absolute slack so millisecond scenarios do not flap
+            if metrics[metric] > reference[metric] * (1 + tolerance) + 0.05:
+                found.append((scenario, metric, metrics[metric], reference[metric]))
+        if metrics["throughput_per_s"] < reference["throughput_per_s"] / (1 + tolerance):
+            found.append((scenario, "throughput_per_s", metrics["throughput_per_s"], reference["throughput_per_s"]))
+        for metric in ("api_requests", "input_tokens", "output_tokens"):
+            # The fake API is deterministic, so counts only move when the code does
+            if metrics[metric] > reference[metric] * 1.05 + 10:
+                found.append((scenario, metric, metrics[metric], reference[metric]))
+        if metrics["peak_rss_mb"] > reference["peak_rss_mb"] * 1.3 + 20:
+            found.append((scenario, "peak_rss_mb", metrics["peak_rss_mb"], reference["peak_rss_mb"]))
+    return found
+
+def report(results, baseline, found):
+    from rich.console import Console
+    from rich.table import Table
+    from rich.box import ROUNDED
+
+    console = Console()
+    if not console.is_terminal:
+        console.width = 140
+    table = Table(box=ROUNDED, title="End-to-end benchmarks")
+    table.add_column("Scenario", style="cyan")
+    for column in ("Runs", "p50 (s)", "p95 (s)", "Max (s)", "Runs/s", "API calls", "Tokens in/out", "Peak RSS (MB)"):
+        table.add_column(column, style="magenta")
+    failed = {(scenario, metric) for scenario, metric, _, _ in found}
+    for scenario, metrics in results.items():
+        def cell(metric, text=None):
+            text = text or str(metrics[metric])
+            return f"[bold red]{text}[/bold red]" if (scenario, metric) in failed else text
+        reference = baseline.get(scenario, {})
+        table.add_row(scenario, str(metrics["runs"]), cell("p50_s"), cell("p95_s"), str(metrics["max_s"]),
+                      cell("throughput_per_s"), cell("api_requests"),
+                      cell("input_tokens", f"{metrics['input_tokens']:,}/{metrics['output_tokens']:,}"), cell("peak_rss_mb"))
+        if reference:
+            table.add_row("  baseline", str(reference["runs"]), str(reference["p50_s"]), str(reference["p95_s"]), str(reference["max_s"]),
+                          str(reference["throughput_per_s"]), str(reference["api_requests"]),
+                          f"{reference['input_tokens']:,}/{reference['output_tokens']:,}", str(reference["peak_rss_mb"]), style="dim")
+    console.print(table)
+    fleet = results.get("fleet", {})
+    if "warm_p50_s" in fleet:
+        # Profiles need TIMING_MIN_SAMPLES command samples per host, two runs of this script
+        console.print(f"fleet: first run {fleet['cold_s']}s, later runs p50 {fleet['warm_p50_s']}s")
+    for scenario, metric, value, reference in found:
+        console.print(f"REGRESSION {scenario}.{metric}: {value} vs baseline {reference}", style="bold red")
+
+async def run(args, app, api):
+    main, models, _ = app
+    functions = {"chat": scenario_chat, "automode": scenario_automode, "fleet": scenario_fleet, "files": scenario_files}
+    results = {}
+    for scenario in args.scenarios:
+        requests, tokens = api.requests, token_totals(models)
+        start = time.perf_counter()
+        latencies = await functions[scenario](app, args)
+        wall = time.perf_counter() - start
+        after = token_totals(models)
+        results[scenario] = summarize(latencies, wall, api.requests - requests, (after[0] - tokens[0], after[1] - tokens[1]))
+        if scenario == "fleet" and len(latencies) > 1:
+            # The first run has no timing profiles and cold caches
+            results[scenario]["cold_s"] = round(latencies[0], 4)
+            results[scenario]["warm_p50_s"] = round(percentile(latencies[1:], 50), 4)
+    main.session.journal.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--api-latency", type=float, default=0.05, help="seconds per fake API request")
+    parser.add_argument("--device-latency", type=float, default=0.02, help="seconds per simulated device round trip")
+    parser.add_argument("--device-settle", type=float, default=0.1, help="seconds a simulated command waits for its prompt")
+    parser.add_argument("--chat-turns", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=25)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--fleet-runs", type=int, default=5)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--file-mb", type=float, default=2.0)
+    parser.add_argument("--file-reads", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown against the baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    api = FakeMessagesAPI(respond, latency=args.api_latency).start()
+    setup(args, api.url)
+    try:
+        results = asyncio.run(run(args, load_app(), api))
+    finally:
+        api.stop()
+        os.chdir(REPO_DIR)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        found = []
+    else:
+        found = regressions(results, baseline, args.tolerance)
+    report(results, baseline, found)
+    sys.exit(1 if found else 0)
+
+if __name__ == "__main__":
+    main()
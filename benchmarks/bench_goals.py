@@ -0,0 +1,92 @@
+"""
+Wall time of a multi-goal automode plan, serial versus the goal executor.
+
+    python benchmarks/bench_goals.py [--goals 6] [--latency 0.5] [--parallel 4]
+
+A stub model stands in for the API: asked for a plan it answers with
+'Goal N:' lines, where every third goal compares the two goals before it;
+asked to work on a goal it answers after --latency seconds per request,
+spending --turns requests per goal. The plan is run once with one
+session at a time and once with --parallel sessions, and the merged
+message handed back to the main conversation is checked for every goal.
+"""
+import argparse
+import asyncio
+import re
+import time
+from types import SimpleNamespace
+
+from workspace import prepare
+
+prepare()
+
+import goals as goals_module
+import session as session_module
+from session import ChatSession
+from goals import parse_plan, goal_levels, run_goals, merge_results
+from config import CONTINUATION_EXIT_PHRASE
+
+def plan(goals):
+    lines = ["I will split this audit into goals:"]
+    for number in range(1, goals + 1):
+        if number % 3 == 0:
+            lines.append(f"Goal {number}: Compare the findings of Goal {number - 2} and Goal {number - 1}")
+        else:
+            lines.append(f"- **Goal {number}:** Audit NTP and logging on site {number}")
+    return "\n".join(lines)
+
+def stub_model(goals, latency, turns):
+    calls = {"requests": 0}
+
+    async def create_routed(limiter, role, shape="default", **request):
+        calls["requests"] += 1
+        await asyncio.sleep(latency)
+        messages = request["messages"]
+        first = messages[0]["content"]
+        match = re.search(r"You are working on Goal (\d+)", first)
+        if not match:
+            text = plan(goals)
+        elif len(messages) < 2 * turns - 1:
+            text = f"Working on goal {match.group(1)}."
+        else:
+            text = f"Goal {match.group(1)} finished: 2 findings. {CONTINUATION_EXIT_PHRASE}"
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)], stop_reason="end_turn",
+                               usage=SimpleNamespace(input_tokens=100, output_tokens=20))
+    return create_routed, calls
+
+async def run(goals, parallel, latency, turns):
+    create_routed, calls = stub_model(goals, latency, turns)
+    session_module.create_routed = create_routed
+    goals_module.console.quiet = True
+    parent = ChatSession(show_usage=False)
+    parent.console.quiet = True
+    parent.automode = True
+    response, _ = await parent.chat("Audit the sites")
+    parsed = parse_plan(response)
+    start = time.perf_counter()
+    results = await run_goals(parsed, parent, max_parallel=parallel)
+    elapsed = time.perf_counter() - start
+    merged = merge_results(results)
+    assert all(result["status"] == "complete" for result in results), results
+    assert all(f"## Goal {goal['number']} (complete)" in merged for goal in parsed)
+    return parsed, elapsed, calls["requests"]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--goals", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per stub model request")
+    parser.add_argument("--turns", type=int, default=2, help="model requests per goal")
+    parser.add_argument("--parallel", type=int, default=4)
+    args = parser.parse_args()
+
+    parsed, serial, requests = asyncio.run(run(args.goals, 1, args.latency, args.turns))
+    _, concurrent, _ = asyncio.run(run(args.goals, args.parallel, args.latency, args.turns))
+    waves = goal_levels(parsed)
+    print(f"plan: {len(parsed)} goals in {len(waves)} dependency wave(s): "
+          + " -> ".join("[" + ", ".join(map(str, wave)) + "]" for wave in waves))
+    print(f"model requests:    {requests:8d}")
+    print(f"serial:            {serial:8.2f} s")
+    print(f"goal executor:     {concurrent:8.2f} s ({serial / concurrent:.1f}x faster, {args.parallel} parallel)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Load time and selector latency of the device inventory on a synthetic fleet.
+
+    python benchmarks/bench_inventory.py [--devices 50000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory import Inventory
+
+SELECTORS = [
+    "site=nyc and role=access",
+    "platform=cisco_* and not tag=lab",
+    "(site=nyc or site=lon) and role!=core",
+    "subnet=10.0.16.0/20",
+    "tag=pci and site=sin and role=edge and platform=arista_eos",
+    "name=dev-00042",
+]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    devices = [{
+        "name": f"dev-{i:05d}",
+        "host": f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+        "platform": rng.choice(["cisco_ios", "cisco_nxos", "juniper_junos", "arista_eos"]),
+        "site": rng.choice(["nyc", "lon", "sfo", "fra", "sin"]),
+        "role": rng.choice(["access", "dist", "core", "edge"]),
+        "tags": rng.sample(["lab", "prod", "pci", "wan", "voice"], 2),
+    } for i in range(args.devices)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "inventory.json")
+        with open(path, 'w') as f:
+            json.dump({"defaults": {"username": "admin"}, "devices": devices}, f)
+        start = time.perf_counter()
+        inventory = Inventory([path])
+        print(f"load {len(inventory)} devices: {time.perf_counter() - start:.2f}s")
+
+        for selector in SELECTORS:
+            inventory.count(selector)
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                matched = inventory.count(selector)
+            per_query = (time.perf_counter() - start) / args.repeat
+            print(f"{per_query * 1e3:7.3f} ms  {matched:6d} matched  {selector}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Storage size and diff throughput of the config snapshot store on a
+synthetic fleet.
+
+    python benchmarks/bench_snapshots.py [--devices 2000] [--versions 5] [--interfaces 48]
+
+Every device gets an IOS-style configuration built from a shared baseline
+(so most stanzas are identical across the fleet) plus per-device hostname,
+addresses and interface descriptions. Each further version changes a few
+stanzas. Reports raw vs stored bytes and serial vs process-pool diff rates.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from workspace import prepare
+
+prepare()
+
+from snapshots import SnapshotStore, diff_configs, diff_many
+from config import WORKER_PROCESSES
+
+BASELINE = """service timestamps debug datetime msec
+service timestamps log datetime msec
+service password-encryption
+no ip domain lookup
+ip domain name example.net
+spanning-tree mode rapid-pvst
+spanning-tree extend system-id
+aaa new-model
+aaa authentication login default group tacacs+ local
+aaa authorization exec default group tacacs+ local
+logging buffered 64000
+logging host 10.255.0.10
+snmp-server community netops RO
+ntp server 10.255.0.1
+ntp server 10.255.0.2
+line con 0
+ logging synchronous
+line vty 0 15
+ transport input ssh
+ login authentication default
+"""
+
+def device_config(index, interfaces, rng):
+    lines = [f"hostname sw-{index:05d}", "!"]
+    lines.append(BASELINE)
+    for port in range(1, interfaces + 1):
+        lines.append(f"interface GigabitEthernet1/0/{port}")
+        lines.append(f" description access port {port}")
+        lines.append(" switchport mode access")
+        lines.append(f" switchport access vlan {10 + port % 4 * 10}")
+        lines.append(" spanning-tree portfast")
+        lines.append("!")
+    lines.append("interface Vlan100")
+    lines.append(f" ip address 10.{index // 250 % 250}.{index % 250}.1 255.255.255.0")
+    lines.append("!")
+    lines.append(f"ip route 0.0.0.0 0.0.0.0 10.{index // 250 % 250}.{index % 250}.254")
+    lines.append("end")
+    return "\n".join(lines)
+
+def mutate(config, rng):
+    lines = config.split("\n")
+    for _ in range(rng.randint(1, 3)):
+        choice = rng.random()
+        if choice < 0.5:
+            candidates = [i for i, line in enumerate(lines) if line.startswith(" description")]
+            i = rng.choice(candidates)
+            lines[i] = f" description changed {rng.randint(0, 99999)}"
+        elif choice < 0.8:
+            lines.insert(-1, f"ip route 192.168.{rng.randint(0, 255)}.0 255.255.255.0 10.0.0.{rng.randint(1, 254)}")
+        else:
+            candidates = [i for i, line in enumerate(lines) if line.startswith("ntp server")]
+            if candidates:
+                del lines[candidates[-1]]
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--versions", type=int, default=5)
+    parser.add_argument("--interfaces", type=int, default=48)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SnapshotStore(os.path.join(tmp, "snapshots.sqlite"))
+        raw_bytes = 0
+        last = {}
+        start = time.perf_counter()
+        for version in range(args.versions):
+            for index in range(args.devices):
+                config = device_config(index, args.interfaces, rng) if version == 0 else mutate(last[index], rng)
+                last[index] = config
+                raw_bytes += len(config.encode())
+                store.add(f"sw-{index:05d}", config)
+        store_time = time.perf_counter() - start
+        size = store.size()
+        db_bytes = os.path.getsize(store.path)
+
+        hosts = store.hosts()
+        pairs = [(store.get(host, args.versions - 1), store.get(host)) for host in hosts]
+
+        start = time.perf_counter()
+        serial = [diff_configs(old, new) for old, new in pairs]
+        serial_time = time.perf_counter() - start
+
+        diff_many(pairs[:WORKER_PROCESSES], min_items=0)  # start the pool outside the timing
+        start = time.perf_counter()
+        parallel = diff_many(pairs, min_items=0)
+        parallel_time = time.perf_counter() - start
+        assert parallel == serial
+
+    snapshots_count = args.devices * args.versions
+    print(f"fleet: {args.devices} devices x {args.versions} versions ({snapshots_count} snapshots)")
+    print(f"raw configs:     {raw_bytes / 1e6:8.2f} MB")
+    print(f"stored blocks:   {size['block_bytes'] / 1e6:8.2f} MB ({size['blocks']} unique stanzas)")
+    print(f"stored manifests:{size['manifest_bytes'] / 1e6:8.2f} MB")
+    print(f"sqlite file:     {db_bytes / 1e6:8.2f} MB ({raw_bytes / db_bytes:.1f}x smaller than raw)")
+    print(f"ingest:          {snapshots_count / store_time:8.0f} snapshots/s")
+    print(f"diff serial:     {len(pairs) / serial_time:8.0f} diffs/s")
+    print(f"diff parallel:   {len(pairs) / parallel_time:8.0f} diffs/s ({WORKER_PROCESSES} workers)")
+
+if __name__ == "__main__":
+    main()
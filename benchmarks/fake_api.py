@@ -0,0 +1,93 @@
+"""
+Local stand-in for the Anthropic Messages API.
+
+Serves POST /v1/messages on 127.0.0.1 from a thread, answering each
+request with whatever the respond(request) callable returns (a list of
+content blocks, or a (blocks, stop_reason) pair) after a fixed latency plus
+jitter. Usage counts the request at four characters per token, as the API
+limiter estimates it, and rate limit headers report ample capacity. Point
+the SDK at it with ANTHROPIC_BASE_URL=server.url before models is imported.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def text_block(text):
+    return {"type": "text", "text": text}
+
+def tool_use_block(name, tool_input):
+    return {"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:24]}", "name": name, "input": tool_input}
+
+class FakeMessagesAPI:
+    def __init__(self, respond, latency=0.05, jitter=0.0, seed=1):
+        self.respond = respond
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _delay(self):
+        with self._lock:
+            self.requests += 1
+            return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("content-length", 0)))
+                if self.path.split("?")[0] != "/v1/messages":
+                    self._send(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+                    return
+                request = json.loads(body)
+                time.sleep(api._delay())
+                answer = api.respond(request)
+                blocks, stop_reason = answer if isinstance(answer, tuple) else (answer, None)
+                if stop_reason is None:
+                    stop_reason = "tool_use" if any(block["type"] == "tool_use" for block in blocks) else "end_turn"
+                output = sum(len(json.dumps(block)) for block in blocks) // 4 + 1
+                self._send(200, {
+                    "id": f"msg_{uuid.uuid4().hex[:24]}", "type": "message", "role": "assistant",
+                    "model": request.get("model", ""), "content": blocks, "stop_reason": stop_reason,
+                    "stop_sequence": None, "usage": {"input_tokens": len(body) // 4 + 1, "output_tokens": output},
+                })
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.send_header("request-id", f"req_{uuid.uuid4().hex[:24]}")
+                for name in ("requests", "input-tokens", "output-tokens"):
+                    self.send_header(f"anthropic-ratelimit-{name}-limit", "100000000")
+                    self.send_header(f"anthropic-ratelimit-{name}-remaining", "100000000")
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,153 @@
+"""
+Simulated Cisco IOS and Juniper Junos devices behind netmiko's API.
+
+Benchmarks put this directory first on PYTHONPATH of executed scripts, so
+'from netmiko import ConnectHandler' connects to a simulated device instead
+of opening SSH. Every host answers; hosts in 10.255.0.0/16 time out.
+Timing, from the environment:
+
+  MOCK_DEVICE_LATENCY     seconds per round trip (default 0.02); connecting
+                          costs three round trips
+  MOCK_DEVICE_SLOW_EVERY  every Nth host is WAN-attached with 5x latency
+                          (default 10, 0 for none)
+  MOCK_DEVICE_SETTLE      seconds a command waits for the prompt to settle,
+                          times global_delay_factor, a tenth of it with
+                          fast_cli (default 0.1; fast_cli is on unless
+                          passed as False, as in netmiko 4)
+"""
+import hashlib
+import os
+import time
+
+LATENCY = float(os.environ.get("MOCK_DEVICE_LATENCY", "0.02"))
+SLOW_EVERY = int(os.environ.get("MOCK_DEVICE_SLOW_EVERY", "10"))
+SETTLE = float(os.environ.get("MOCK_DEVICE_SETTLE", "0.1"))
+
+class NetmikoTimeoutException(Exception):
+    pass
+
+class NetmikoAuthenticationException(Exception):
+    pass
+
+NetMikoTimeoutException = NetmikoTimeoutException
+NetMikoAuthenticationException = NetmikoAuthenticationException
+
+def _index(host):
+    return int(hashlib.sha256(host.encode("utf-8")).hexdigest()[:8], 16)
+
+def _ios_outputs(name, host, index):
+    ports = 24 if index % 7 == 0 else 48
+    status = ["Port         Name               Status       Vlan       Duplex  Speed Type"]
+    for port in range(1, ports + 1):
+        up = (index + port) % 4 != 0
+        status.append(f"Gi1/0/{port:<6} {'access':<18} {'connected' if up else 'notconnect':<12} {10 + port % 3 * 10:<10} "
+                      f"{'a-full' if up else 'auto':<7} {'a-1000' if up else 'auto':<5} 10/100/1000BaseTX")
+    running = [f"hostname {name}", "service password-encryption", "ntp server 10.0.0.10", "ntp server 10.0.0.11",
+               "logging buffered 64000", "snmp-server community netops RO"]
+    for port in range(1, ports + 1):
+        running += [f"interface GigabitEthernet1/0/{port}", " switchport mode access",
+                    f" switchport access vlan {10 + port % 3 * 10}", " spanning-tree portfast", "!"]
+    running += ["line vty 0 4", " transport input ssh", "end"]
+    return {
+        "show version": f"""Cisco IOS XE Software, Version 17.9.4a
+{name} uptime is {index % 50} weeks, {index % 7} days, {index % 24} hours, {index % 60} minutes
+System image file is "flash:packages.conf"
+cisco C9300-{ports}P (X86) processor with 1338934K/6147K bytes of memory.
+Processor board ID FOC{index % 10000:04d}X{index % 1000:03d}
+{ports + 4} Gigabit Ethernet interfaces
+Management IP address              : {host}
+Configuration register is 0x102""",
+        "show interfaces status": "\n".join(status),
+        "show running-config": "\n".join(running),
+        "show clock": f"*{index % 24:02d}:{index % 60:02d}:00.000 UTC Mon Jan 1 2024",
+        "show ip interface brief": f"Interface              IP-Address      OK? Method Status                Protocol\nVlan1                  {host}      YES NVRAM  up                    up",
+        "show cdp neighbors": f"""Device ID        Local Intrfce     Holdtme    Capability  Platform  Port ID
+core-{index % 2 + 1}           Gig 1/0/{ports}        150          R S I     C9500     Ten 1/0/{index % 40 + 1}""",
+    }
+
+def _junos_outputs(name, host, index):
+    terse = ["Interface               Admin Link Proto    Local                 Remote"]
+    for port in range(0, 24):
+        terse.append(f"ge-0/0/{port:<16} up    {'up' if (index + port) % 5 else 'down':<5} inet")
+    return {
+        "show version": f"""Hostname: {name}
+Model: mx204
+Junos: 22.4R2-S2.6
+JUNOS OS Kernel 64-bit  [20230516.5e7c8a6_builder_stable_12]""",
+        "show interfaces terse": "\n".join(terse),
+        "show configuration": f"""system {{
+    host-name {name};
+    ntp {{
+        server 10.0.0.10;
+    }}
+}}
+interfaces {{
+    lo0 {{
+        unit 0 {{
+            family inet {{
+                address {host}/32;
+            }}
+        }}
+    }}
+}}""",
+        "show lldp neighbors": f"""Local Interface    Parent Interface    Chassis Id          Port info          System Name
+et-0/0/0           -                   00:00:5e:00:53:{index % 256:02x}   et-0/0/{index % 4}           core-{index % 2 + 1}""",
+    }
+
+class MockConnection:
+    def __init__(self, device_type="cisco_ios", host=None, ip=None, global_delay_factor=1, fast_cli=True, **kwargs):
+        self.host = host or ip
+        self.device_type = device_type
+        self.junos = "juniper" in device_type
+        index = _index(self.host)
+        self.name = f"{'mx' if self.junos else 'sw'}-{index % 100000:05d}"
+        self.outputs = (_junos_outputs if self.junos else _ios_outputs)(self.name, self.host, index)
+        slow = SLOW_EVERY and index % SLOW_EVERY == 0
+        self.latency = LATENCY * (5 if slow else 1)
+        self.settle = SETTLE * global_delay_factor * (0.1 if fast_cli else 1.0)
+        time.sleep(3 * self.latency)
+
+    def _round_trip(self):
+        time.sleep(self.latency + self.settle)
+
+    def find_prompt(self):
+        self._round_trip()
+        return f"{self.name}>" if self.junos else f"{self.name}#"
+
+    def send_command(self, command_string, read_timeout=10.0, **kwargs):
+        self._round_trip()
+        key = " ".join(command_string.split())
+        if key in self.outputs:
+            return self.outputs[key]
+        if self.junos:
+            return f"\nsyntax error, expecting <command>.\n{key}"
+        return f"{key}\n^\n% Invalid input detected at '^' marker."
+
+    send_command_timing = send_command
+
+    def send_config_set(self, config_commands=None, **kwargs):
+        commands = [config_commands] if isinstance(config_commands, str) else list(config_commands or [])
+        for _ in commands:
+            self._round_trip()
+        prompt = f"{self.name}#" if self.junos else f"{self.name}(config)#"
+        return "\n".join(f"{prompt} {command}" for command in commands)
+
+    def save_config(self, *args, **kwargs):
+        self._round_trip()
+        return "[OK]"
+
+    def disconnect(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.disconnect()
+
+def ConnectHandler(**kwargs):
+    host = kwargs.get("host") or kwargs.get("ip") or ""
+    if host.startswith("10.255."):
+        time.sleep(kwargs.get("conn_timeout", 10) if LATENCY else 0)
+        raise NetmikoTimeoutException(f"TCP connection to device failed. Device: {host}")
+    return MockConnection(**kwargs)
@@ -0,0 +1,43 @@
+"""
+Scratch working directory for the benchmarks.
+
+config reads its API keys from the environment when it is imported and
+load_prompt opens lower case prompt names relative to the working
+directory, so a benchmark calls prepare() before importing any project
+module. The directory holds the prompts and the data dir, and is removed
+at exit unless kept.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+_workdir = None
+
+def _remove(workdir):
+    os.chdir(REPO_DIR)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+def prepare(env=None, keep=False):
+    """Create the directory, set the environment (plus env) and change into it; later calls reuse it."""
+    global _workdir
+    if _workdir is None:
+        _workdir = tempfile.mkdtemp(prefix="netmikoai-bench-")
+        os.makedirs(os.path.join(_workdir, "prompts"))
+        for name in os.listdir(os.path.join(REPO_DIR, "prompts")):
+            for target in {name, name.lower()}:
+                shutil.copy(os.path.join(REPO_DIR, "prompts", name), os.path.join(_workdir, "prompts", target))
+        os.environ.setdefault("ANTHROPIC_API_KEY", "bench")
+        os.environ.setdefault("TAVILY_API_KEY", "bench")
+        os.environ["NETMIKOAI_DATA_DIR"] = os.path.join(_workdir, ".netmikoai")
+        if not keep:
+            atexit.register(_remove, _workdir)
+    os.environ.update(env or {})
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    os.chdir(_workdir)
+    return _workdir
@@ -0,0 +1,78 @@
+import json
+import os
+import uuid
+
+from exec_runtime import TIMING_PROFILES_ENV, CAPTURE_FILE_ENV
+from inventory import SOURCES_ENV as INVENTORY_SOURCES_ENV
+from result_cache import CACHE_FILE_ENV, ResultCache
+from cassettes import (DEVICE_CASSETTE_ENV, DEVICE_CASSETTE_MODE_ENV, DEVICE_CURSOR_ENV, LATENCY_SCALE_ENV,
+                       LATENCY_FIXED_ENV, STRICT_ENV)
+from timing_profiles import timing_profiles
+from snapshots import snapshot_store
+from topology import topology
+from config import (CAPTURE_DIR, INVENTORY_SOURCES, RESULT_CACHE_FILE, RESULT_CACHE_DEFAULT_TTL,
+                    DEVICE_CASSETTE_MODE, DEVICE_CASSETTE_FILE, CASSETTE_LATENCY_SCALE, CASSETTE_LATENCY_FIXED, CASSETTE_STRICT)
+
+result_cache = ResultCache(RESULT_CACHE_FILE, RESULT_CACHE_DEFAULT_TTL)
+
+def new_capture_file():
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    return os.path.join(CAPTURE_DIR, f"{uuid.uuid4().hex}.jsonl")
+
+def runtime_env(capture_file, use_cache=True):
+    """Environment for a process started under exec_runtime."""
+    env = dict(os.environ)
+    env[TIMING_PROFILES_ENV] = os.path.abspath(timing_profiles.path)
+    env[CAPTURE_FILE_ENV] = os.path.abspath(capture_file)
+    env.pop(CACHE_FILE_ENV, None)
+    if use_cache:
+        env[CACHE_FILE_ENV] = os.path.abspath(result_cache.path)
+    # Scripts load the same inventory with inventory.load_inventory()
+    env[INVENTORY_SOURCES_ENV] = ",".join(os.path.abspath(path) for path in INVENTORY_SOURCES)
+    if DEVICE_CASSETTE_MODE:
+        env[DEVICE_CASSETTE_ENV] = os.path.abspath(DEVICE_CASSETTE_FILE)
+        env[DEVICE_CASSETTE_MODE_ENV] = DEVICE_CASSETTE_MODE
+        env[LATENCY_SCALE_ENV] = str(CASSETTE_LATENCY_SCALE)
+        env[LATENCY_FIXED_ENV] = str(CASSETTE_LATENCY_FIXED)
+        env[STRICT_ENV] = "1" if CASSETTE_STRICT else "0"
+        if DEVICE_CASSETTE_MODE == "replay":
+            env[DEVICE_CURSOR_ENV] = device_cursor()
+    return env
+
+_cursor_reset = False
+
+def device_cursor():
+    """Cursor file of the device cassette, emptied the first time this process replays a script."""
+    global _cursor_reset
+    path = os.path.abspath(DEVICE_CASSETTE_FILE) + ".cursor"
+    if not _cursor_reset:
+        open(path, 'w').close()
+        _cursor_reset = True
+    return path
+
+def read_capture(capture_file):
+    records = []
+    try:
+        with open(capture_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return records
+
+def process_capture(capture_file):
+    """
+    Hand the records exec_runtime captured during one run to every consumer
+    (timing profiles, config snapshots, topology, result cache), then
+    delete the capture file.
+    Returns the records.
+    """
+    records = read_capture(capture_file)
+    timing_profiles.ingest(records)
+    snapshot_store.ingest(records)
+    topology.ingest(records)
+    result_cache.ingest(records)
+    if os.path.exists(capture_file):
+        os.remove(capture_file)
+    return records
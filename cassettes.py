@@ -0,0 +1,325 @@
+"""
+Record and replay of model and device interactions.
+
+API cassettes wrap the Anthropic async client: in 'record' mode every
+Messages request is sent to the API and its response (with the rate limit
+headers, or the events of a streamed request) is appended to a JSONL
+cassette; in 'replay' mode nothing is sent and responses come from the
+cassette. Device cassettes do the same for the commands scripts send
+through netmiko, inside exec_runtime: recorded as (host, method, command,
+output, elapsed), replayed by connections that never open a socket, so a
+replayed run needs neither devices nor netmiko.
+
+Requests are matched on a digest of the request with ids and clock times
+masked, in recorded order per digest; a request that was not recorded is
+answered by the next unused recording for the same model, or raises
+CassetteMiss in strict mode. Device commands only ever match the same
+host, method and command; once its recordings are used up, the last one
+is repeated (not in strict mode). Every script runs in its own process,
+so which device recordings are used is kept in a cursor file next to the
+cassette, reset by the chat process when it first replays a script.
+Replay waits recorded latency * scale + fixed seconds, so sessions can
+be re-run deterministically at recorded, compressed or exaggerated speed.
+
+The device part is standard library only; the environment variables below
+carry its settings from the chat process into exec_runtime.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEVICE_CASSETTE_ENV = "NETMIKOAI_DEVICE_CASSETTE"
+DEVICE_CASSETTE_MODE_ENV = "NETMIKOAI_DEVICE_CASSETTE_MODE"
+DEVICE_CURSOR_ENV = "NETMIKOAI_DEVICE_CASSETTE_CURSOR"
+LATENCY_SCALE_ENV = "NETMIKOAI_CASSETTE_LATENCY_SCALE"
+LATENCY_FIXED_ENV = "NETMIKOAI_CASSETTE_LATENCY_FIXED"
+STRICT_ENV = "NETMIKOAI_CASSETTE_STRICT"
+
+# Values that differ between otherwise identical runs
+_VOLATILE = re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b|\b[0-9a-f]{32}\b|"
+                       r"\b[0-9a-f]{20}\.txt\b|\b\d{1,2}:\d{2}:\d{2}(\.\d+)?\b|\b\d+(\.\d+)?s (old|ago)\b|toolu_\w+")
+
+class CassetteMiss(KeyError):
+    """A replayed request or command that is not in the cassette."""
+
+def request_digest(request):
+    text = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(_VOLATILE.sub("*", text).encode("utf-8")).hexdigest()[:24]
+
+def latency_settings():
+    return float(os.environ.get(LATENCY_SCALE_ENV, "1.0")), float(os.environ.get(LATENCY_FIXED_ENV, "0"))
+
+class Cassette:
+    """
+    JSONL file of recorded interactions, each with a key, a group (what a
+    non-matching request may fall back to) and a latency. With a cursor
+    file, the recordings used are shared by every process replaying it.
+    """
+
+    def __init__(self, path, mode, latency_scale=1.0, latency_fixed=0.0, strict=False, cursor=None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Cassette mode must be 'record' or 'replay', not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.latency_fixed = latency_fixed
+        self.strict = strict
+        self.cursor = cursor
+        self.entries = []
+        self.used = set()
+        self.stats = {"recorded": 0, "replayed": 0, "fallbacks": 0}
+        self._lock = threading.Lock()
+        if mode == "replay":
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = [json.loads(line) for line in f if line.strip()]
+        elif os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def record(self, entry):
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+            self.stats["recorded"] += 1
+
+    @contextmanager
+    def _shared_cursor(self):
+        if not self.cursor:
+            yield None
+            return
+        with open(self.cursor, 'a+', encoding='utf-8') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            self.used.update(int(line) for line in f if line.strip())
+            yield f
+
+    def take(self, key, group=None, repeat_last=False):
+        """
+        The next unused recording for key, else (unless strict) the next for
+        group, or with repeat_last the last recording for key.
+        """
+        with self._lock, self._shared_cursor() as cursor:
+            match = next((i for i, entry in enumerate(self.entries) if i not in self.used and entry["key"] == key), None)
+            if match is None and not self.strict and group is not None:
+                match = next((i for i, entry in enumerate(self.entries) if i not in self.used and entry["group"] == group), None)
+                self.stats["fallbacks"] += match is not None
+            if match is None and not self.strict and repeat_last:
+                match = next((i for i in range(len(self.entries) - 1, -1, -1) if self.entries[i]["key"] == key), None)
+                self.stats["fallbacks"] += match is not None
+            if match is None:
+                raise CassetteMiss(f"No recording left in {self.path} for {key}" + (f" or {group}" if group else ""))
+            if match not in self.used and cursor is not None:
+                cursor.write(f"{match}\n")
+            self.used.add(match)
+            self.stats["replayed"] += 1
+            return self.entries[match]
+
+    def delay(self, latency):
+        return max(0.0, (latency or 0.0) * self.latency_scale + self.latency_fixed)
+
+# API side
+
+class _RawResponse:
+    def __init__(self, response, headers):
+        self.headers = headers
+        self._response = response
+
+    async def parse(self):
+        return self._response
+
+class _RawMessages:
+    def __init__(self, messages):
+        self._messages = messages
+
+    async def create(self, **request):
+        return await self._messages._create(request, raw=True)
+
+class _UnrecordedBatches:
+    def __getattr__(self, name):
+        raise CassetteMiss("Message batches are not recorded; analyses run interactively while a cassette is in use")
+
+class _Messages:
+    def __init__(self, client, cassette):
+        self._client = client
+        self._cassette = cassette
+        self.with_raw_response = _RawMessages(self)
+        # Message batches are not recorded
+        self.batches = client.messages.batches if client is not None else _UnrecordedBatches()
+
+    async def create(self, **request):
+        if request.get("stream"):
+            return await self._stream(request)
+        return await self._create(request, raw=False)
+
+    async def _create(self, request, raw):
+        key = request_digest(request)
+        group = request.get("model", "")
+        if self._cassette.mode == "replay":
+            from anthropic.types import Message
+            entry = self._cassette.take(key, group)
+            await asyncio.sleep(self._cassette.delay(entry["latency"]))
+            response = Message.model_validate(entry["response"])
+            return _RawResponse(response, entry.get("headers", {})) if raw else response
+        start = time.monotonic()
+        if raw:
+            raw_response = await self._client.messages.with_raw_response.create(**request)
+            response = await raw_response.parse()
+            headers = {name: value for name, value in raw_response.headers.items() if name.startswith("anthropic-ratelimit-")}
+        else:
+            response = await self._client.messages.create(**request)
+            headers = {}
+        self._cassette.record({"kind": "message", "key": key, "group": group, "latency": time.monotonic() - start,
+                               "headers": headers, "response": response.model_dump(mode="json")})
+        return _RawResponse(response, headers) if raw else response
+
+    async def _stream(self, request):
+        key = request_digest(request)
+        group = request.get("model", "")
+        cassette = self._cassette
+        if cassette.mode == "replay":
+            from pydantic import TypeAdapter
+            from anthropic.types import RawMessageStreamEvent
+            entry = cassette.take(key, group)
+            adapter = TypeAdapter(RawMessageStreamEvent)
+
+            async def replay():
+                for index, (offset, event) in enumerate(entry["events"]):
+                    # The fixed latency is added once, before the first event
+                    await asyncio.sleep(cassette.delay(offset) if index == 0 else offset * cassette.latency_scale)
+                    yield adapter.validate_python(event)
+            return replay()
+
+        stream = await self._client.messages.create(**request)
+
+        async def record():
+            events = []
+            last = time.monotonic()
+            async for event in stream:
+                now = time.monotonic()
+                events.append((now - last, event.model_dump(mode="json")))
+                last = now
+                yield event
+            cassette.record({"kind": "stream", "key": key, "group": group, "latency": sum(offset for offset, _ in events),
+                             "events": events})
+        return record()
+
+class CassetteClient:
+    """
+    Stand-in for AsyncAnthropic that records to or replays from a cassette.
+    Covers messages.create (streaming included) and
+    messages.with_raw_response.create as used by the rate limiter.
+    """
+
+    def __init__(self, client, cassette):
+        self.cassette = cassette
+        self.messages = _Messages(client, cassette)
+
+def wrap_client(client, path, mode, latency_scale=1.0, latency_fixed=0.0, strict=False):
+    return CassetteClient(client if mode == "record" else None,
+                          Cassette(path, mode, latency_scale, latency_fixed, strict))
+
+# Device side
+
+def command_key(command):
+    return " ".join(str(command).split()).lower()
+
+class ReplayConnection:
+    """A netmiko connection that answers from a device cassette."""
+
+    def __init__(self, cassette, host=None, ip=None, device_type="", **kwargs):
+        self.cassette = cassette
+        self.host = host or ip
+        self.device_type = device_type
+        self.base_prompt = self.host
+
+    def _replay(self, method, command):
+        # Never the output of a different command
+        entry = self.cassette.take(f"{self.host}|{method}|{command_key(command)}", repeat_last=True)
+        time.sleep(self.cassette.delay(entry["latency"]))
+        return entry["output"]
+
+    def send_command(self, command_string, *args, **kwargs):
+        return self._replay("send_command", command_string)
+
+    def send_command_timing(self, command_string, *args, **kwargs):
+        return self._replay("send_command_timing", command_string)
+
+    def send_config_set(self, config_commands=None, *args, **kwargs):
+        return self._replay("send_config_set", config_commands)
+
+    def send_config_from_file(self, config_file=None, *args, **kwargs):
+        return self._replay("send_config_from_file", config_file)
+
+    def find_prompt(self, *args, **kwargs):
+        return f"{self.base_prompt}#"
+
+    def enable(self, *args, **kwargs):
+        return ""
+
+    def config_mode(self, *args, **kwargs):
+        return ""
+
+    def exit_config_mode(self, *args, **kwargs):
+        return ""
+
+    def save_config(self, *args, **kwargs):
+        return ""
+
+    def is_alive(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.disconnect()
+
+def device_cassette():
+    """The device cassette configured in the environment, or None."""
+    path = os.environ.get(DEVICE_CASSETTE_ENV)
+    mode = os.environ.get(DEVICE_CASSETTE_MODE_ENV)
+    if not path or not mode:
+        return None
+    return Cassette(path, mode, *latency_settings(), strict=os.environ.get(STRICT_ENV) == "1",
+                    cursor=os.environ.get(DEVICE_CURSOR_ENV) if mode == "replay" else None)
+
+def record_command(cassette, host, method, command, output, elapsed):
+    cassette.record({"kind": "command", "key": f"{host}|{method}|{command_key(command)}", "group": f"{host}|{method}",
+                     "latency": elapsed, "output": output})
+
+# Exceptions scripts commonly import, for replays where netmiko is not installed
+NETMIKO_EXCEPTIONS = ("NetmikoTimeoutException", "NetmikoAuthenticationException", "NetMikoTimeoutException",
+                      "NetMikoAuthenticationException", "ReadTimeout", "ConfigInvalidException")
+
+def netmiko_stub(connect_handler):
+    """Modules to stand in for netmiko and netmiko.exceptions."""
+    import types
+    netmiko = types.ModuleType("netmiko")
+    exceptions = types.ModuleType("netmiko.exceptions")
+    for name in NETMIKO_EXCEPTIONS:
+        setattr(exceptions, name, type(name, (Exception,), {}))
+        setattr(netmiko, name, getattr(exceptions, name))
+    netmiko.exceptions = exceptions
+    netmiko.ConnectHandler = connect_handler
+    return {"netmiko": netmiko, "netmiko.exceptions": exceptions}
+
+def replay_connect_handler(cassette):
+    def ConnectHandler(*args, **kwargs):
+        host = kwargs.get("host") or kwargs.get("ip")
+        entry = cassette.take(f"{host}|connect|", repeat_last=True)
+        time.sleep(cassette.delay(entry["latency"]))
+        return ReplayConnection(cassette, *args, **kwargs)
+    return ConnectHandler
@@ -0,0 +1,234 @@
+import difflib
+import hashlib
+import re
+from functools import lru_cache
+
+from config import CLUSTER_MIN_DEVICES, CLUSTER_MIN_OUTPUT_CHARS, CLUSTER_MAX_MEMBERS, CLUSTER_MAX_SHAPES
+
+# Volatile tokens, one alternation so an output is scanned once. Small
+# numbers stay (port counts, VLANs, slot numbers are part of the shape);
+# long numbers, durations and numbers next to a counter unit are masked.
+# Error and drop counters only lose their value when it is not zero, so a
+# device with errors never shares a shape with a clean one.
+_MONTHS = r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*"
+_FAULTS = r"(?:errors|drops|discards|runts|giants|throttles|collisions|crc|resets|underruns|overruns|ignored)"
+_FAULT_UNITS = rf"(?:(?:input|output)\s+)?{_FAULTS}\b"
+_COUNTER_UNITS = r"(?:%|(?:[kmg]?bits|[kmg]?bytes|[kmg]?bps|pps|packets|pkts|frames|broadcasts|multicasts|interrupts|octets|input|output)\b)"
+_VOLATILE = re.compile(rf"""
+    (?P<prompt>^[\w.-]+(?:\([\w-]+\))?[#>])
+  | (?P<mac>\b[0-9a-f]{{4}}\.[0-9a-f]{{4}}\.[0-9a-f]{{4}}\b|\b[0-9a-f]{{2}}(?:[:-][0-9a-f]{{2}}){{5}}\b)
+  | (?P<serial>\b(?-i:[A-Z]{{2,4}}\d{{4}}[A-Z0-9]{{2,}})\b)
+  | (?P<time>\b\d{{1,2}}:\d{{2}}:\d{{2}}(?:\.\d+)?\b)
+  | (?P<date>\b\d{{4}}-\d{{2}}-\d{{2}}\b|\b{_MONTHS}\s+\d{{1,2}}(?:,?\s+\d{{4}})?\b)
+  | (?P<ip>\b\d{{1,3}}(?:\.\d{{1,3}}){{3}}(?:/\d{{1,2}})?\b)
+  | (?P<ip6>(?<![\w:])(?:[0-9a-f]{{1,4}}:|:){{2,7}}[0-9a-f]{{0,4}}(?:/\d{{1,3}})?(?![\w:]))
+  | (?P<duration>\b\d+\s*(?:years?|weeks?|days?|hours?|minutes?|mins?|seconds?|secs?)\b|\b(?:\d+[ywdhms]){{2,}}\b)
+  | (?P<fault>(?<![\w/.:-])0*[1-9]\d*(?=\s*{_FAULT_UNITS})|\b{_FAULTS}\s*[:=]\s*0*[1-9]\d*\b)
+  | (?P<counter>(?<![\w/.:-])\d+(?:\.\d+)?(?=\s*{_COUNTER_UNITS})(?!\s*{_FAULT_UNITS})|(?<![\w/.:-])\d{{4,}}(?:\.\d+)?(?![\w/:-]))
+""", re.I | re.M | re.X)
+
+# Lines that name the device itself
+_HOSTNAME_LINE = re.compile(r"^(?:(?:hostname|host-name|set system host-name)\s+\"?([^\"\s;]+)|([\w.-]+) uptime is)", re.M)
+_BLANKS = re.compile(r"[ \t]+")
+
+@lru_cache(maxsize=65536)
+def _normalize_line(line):
+    # Fleet outputs repeat most lines verbatim, so lines are masked once
+    return _BLANKS.sub(" ", _VOLATILE.sub(lambda m: f"<{m.lastgroup}>", line)).rstrip()
+
+def normalize_output(text, names=()):
+    """
+    Output with hostnames, addresses, MACs, serials, times, durations,
+    counters and non-zero error counters masked and column padding collapsed. Line structure is kept,
+    so line i of the normalized text corresponds to line i of the original.
+    """
+    names = {name for name in names if name} | {name for match in _HOSTNAME_LINE.findall(text) for name in match if name}
+    text = "\n".join(_normalize_line(line) for line in text.strip().split("\n"))
+    if names:
+        # Names are masked last; masking leaves the name tokens of a line intact
+        alternatives = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+        text = re.sub(rf"(?<![\w.-])(?:{alternatives})(?![\w-])", "<name>", text, flags=re.I)
+    return text
+
+def cluster_outputs(outputs, names=None):
+    """
+    Group the outputs of one command by shape. outputs maps host -> raw
+    output, names optionally maps host -> names of that device to mask.
+    Returns clusters, largest first, as dicts with members, the raw output
+    of the first member and its normalized lines.
+    """
+    names = names or {}
+    clusters = {}
+    for host, output in outputs.items():
+        normalized = normalize_output(output, names.get(host, ()))
+        key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:20]
+        if key not in clusters:
+            clusters[key] = {"shape": key, "members": [], "output": output.strip(), "normalized": normalized.split("\n")}
+        clusters[key]["members"].append(host)
+    return sorted(clusters.values(), key=lambda cluster: -len(cluster["members"]))
+
+def shape_diff(base, other):
+    """
+    Lines where other's shape differs from base's, as -/+ lines taken from
+    the raw outputs, so only real differences show with their real values.
+    """
+    base_lines = base["output"].split("\n")
+    other_lines = other["output"].split("\n")
+    lines = []
+    matcher = difflib.SequenceMatcher(None, base["normalized"], other["normalized"], autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        lines.append(f"@@ line {j1 + 1}")
+        lines.extend("- " + line for line in base_lines[i1:i2])
+        lines.extend("+ " + line for line in other_lines[j1:j2])
+    return "\n".join(lines)
+
+def _members(hosts, limit=CLUSTER_MAX_MEMBERS):
+    shown = ", ".join(hosts[:limit])
+    return shown + (f" (+{len(hosts) - limit} more)" if len(hosts) > limit else "")
+
+def format_clusters(command, clusters, max_shapes=CLUSTER_MAX_SHAPES, raw_path=None):
+    """
+    Text for the model: the largest cluster in full, every other shape as a
+    diff against the closest larger one (or in full if that is shorter),
+    single-device outliers last, and where every device's raw output is.
+    """
+    total = sum(len(cluster["members"]) for cluster in clusters)
+    shown = clusters[:max_shapes]
+    lines = [f"=== '{command}' on {total} device(s): {len(clusters)} distinct output shape(s) "
+             f"(hostnames, addresses, times and counters masked for grouping; non-zero error counters "
+             f"are grouped apart from zero ones) ==="]
+    if raw_path:
+        lines.append(f"Raw output of every device: {raw_path}")
+    outliers = []
+    for number, cluster in enumerate(shown, 1):
+        if len(cluster["members"]) == 1 and number > 1:
+            outliers.append((number, cluster))
+            continue
+        lines.append(f"[cluster {number}] {len(cluster['members'])} device(s): {_members(cluster['members'])}")
+        lines.append(_shape_text(shown, number))
+    if outliers:
+        lines.append(f"Outliers ({len(outliers)} device(s) with a unique output):")
+        for number, cluster in outliers:
+            lines.append(f"[cluster {number}] {cluster['members'][0]}")
+            lines.append(_shape_text(shown, number))
+    hidden = clusters[max_shapes:]
+    if hidden:
+        lines.append(f"... {len(hidden)} more shape(s) on {sum(len(c['members']) for c in hidden)} device(s) are left as printed above")
+    return "\n".join(lines)
+
+def _shape_text(clusters, number, candidates=5):
+    cluster = clusters[number - 1]
+    full = f"Representative output ({cluster['members'][0]}):\n{cluster['output']}"
+    if number == 1:
+        return full
+    # Compare against the few largest shapes and keep the shortest diff
+    diffs = [(len(diff), base, diff) for base in range(1, min(number, candidates + 1))
+             for diff in [shape_diff(clusters[base - 1], cluster)]]
+    size, base, diff = min(diffs)
+    if size < len(cluster["output"]):
+        return f"Differs from cluster {base} ({cluster['members'][0]}):\n{diff}"
+    return full
+
+def find_verbatim(stdout, texts):
+    """
+    Positions where one of texts was printed starting at a line start, as
+    (start, text), in a single pass over stdout; the longest text wins
+    where several start at the same place.
+    """
+    by_first_line = {}
+    for text in sorted(texts, key=len, reverse=True):
+        by_first_line.setdefault(text.split("\n", 1)[0], []).append(text)
+    found = []
+    position = 0
+    while position < len(stdout):
+        end = stdout.find("\n", position)
+        end = len(stdout) if end == -1 else end
+        for text in by_first_line.get(stdout[position:end].rstrip("\r"), ()):
+            if stdout.startswith(text, position):
+                found.append((position, text))
+                end = position + len(text)
+                break
+        position = end + 1
+    return found
+
+# Words a per-device banner may carry besides the device name, e.g. "Output from r1:"
+_HEADER_WORDS = {"host", "device", "router", "switch", "output", "from", "for", "of"}
+
+def _is_header(line, known):
+    """True if line names a clustered device and holds nothing else but label words and decoration."""
+    named = False
+    for token in re.findall(r"[\w.:-]+", line):
+        token = token.strip(".:-")
+        if token in known:
+            named = True
+        elif token and token.lower() not in _HEADER_WORDS:
+            return False
+    return named
+
+def _only_headers(body, references, known):
+    """True if every line left besides the cluster references is a banner naming one of the known devices."""
+    for line in body.split("\n"):
+        line = line.strip()
+        if line and line not in references and not _is_header(line, known):
+            return False
+    return True
+
+def condense_output(stdout, records, names=None, min_devices=CLUSTER_MIN_DEVICES, max_shapes=CLUSTER_MAX_SHAPES,
+                    store=None):
+    """
+    Replace per-device outputs that a script printed verbatim with a short
+    reference to their cluster, and append one representative per cluster.
+    records are the capture records of the run. Commands that ran on fewer
+    than min_devices devices, and outputs the script did not print as-is,
+    are left alone; stdout is returned unchanged if nothing got shorter.
+    store, if given, saves a text and returns its path; the raw outputs of
+    each clustered command are saved through it so they can be read back.
+    """
+    candidates = {}
+    for record in records:
+        output = record.get("output")
+        if record.get("host") and isinstance(output, str) and len(output.strip()) >= CLUSTER_MIN_OUTPUT_CHARS:
+            command = record.get("command")
+            command = command if isinstance(command, str) else "; ".join(map(str, command or []))
+            # The last output of a device wins when a script repeats a command
+            candidates.setdefault(command, {})[record["host"]] = output.strip()
+    found = find_verbatim(stdout, {text for outputs in candidates.values() for text in outputs.values()})
+    printed = {text for _, text in found}
+    references = {}
+    sections = []
+    # Hosts, their given names and the hostnames their outputs report
+    known = set()
+    for command, outputs in candidates.items():
+        outputs = {host: text for host, text in outputs.items() if text in printed}
+        if len(outputs) < min_devices:
+            continue
+        for host, text in outputs.items():
+            known.add(host)
+            known.update((names or {}).get(host, ()))
+            known.update(name for match in _HOSTNAME_LINE.findall(text) for name in match if name)
+        clusters = cluster_outputs(outputs, names)
+        for number, cluster in enumerate(clusters[:max_shapes], 1):
+            for host in cluster["members"]:
+                references.setdefault(outputs[host], f"[output of '{command}': cluster {number}, shown below]")
+        raw_path = store("\n".join(f"===== {host} =====\n{text}" for host, text in sorted(outputs.items()))) if store else None
+        sections.append(format_clusters(command, clusters, max_shapes, raw_path))
+    if not sections:
+        return stdout
+    pieces = []
+    last = 0
+    replaced = 0
+    for start, text in found:
+        if text in references:
+            replaced += 1
+            pieces.append(stdout[last:start])
+            pieces.append(references[text])
+            last = start + len(text)
+    pieces.append(stdout[last:])
+    body = "".join(pieces).rstrip()
+    if _only_headers(body, set(references.values()), known):
+        # The rest is one banner line per device, which the member lists already say
+        body = f"[The script printed a header line per device followed by its output; {replaced} outputs are grouped below]"
+    condensed = body + "\n\n" + "\n\n".join(sections)
+    return condensed if len(condensed) < len(stdout) else stdout
@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+from routing import create_routed
+from ratelimit import estimate_input_tokens
+from config import COMPACT_THRESHOLD_TOKENS, COMPACT_KEEP_TURNS, COMPACT_RESULT_CHARS
+
+STATE_HEADER = "[Session state: older turns of this conversation, compacted]"
+
+SUMMARY_PROMPT = """Compact the older part of a network engineering session into a session state block that replaces it in the conversation. Keep every fact the session may still need, drop narration and repeated output. Use exactly these sections, with short bullets:
+
+Goal: what the user asked for and any constraints they set
+Devices: hosts, platforms, credentials source and access details in use (never passwords)
+Findings: facts established from device output, with the exact values (versions, interfaces, addresses, neighbors, errors)
+Changes: configuration pushed to devices, and whether it was verified or rolled back
+Files: files created or edited and what they contain
+Open: what is unresolved or was about to be done next
+
+If the transcript starts with an earlier session state block, merge it in. Answer with the sections only.
+
+Transcript:
+{transcript}"""
+
+def _block_text(block):
+    if block.get("type") == "text":
+        return block["text"]
+    if block.get("type") == "tool_use":
+        return f"[tool_use {block['name']}] {json.dumps(block['input'], default=str)[:COMPACT_RESULT_CHARS]}"
+    if block.get("type") == "tool_result":
+        content = str(block.get("content", ""))
+        clipped = content[:COMPACT_RESULT_CHARS] + (f" ... ({len(content) - COMPACT_RESULT_CHARS} chars clipped)" if len(content) > COMPACT_RESULT_CHARS else "")
+        return f"[tool_result{' error' if block.get('is_error') else ''}] {clipped}"
+    return f"[{block.get('type')} block]"
+
+def transcript(messages):
+    lines = []
+    for message in messages:
+        content = message["content"]
+        text = content if isinstance(content, str) else "\n".join(_block_text(block) for block in content)
+        lines.append(f"{message['role'].upper()}: {text}")
+    return "\n\n".join(lines)
+
+def is_user_turn(message):
+    """True for a message the user typed, as opposed to tool results sent back to the model."""
+    if message["role"] != "user":
+        return False
+    content = message["content"]
+    return isinstance(content, str) or not any(block.get("type") == "tool_result" for block in content)
+
+def split_point(history, keep_turns=COMPACT_KEEP_TURNS):
+    """
+    Index where the last keep_turns user turns begin, so that the kept part
+    never starts inside a tool_use/tool_result exchange; 0 if there is
+    nothing older to compact.
+    """
+    starts = [index for index, message in enumerate(history) if is_user_turn(message)]
+    if len(starts) <= keep_turns:
+        return 0
+    cut = starts[-keep_turns]
+    # A lone previous state block is not worth summarizing again
+    return cut if cut > 2 else 0
+
+def history_tokens(history):
+    return estimate_input_tokens({"messages": history})
+
+class Compactor:
+    """
+    Background compaction of one session's conversation history.
+
+    After a turn, if the history passes threshold tokens, a task summarizes
+    everything before the last keep_turns user turns with the small model.
+    The result is swapped in by apply() at the start or end of a later
+    turn, never while a turn is building requests, and only if the
+    compacted messages are still the prefix of the history (a reset or
+    resume in between discards it). Pinned facts live in the system prompt
+    and are never summarized.
+    """
+
+    def __init__(self, limiter, threshold=COMPACT_THRESHOLD_TOKENS, keep_turns=COMPACT_KEEP_TURNS):
+        self.limiter = limiter
+        self.threshold = threshold
+        self.keep_turns = keep_turns
+        self.task = None
+        self.saved = 0
+        self.compactions = 0
+        self.last_error = None
+
+    def clear(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+        self.task = None
+        self.saved = 0
+
+    async def summarize(self, messages):
+        response = await create_routed(self.limiter, "compactor", messages=[
+            {"role": "user", "content": SUMMARY_PROMPT.format(transcript=transcript(messages))}])
+        return "".join(block.text for block in response.content if block.type == "text").strip()
+
+    async def _compact(self, history, cut):
+        summary = await self.summarize(history[:cut])
+        compacted = [{"role": "user", "content": f"{STATE_HEADER}\n\n{summary}"},
+                     {"role": "assistant", "content": "Understood. I will continue from this session state."}]
+        return history[:cut], compacted
+
+    def maybe_start(self, history):
+        """Start compacting history in the background if it is over the threshold and no compaction is running."""
+        if self.task or self.threshold <= 0 or history_tokens(history) < self.threshold:
+            return False
+        cut = split_point(history, self.keep_turns)
+        if not cut:
+            return False
+        self.task = asyncio.ensure_future(self._compact(list(history), cut))
+        return True
+
+    def apply(self, history):
+        """
+        The history with a finished compaction swapped in, or history itself
+        if none is ready or it no longer applies.
+        """
+        if not self.task or not self.task.done():
+            return history
+        task, self.task = self.task, None
+        if task.cancelled():
+            return history
+        if task.exception():
+            self.last_error = str(task.exception())
+            return history
+        replaced, compacted = task.result()
+        if len(history) < len(replaced) or any(a is not b for a, b in zip(history, replaced)):
+            return history
+        self.saved += history_tokens(replaced) - history_tokens(compacted)
+        self.compactions += 1
+        return compacted + history[len(replaced):]
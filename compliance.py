@@ -0,0 +1,255 @@
+import fnmatch
+import json
+import re
+from collections import namedtuple
+
+from snapshots import split_stanzas, snapshot_store
+from workers import parallel_map
+from config import COMPLIANCE_RULES_FILE, COMPLIANCE_MAX_REPORTED, PARALLEL_MIN_ITEMS
+
+RULE_TYPES = ("required", "forbidden", "threshold")
+SEVERITIES = ("low", "medium", "high", "critical")
+
+Violation = namedtuple("Violation", ["host", "rule", "severity", "message"])
+
+_compiled_cache = {}
+
+# Inline flags at the start of a pattern, e.g. "(?i)"; re only accepts them
+# there, so inside an alternation they must become a scoped group
+_LEADING_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+# Numbered backreferences and group conditions, which would point at the
+# wrong group once the pattern sits behind the groups of other rules
+_GROUP_NUMBER_REFERENCE = re.compile(r"\\[1-9]|\(\?\(\d")
+
+def load_rules(path=COMPLIANCE_RULES_FILE):
+    """
+    Read rules from a YAML or JSON file holding a list of rules or {"rules": [...]}.
+    A missing file means no rules.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith((".yaml", ".yml")):
+                import yaml
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+    except FileNotFoundError:
+        return []
+    if isinstance(data, dict):
+        data = data.get("rules", [])
+    return data or []
+
+class _Rule:
+    def __init__(self, spec, index):
+        self.id = str(spec.get("id") or f"rule-{index}")
+        self.type = spec.get("type", "required")
+        if self.type not in RULE_TYPES:
+            raise ValueError(f"Rule {self.id}: type must be one of {', '.join(RULE_TYPES)}")
+        self.severity = spec.get("severity", "medium")
+        self.description = spec.get("description", "")
+        if "line" in spec:
+            pattern = r"^" + re.escape(spec["line"].strip()) + r"$"
+        elif "pattern" in spec:
+            pattern = spec["pattern"]
+        else:
+            raise ValueError(f"Rule {self.id}: needs a 'line' or 'pattern'")
+        try:
+            self.pattern = re.compile(pattern)
+            self.stanza = re.compile(spec["stanza"]) if spec.get("stanza") else None
+            self.unless = re.compile(spec["unless"]) if spec.get("unless") else None
+        except re.error as e:
+            raise ValueError(f"Rule {self.id}: invalid regular expression: {e}")
+        self.source = pattern
+        self.display = f"'{spec['line'].strip()}'" if "line" in spec else f"/{pattern}/"
+        self.min_count = int(spec.get("min_count", 1))
+        self.minimum = spec.get("min")
+        self.maximum = spec.get("max")
+        if self.type == "threshold":
+            if self.pattern.groups < 1:
+                raise ValueError(f"Rule {self.id}: a threshold pattern needs a capture group for the number")
+            if self.minimum is None and self.maximum is None:
+                raise ValueError(f"Rule {self.id}: a threshold needs 'min' and/or 'max'")
+        # A threshold that is absent is only a violation when the rule says so
+        self.required = bool(spec.get("required", self.type != "threshold"))
+        self.platforms = spec.get("platforms") or []
+
+    def applies_to(self, platform):
+        return not self.platforms or not platform or any(fnmatch.fnmatch(platform, p) for p in self.platforms)
+
+    def check(self, lines, where=""):
+        """Violations of this rule among the candidate lines of one scope."""
+        matches = [(line, m) for line in lines for m in [self.pattern.search(line)] if m]
+        suffix = f" in '{where}'" if where else ""
+        if self.type == "forbidden":
+            return [f"forbidden line present{suffix}: {line}" for line, _ in matches]
+        if self.type == "required":
+            if len(matches) < self.min_count:
+                expected = f"at least {self.min_count} lines" if self.min_count > 1 else "a line"
+                return [f"missing {expected} matching {self.display}{suffix}"]
+            return []
+        if not matches:
+            return [f"missing a line matching {self.display}{suffix}"] if self.required else []
+        messages = []
+        for line, m in matches:
+            try:
+                value = float(m.group(1))
+            except (TypeError, ValueError):
+                messages.append(f"no numeric value{suffix}: {line}")
+                continue
+            if (self.minimum is not None and value < self.minimum) or (self.maximum is not None and value > self.maximum):
+                bounds = f"[{'' if self.minimum is None else self.minimum}, {'' if self.maximum is None else self.maximum}]"
+                messages.append(f"value {m.group(1)} outside {bounds}{suffix}: {line}")
+        return messages
+
+def _scoped(pattern):
+    """The pattern with its leading inline flags turned into a scoped group."""
+    flags = ""
+    while True:
+        m = _LEADING_FLAGS.match(pattern)
+        if not m:
+            break
+        flags += m.group(1)
+        pattern = pattern[m.end():]
+    return f"(?{flags}:{pattern})" if flags else f"(?:{pattern})"
+
+class _LineFilter:
+    """
+    Whether a line can match any of a set of patterns. The patterns are
+    joined into one alternation; a pattern that cannot take part in it
+    (a numbered backreference, a group name used by another rule) is
+    searched on its own instead.
+    """
+
+    def __init__(self, patterns):
+        patterns = list(patterns)
+        self.separate = []
+        joined = []
+        for pattern in patterns:
+            scoped = _scoped(pattern)
+            try:
+                re.compile(scoped)
+            except re.error:
+                self.separate.append(re.compile(pattern))
+                continue
+            if _GROUP_NUMBER_REFERENCE.search(pattern):
+                self.separate.append(re.compile(pattern))
+            else:
+                joined.append((pattern, scoped))
+        try:
+            self.union = re.compile("|".join(scoped for _, scoped in joined)) if joined else None
+        except re.error:
+            # e.g. two rules naming a group alike; scan those rules one by one
+            self.union = None
+            self.separate.extend(re.compile(pattern) for pattern, _ in joined)
+
+    def search(self, line):
+        return bool((self.union and self.union.search(line)) or any(p.search(line) for p in self.separate))
+
+class CompiledRules:
+    """
+    A rule set compiled for fast evaluation.
+
+    All line patterns of the unscoped rules are joined into one alternation,
+    so a config is scanned once and only the few lines that match anything
+    are handed to the individual rules. Stanza-scoped rules are grouped the
+    same way on the stanza header; stanzas whose header matches no scope are
+    skipped without looking at their children. Leading inline flags such
+    as "(?i)" are scoped to their own rule, and a rule that cannot share the
+    alternation is scanned on its own.
+    """
+
+    def __init__(self, specs):
+        self.rules = [_Rule(spec, index) for index, spec in enumerate(specs, 1)]
+        self.global_rules = [rule for rule in self.rules if rule.stanza is None]
+        self.scoped_rules = [rule for rule in self.rules if rule.stanza is not None]
+        self.line_filter = _LineFilter(rule.source for rule in self.global_rules)
+        self.child_filter = _LineFilter(rule.source for rule in self.scoped_rules)
+        self.header_filter = _LineFilter(rule.stanza.pattern for rule in self.scoped_rules)
+
+    def evaluate(self, host, platform, text):
+        violations = []
+        stanzas = [stanza.split("\n") for stanza in split_stanzas(text)]
+        if self.global_rules:
+            candidates = [line.strip() for stanza in stanzas for line in stanza if self.line_filter.search(line.strip())]
+            for rule in self.global_rules:
+                if rule.applies_to(platform):
+                    violations.extend(Violation(host, rule.id, rule.severity, message) for message in rule.check(candidates))
+        if self.scoped_rules:
+            for stanza in stanzas:
+                header = stanza[0]
+                if not self.header_filter.search(header):
+                    continue
+                children = [line.strip() for line in stanza[1:]]
+                candidates = [line for line in children if self.child_filter.search(line)]
+                for rule in self.scoped_rules:
+                    if not rule.stanza.search(header) or not rule.applies_to(platform):
+                        continue
+                    if rule.unless and any(rule.unless.search(line) for line in children):
+                        continue
+                    violations.extend(Violation(host, rule.id, rule.severity, message) for message in rule.check(candidates, header))
+        return violations
+
+def compile_rules(specs):
+    """Compile a rule set, reusing the compiled form for a rule set seen before."""
+    key = specs if isinstance(specs, str) else json.dumps(specs, sort_keys=True)
+    if key not in _compiled_cache:
+        if len(_compiled_cache) >= 16:
+            _compiled_cache.clear()
+        _compiled_cache[key] = CompiledRules(json.loads(key))
+    return _compiled_cache[key]
+
+def _evaluate_one(item):
+    # Runs in a worker process; the rule set is compiled once per worker
+    key, host, platform, text = item
+    return compile_rules(key).evaluate(host, platform, text)
+
+def evaluate_fleet(specs, configs, min_items=PARALLEL_MIN_ITEMS):
+    """
+    Evaluate rules against many configs. configs is a list of
+    (host, platform, text); returns the list of violations. Large fleets are
+    spread over the shared process pool.
+    """
+    key = json.dumps(specs, sort_keys=True)
+    compile_rules(key)  # report rule errors before dispatching
+    results = parallel_map(_evaluate_one, [(key, host, platform, text) for host, platform, text in configs], min_items)
+    return [violation for violations in results for violation in violations]
+
+def check_compliance(specs, hosts=None, platforms=None):
+    """
+    Evaluate rules against the latest config snapshot of each host (all
+    snapshotted hosts by default) and return the text report for the model.
+    """
+    platforms = platforms or {}
+    configs = []
+    missing = []
+    for host in hosts or snapshot_store.hosts():
+        text = snapshot_store.get(host)
+        if text is None:
+            missing.append(host)
+        else:
+            configs.append((host, platforms.get(host), text))
+    report = format_report(evaluate_fleet(specs, configs), len(configs))
+    if missing:
+        report += (f"\nNo config snapshot for {len(missing)} device(s): {', '.join(missing[:20])}"
+                   + (" ..." if len(missing) > 20 else "")
+                   + ". Run 'show running-config' on them first; snapshots are taken automatically.")
+    return report
+
+def format_report(violations, checked, max_reported=COMPLIANCE_MAX_REPORTED):
+    failing = sorted({v.host for v in violations})
+    lines = [f"{checked} device(s) checked, {checked - len(failing)} compliant, {len(failing)} with violations, "
+             f"{len(violations)} violation(s) in total"]
+    if not violations:
+        return lines[0]
+    per_rule = {}
+    for violation in violations:
+        per_rule.setdefault((violation.rule, violation.severity), set()).add(violation.host)
+    lines.append("By rule: " + "; ".join(f"{rule} [{severity}] on {len(hosts)} device(s)"
+                                         for (rule, severity), hosts in sorted(per_rule.items(), key=lambda item: -len(item[1]))))
+    order = {severity: rank for rank, severity in enumerate(reversed(SEVERITIES))}
+    ranked = sorted(violations, key=lambda v: (order.get(v.severity, len(order)), v.host, v.rule))
+    for violation in ranked[:max_reported]:
+        lines.append(f"{violation.host}: {violation.rule} [{violation.severity}] {violation.message}")
+    if len(ranked) > max_reported:
+        lines.append(f"... {len(ranked) - max_reported} more violation(s) not shown")
+    return "\n".join(lines)
@@ -18,6 +18,173 @@ if not TAVILY_API_KEY:
 MAX_CONTEXT_TOKENS = 200000
 CONTINUATION_EXIT_PHRASE = "AUTOMODE_COMPLETE"
 MAX_CONTINUATION_ITERATIONS = 25
+CONTINUATION_PROMPT = "Continue with the next step. Or STOP by saying 'AUTOMODE_COMPLETE' if you think you've achieved the results established in the original request."
+# Added to the first request of an automode run started by the user, never to goal or batch sessions
+AUTOMODE_PLAN_PROMPT = ("In this first response, only plan: list the goals as lines of the form \"Goal N: <description>\" "
+                        "and do not call any tool, as a plan is only split into parallel sessions when nothing has been "
+                        "executed yet. Goals that only mention independent work run in parallel sessions; a goal that "
+                        "needs the result of another must mention it, e.g. \"Goal 3: Compare the VLANs found in Goal 1 "
+                        "and Goal 2\". You will receive every goal's result to review.")
+
+# Agentic tool loop limits per chat turn
+TOOL_LOOP_MAX_DEPTH = int(os.getenv("TOOL_LOOP_MAX_DEPTH", "10"))
+TOOL_LOOP_TOKEN_BUDGET = int(os.getenv("TOOL_LOOP_TOKEN_BUDGET", "400000"))
+
+# Model routing: tool follow-ups whose results total at most this many
+# characters (and contain no errors) are routed to the small tier
+ROUTE_SUMMARY_MAX_CHARS = int(os.getenv("ROUTE_SUMMARY_MAX_CHARS", "4000"))
+
+# Local state (journals, caches, stores) lives under this directory
+DATA_DIR = os.getenv("NETMIKOAI_DATA_DIR", ".netmikoai")
+
+# Execution analysis settings: "interactive" sends one request per execution,
+# "batch" queues them for the Message Batches API
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "interactive")
+BATCH_ANALYSIS_MODE = os.getenv("BATCH_ANALYSIS_MODE", "batch")
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "100"))
+ANALYSIS_POLL_INTERVAL = float(os.getenv("ANALYSIS_POLL_INTERVAL", "30"))
+ANALYSIS_RESULTS_FILE = os.path.join(DATA_DIR, "analysis_results.jsonl")
+ANALYSIS_BATCHES_FILE = os.path.join(DATA_DIR, "analysis_batches.json")
+
+# Image encoding settings
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1568"))
+IMAGE_TARGET_BYTES = int(os.getenv("IMAGE_TARGET_BYTES", str(750 * 1024)))
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "64"))
+IMAGE_CACHE_DIR = os.path.join(DATA_DIR, "image_cache")
+
+# Session journal settings
+JOURNAL_DIR = os.path.join(DATA_DIR, "sessions")
+JOURNAL_FSYNC_EVERY = int(os.getenv("JOURNAL_FSYNC_EVERY", "8"))
+JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL", "2.0"))
+
+# Web search settings
+TAVILY_BASE_URL = os.getenv("TAVILY_BASE_URL", "https://api.tavily.com")
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "15"))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "5"))
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "600"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(7 * 24 * 3600)))
+SEARCH_CACHE_FILE = os.path.join(DATA_DIR, "search_cache.sqlite")
+
+# Pre-flight script validation settings
+PREFLIGHT_MODULES_FILE = os.path.join(DATA_DIR, "preflight_modules.json")
+PREFLIGHT_MODULES_TTL = float(os.getenv("PREFLIGHT_MODULES_TTL", str(24 * 3600)))
+
+# Verified script template library
+SCRIPT_LIBRARY_FILE = os.path.join(DATA_DIR, "script_library.json")
+
+# Records captured by exec_runtime during each run
+CAPTURE_DIR = os.path.join(DATA_DIR, "captures")
+
+# Per-device Netmiko timing profiles learned from executions
+TIMING_PROFILES_FILE = os.path.join(DATA_DIR, "timing_profiles.json")
+TIMING_MAX_SAMPLES = int(os.getenv("TIMING_MAX_SAMPLES", "50"))
+TIMING_MIN_SAMPLES = int(os.getenv("TIMING_MIN_SAMPLES", "3"))
+TIMING_PERCENTILE = float(os.getenv("TIMING_PERCENTILE", "95"))
+TIMING_MARGIN = float(os.getenv("TIMING_MARGIN", "2.0"))
+TIMING_MAX_READ_TIMEOUT = float(os.getenv("TIMING_MAX_READ_TIMEOUT", "120.0"))
+TIMING_FAST_RTT = float(os.getenv("TIMING_FAST_RTT", "0.5"))
+TIMING_PROMPT_MAX_CHARS = int(os.getenv("TIMING_PROMPT_MAX_CHARS", "1000"))
+
+# Clustering of repeated per-device outputs in execute_code results
+CLUSTER_MIN_DEVICES = int(os.getenv("CLUSTER_MIN_DEVICES", "3"))
+CLUSTER_MIN_OUTPUT_CHARS = int(os.getenv("CLUSTER_MIN_OUTPUT_CHARS", "80"))
+CLUSTER_MAX_MEMBERS = int(os.getenv("CLUSTER_MAX_MEMBERS", "50"))
+CLUSTER_MAX_SHAPES = int(os.getenv("CLUSTER_MAX_SHAPES", "100"))
+
+# Shared TTL cache for results of read-only commands and scripts
+RESULT_CACHE_FILE = os.path.join(DATA_DIR, "result_cache.sqlite")
+RESULT_CACHE_DEFAULT_TTL = float(os.getenv("RESULT_CACHE_DEFAULT_TTL", "60"))
+
+# Differential re-polling: repeated show commands return a delta against
+# the previous output of the same (host, command) in the conversation
+REPOLL_OUTPUT_DIR = os.path.join(DATA_DIR, "outputs")
+REPOLL_MAX_AGE = float(os.getenv("REPOLL_MAX_AGE", "1800"))
+REPOLL_MIN_OUTPUT_CHARS = int(os.getenv("REPOLL_MIN_OUTPUT_CHARS", "200"))
+REPOLL_RETENTION = float(os.getenv("REPOLL_RETENTION", str(24 * 3600)))
+
+# Shared process pool for fleet-wide CPU work (config diffs, compliance)
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(os.cpu_count() or 1)))
+PARALLEL_MIN_ITEMS = int(os.getenv("PARALLEL_MIN_ITEMS", "32"))
+
+# Config snapshot store
+SNAPSHOT_DB_FILE = os.path.join(DATA_DIR, "snapshots.sqlite")
+SNAPSHOT_KEYFRAME_EVERY = int(os.getenv("SNAPSHOT_KEYFRAME_EVERY", "16"))
+
+# Topology graph built from CDP/LLDP neighbor output
+TOPOLOGY_FILE = os.path.join(DATA_DIR, "topology.json")
+
+# Device inventory sources (YAML, CSV or JSON), comma separated
+INVENTORY_SOURCES = [path.strip() for path in os.getenv("INVENTORY_SOURCES", "inventory.yaml").split(",") if path.strip()]
+
+# Compliance rules file (YAML or JSON)
+COMPLIANCE_RULES_FILE = os.getenv("COMPLIANCE_RULES_FILE", "compliance_rules.yaml")
+COMPLIANCE_MAX_REPORTED = int(os.getenv("COMPLIANCE_MAX_REPORTED", "200"))
+
+# Wave-based config rollout settings
+ROLLOUT_PYTHON = os.getenv("ROLLOUT_PYTHON", "conda run --no-capture-output -n netmikoai python")
+ROLLOUT_CANARY_SIZE = int(os.getenv("ROLLOUT_CANARY_SIZE", "1"))
+ROLLOUT_WAVE_GROWTH = float(os.getenv("ROLLOUT_WAVE_GROWTH", "2.0"))
+ROLLOUT_MAX_PARALLEL = int(os.getenv("ROLLOUT_MAX_PARALLEL", "8"))
+ROLLOUT_FAILURE_THRESHOLD = float(os.getenv("ROLLOUT_FAILURE_THRESHOLD", "0.1"))
+ROLLOUT_DEVICE_TIMEOUT = float(os.getenv("ROLLOUT_DEVICE_TIMEOUT", "120"))
+
+# Record/replay of API responses and device command transcripts (see
+# cassettes.py): a mode of "record" or "replay" and a JSONL cassette each
+API_CASSETTE_MODE = os.getenv("API_CASSETTE_MODE", "")
+API_CASSETTE_FILE = os.getenv("API_CASSETTE_FILE", os.path.join(DATA_DIR, "cassettes", "api.jsonl"))
+DEVICE_CASSETTE_MODE = os.getenv("DEVICE_CASSETTE_MODE", "")
+DEVICE_CASSETTE_FILE = os.getenv("DEVICE_CASSETTE_FILE", os.path.join(DATA_DIR, "cassettes", "devices.jsonl"))
+# Replayed latency is recorded latency * scale + fixed seconds
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))
+CASSETTE_LATENCY_FIXED = float(os.getenv("CASSETTE_LATENCY_FIXED", "0"))
+CASSETTE_STRICT = os.getenv("CASSETTE_STRICT", "0") not in ("0", "false", "no")
+
+# Interpreter that runs execute_code scripts under exec_runtime
+EXEC_PYTHON = os.getenv("EXEC_PYTHON", "conda run -n netmikoai python")
+
+# Batch automode settings
+BATCH_MAX_SESSIONS = int(os.getenv("BATCH_MAX_SESSIONS", "8"))
+BATCH_MAX_ITERATIONS = int(os.getenv("BATCH_MAX_ITERATIONS", "10"))
+
+# Conversation compaction: once the history passes this many estimated
+# tokens, turns before the last COMPACT_KEEP_TURNS user turns are
+# summarized by the small model in the background (0 disables)
+COMPACT_THRESHOLD_TOKENS = int(os.getenv("COMPACT_THRESHOLD_TOKENS", "60000"))
+COMPACT_KEEP_TURNS = int(os.getenv("COMPACT_KEEP_TURNS", "4"))
+COMPACT_RESULT_CHARS = int(os.getenv("COMPACT_RESULT_CHARS", "2000"))
+
+# Tool selection: each turn sends the core tools plus those its recent
+# intent calls for (set TOOLSET_SELECTION=0 to always send every tool)
+TOOLSET_SELECTION = os.getenv("TOOLSET_SELECTION", "1") not in ("0", "false", "no")
+TOOLSET_INTENT_TURNS = int(os.getenv("TOOLSET_INTENT_TURNS", "3"))
+TOOLSET_STICKY_TURNS = int(os.getenv("TOOLSET_STICKY_TURNS", "3"))
+
+# Goal executor: automode plans with several 'Goal N:' lines run as
+# concurrent sub-sessions, each goal after the goals it mentions
+GOAL_MAX_PARALLEL = int(os.getenv("GOAL_MAX_PARALLEL", "4"))
+GOAL_MAX_ITERATIONS = int(os.getenv("GOAL_MAX_ITERATIONS", "10"))
+GOAL_MIN_GOALS = int(os.getenv("GOAL_MIN_GOALS", "2"))
+
+# On-demand profiler ('profile on|off|dump'): sampling interval in
+# seconds, deepest stack kept per sample, allocation sites reported in
+# memory mode; dumps go to PROFILE_DIR
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "128"))
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "10"))
+
+# Shared API limiter settings
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "4"))
+API_REQUESTS_PER_MINUTE = int(os.getenv("API_REQUESTS_PER_MINUTE", "50"))
+API_INPUT_TOKENS_PER_MINUTE = int(os.getenv("API_INPUT_TOKENS_PER_MINUTE", "40000"))
+API_OUTPUT_TOKENS_PER_MINUTE = int(os.getenv("API_OUTPUT_TOKENS_PER_MINUTE", "8000"))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "6"))
+API_BACKOFF_BASE = float(os.getenv("API_BACKOFF_BASE", "1.0"))
+API_BACKOFF_MAX = float(os.getenv("API_BACKOFF_MAX", "60.0"))
+
+# Shared device pool settings
+DEVICE_POOL_MAX_CONNECTIONS = int(os.getenv("DEVICE_POOL_MAX_CONNECTIONS", "16"))
+DEVICE_POOL_MAX_PER_HOST = int(os.getenv("DEVICE_POOL_MAX_PER_HOST", "1"))
 
 # Load prompts from files
 def load_prompt(filename):
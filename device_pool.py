@@ -0,0 +1,44 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from config import DEVICE_POOL_MAX_CONNECTIONS, DEVICE_POOL_MAX_PER_HOST
+
+class DevicePool:
+    """
+    Shared admission control for device connections.
+
+    Scripts open their own SSH sessions inside the conda environment, so the
+    pool cannot hand out live connection objects. Instead it bounds how many
+    executions may talk to the fleet at once and to any single host, which
+    keeps parallel sessions from exhausting a device's vty lines.
+    """
+
+    def __init__(self, max_connections=DEVICE_POOL_MAX_CONNECTIONS, max_per_host=DEVICE_POOL_MAX_PER_HOST):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self._global = asyncio.Semaphore(max_connections)
+        self._hosts = {}
+        self.active = 0
+        self.peak = 0
+
+    def _host_semaphore(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        return self._hosts[host]
+
+    @asynccontextmanager
+    async def connection(self, host=None):
+        host_semaphore = self._host_semaphore(host) if host else None
+        if host_semaphore:
+            await host_semaphore.acquire()
+        try:
+            async with self._global:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+                try:
+                    yield
+                finally:
+                    self.active -= 1
+        finally:
+            if host_semaphore:
+                host_semaphore.release()
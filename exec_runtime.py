@@ -0,0 +1,162 @@
+"""
+Runtime wrapper for scripts started by execute_code.
+
+Runs inside the 'netmikoai' conda environment as
+
+    python -m exec_runtime <script.py>
+
+It hooks netmiko.ConnectHandler before the script is executed, so every
+connection the script opens gets the tuned timing parameters for its host,
+and every command sent is timed and appended to a capture file that the
+chat process reads back after the run. Read-only commands are answered
+from the shared result cache when it holds a fresh result, once per
+(host, command) per run, so polling loops still reach the device. With a
+device cassette configured, commands are recorded to it, or answered from
+it without touching a device (see cassettes.py). Standard library only;
+the script itself runs unchanged via runpy, so tracebacks keep their line
+numbers.
+"""
+import json
+import os
+import re
+import runpy
+import sys
+import time
+
+from result_cache import CACHE_FILE_ENV, ResultCache, changes_device, command_key, is_read_only
+from cassettes import device_cassette, record_command, replay_connect_handler, netmiko_stub
+
+TIMING_PROFILES_ENV = "NETMIKOAI_TIMING_PROFILES"
+CAPTURE_FILE_ENV = "NETMIKOAI_CAPTURE_FILE"
+
+# Netmiko's own timeouts; send_command returns as soon as the prompt is
+# seen, so a learned timeout may only ever extend these
+NETMIKO_DEFAULT_TIMEOUTS = {"read_timeout": 10.0, "conn_timeout": 10.0}
+
+COMMAND_METHODS = ("send_command", "send_command_timing", "send_config_set", "send_config_from_file")
+CACHED_METHODS = ("send_command", "send_command_timing")
+# Parsed output is not what the cache holds
+PARSER_ARGUMENTS = ("use_textfsm", "use_ttp", "use_genie")
+
+# Command outputs are kept in the capture for the chat process: full device
+# configurations (no filters) are snapshotted, neighbor tables feed the
+# topology graph, and repeated outputs across devices are clustered
+CONFIG_COMMAND_PATTERN = re.compile(
+    r"^\s*(sh(ow)?\s+run(ning-config)?|sh(ow)?\s+(startup-)?conf(ig(uration)?)?|display\s+current-configuration)\s*$", re.I)
+NEIGHBOR_COMMAND_PATTERN = re.compile(
+    r"^\s*(sh(ow)?\s+(cdp|lldp)\s+neighbors?(\s+detail)?|display\s+lldp\s+neighbor(\s+brief)?)\s*$", re.I)
+
+def _load_profiles():
+    path = os.environ.get(TIMING_PROFILES_ENV)
+    if not path:
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get("profiles", {})
+    except (OSError, ValueError):
+        return {}
+
+def _capture(record):
+    path = os.environ.get(CAPTURE_FILE_ENV)
+    if not path:
+        return
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + "\n")
+
+def _wrap_method(connection, host, name):
+    method = getattr(connection, name)
+    profile = _profiles.get(host, {})
+
+    def timed(*args, **kwargs):
+        if (name == "send_command" and "read_timeout" not in kwargs
+                and profile.get("read_timeout", 0) > NETMIKO_DEFAULT_TIMEOUTS["read_timeout"]):
+            kwargs["read_timeout"] = profile["read_timeout"]
+        command = args[0] if args else kwargs.get("command_string", kwargs.get("config_commands", kwargs.get("config_file", "")))
+        cache_miss = False
+        if changes_device(name, command):
+            _configured.add(host)
+        elif (_cache is not None and name in CACHED_METHODS and isinstance(command, str) and is_read_only(command)
+              and host not in _configured and (host, command_key(command)) not in _looked_up
+              and not any(kwargs.get(key) for key in PARSER_ARGUMENTS)):
+            _looked_up.add((host, command_key(command)))
+            hit = _cache.get_output(host, command)
+            if hit is not None:
+                _capture({"host": host, "method": name, "command": command, "cached": True, "ts": time.time(), "output": hit[0]})
+                return hit[0]
+            cache_miss = True
+        start = time.monotonic()
+        output = method(*args, **kwargs)
+        record = {"host": host, "method": name, "command": command,
+                  "elapsed": time.monotonic() - start, "ts": time.time()}
+        if isinstance(output, str):
+            record["output"] = output
+        if cache_miss:
+            record["cache_miss"] = True
+        _capture(record)
+        if _cassette is not None and _cassette.mode == "record":
+            record_command(_cassette, host, name, command, output, record["elapsed"])
+        return output
+
+    setattr(connection, name, timed)
+
+def _wrap_connect_handler(connect_handler):
+    def ConnectHandler(*args, **kwargs):
+        host = kwargs.get("host") or kwargs.get("ip")
+        profile = _profiles.get(host, {})
+        # Explicit arguments in the script always win over learned values
+        for key in ("conn_timeout", "global_delay_factor", "fast_cli"):
+            if key in profile and key not in kwargs:
+                if key in NETMIKO_DEFAULT_TIMEOUTS and profile[key] <= NETMIKO_DEFAULT_TIMEOUTS[key]:
+                    continue
+                kwargs[key] = profile[key]
+        start = time.monotonic()
+        connection = connect_handler(*args, **kwargs)
+        elapsed = time.monotonic() - start
+        _capture({"host": host, "method": "connect", "command": "", "elapsed": elapsed, "ts": time.time()})
+        if _cassette is not None and _cassette.mode == "record":
+            record_command(_cassette, host, "connect", "", "", elapsed)
+        for name in COMMAND_METHODS:
+            if hasattr(connection, name):
+                _wrap_method(connection, host, name)
+        return connection
+    return ConnectHandler
+
+def install():
+    global _profiles, _cache, _cassette
+    _profiles = _load_profiles()
+    if os.environ.get(CACHE_FILE_ENV) and os.path.exists(os.environ[CACHE_FILE_ENV]):
+        _cache = ResultCache(os.environ[CACHE_FILE_ENV], read_only=True)
+    _cassette = device_cassette()
+    if _cassette is not None and _cassette.mode == "replay":
+        try:
+            import netmiko
+        except ImportError:
+            sys.modules.update(netmiko_stub(None))
+            import netmiko
+        netmiko.ConnectHandler = _wrap_connect_handler(replay_connect_handler(_cassette))
+        return
+    try:
+        import netmiko
+    except ImportError:
+        return
+    netmiko.ConnectHandler = _wrap_connect_handler(netmiko.ConnectHandler)
+
+_profiles = {}
+_cache = None
+_cassette = None
+# Per run: hosts that were sent configuration, and (host, command) pairs already looked up
+_configured = set()
+_looked_up = set()
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: python -m exec_runtime <script.py>", file=sys.stderr)
+        sys.exit(2)
+    script = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    sys.path[0] = os.path.dirname(os.path.abspath(script))
+    install()
+    runpy.run_path(script, run_name="__main__")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import asyncio
+import re
+import time
+from rich.console import Console
+from rich.table import Table
+from rich.box import ROUNDED
+
+from session import ChatSession
+from device_pool import DevicePool
+from config import CONTINUATION_EXIT_PHRASE, CONTINUATION_PROMPT, GOAL_MAX_PARALLEL, GOAL_MAX_ITERATIONS
+
+console = Console()
+
+# "Goal 2: ...", also as a list item or in bold ("- **Goal 2:** ...")
+GOAL_LINE = re.compile(r"^[\s>*#-]*\**Goal\s+(\d+)\s*\**\s*:\s*\**\s*(.+?)\s*$", re.M | re.I)
+# "(after Goal 1)", "depends on Goals 1 and 3", "using the results of Goal 2"
+GOAL_REFERENCE = re.compile(r"\bGoals?\s+(\d+(?:\s*(?:,|and|&|or)\s*(?:Goal\s+)?\d+)*)", re.I)
+
+def parse_plan(response):
+    """
+    Goals of a plan as dicts with number, text and depends. A goal depends
+    on every earlier goal its text mentions; references to later or unknown
+    goals are ignored, so the graph is acyclic by construction.
+    """
+    goals = []
+    seen = set()
+    for match in GOAL_LINE.finditer(response):
+        number = int(match.group(1))
+        if number in seen:
+            continue
+        seen.add(number)
+        text = match.group(2)
+        depends = sorted({int(n) for refs in GOAL_REFERENCE.findall(text) for n in re.findall(r"\d+", refs)
+                          if int(n) in seen and int(n) != number})
+        goals.append({"number": number, "text": text, "depends": depends})
+    return goals
+
+def goal_levels(goals):
+    """Goals grouped into waves that can run side by side, in dependency order."""
+    level = {}
+    for goal in goals:
+        level[goal["number"]] = 1 + max((level[d] for d in goal["depends"]), default=-1)
+    waves = {}
+    for goal in goals:
+        waves.setdefault(level[goal["number"]], []).append(goal["number"])
+    return [waves[index] for index in sorted(waves)]
+
+def render_goal(goal, goals, results):
+    plan = "\n".join(f"Goal {g['number']}: {g['text']}" for g in goals)
+    prompt = (f"You are working on Goal {goal['number']} of this plan:\n{plan}\n\n"
+              f"Your goal: {goal['text']}\n"
+              "Other goals are handled by parallel sessions; work on your goal only and "
+              "finish with a short summary of what you found or changed.")
+    inputs = [f"Result of Goal {number}:\n{results[number]['response']}" for number in goal["depends"]]
+    if inputs:
+        prompt += "\n\n" + "\n\n".join(inputs)
+    return prompt
+
+async def run_goal_session(goal, goals, results, parent, max_iterations, device_pool):
+    session = ChatSession(console=Console(quiet=True), limiter=parent.limiter, device_pool=device_pool,
+                          show_usage=False, analysis_mode=parent.analysis_mode)
+    session.automode = True
+    session.file_contents = dict(parent.file_contents)
+    start = time.monotonic()
+    status = "incomplete"
+    response = ""
+    iterations = 0
+
+    try:
+        user_input = render_goal(goal, goals, results)
+        for iteration_count in range(max_iterations):
+            iterations = iteration_count + 1
+            response, exit_continuation = await session.chat(user_input, current_iteration=iterations, max_iterations=max_iterations)
+            if exit_continuation or CONTINUATION_EXIT_PHRASE in response:
+                status = "complete"
+                break
+            user_input = CONTINUATION_PROMPT
+    except Exception as e:
+        status = "error"
+        response = f"Error in goal session: {str(e)}"
+
+    return {
+        "number": goal["number"],
+        "goal": goal["text"],
+        "status": status,
+        "iterations": iterations,
+        "duration": time.monotonic() - start,
+        "response": response.replace(CONTINUATION_EXIT_PHRASE, "").strip(),
+    }
+
+async def run_goals(goals, parent, max_parallel=GOAL_MAX_PARALLEL, max_iterations=GOAL_MAX_ITERATIONS):
+    """
+    Run every goal as its own automode sub-session, as soon as the goals it
+    depends on have completed, with at most max_parallel sessions at once.
+    A goal whose dependency did not complete is skipped. Sub-sessions share
+    the parent's API limiter and device pool; results are in plan order.
+    """
+    device_pool = parent.device_pool or DevicePool()
+    semaphore = asyncio.Semaphore(max_parallel)
+    tasks = {}
+    results = {}
+
+    async def run_one(goal):
+        await asyncio.gather(*(tasks[number] for number in goal["depends"]))
+        blocked = [number for number in goal["depends"] if results[number]["status"] != "complete"]
+        if blocked:
+            result = {"number": goal["number"], "goal": goal["text"], "status": "skipped", "iterations": 0, "duration": 0.0,
+                      "response": "Skipped: " + ", ".join(f"Goal {number}" for number in blocked) + " did not complete."}
+        else:
+            async with semaphore:
+                result = await run_goal_session(goal, goals, results, parent, max_iterations, device_pool)
+        results[goal["number"]] = result
+        console.print(f"Goal {goal['number']}: {result['status']} in {result['duration']:.1f}s",
+                      style="green" if result["status"] == "complete" else "yellow")
+        return result
+
+    # Dependencies always come earlier in the plan, so their tasks exist first
+    for goal in goals:
+        tasks[goal["number"]] = asyncio.ensure_future(run_one(goal))
+    return list(await asyncio.gather(*tasks.values()))
+
+def merge_results(results):
+    """User message that hands the goal results back to the main conversation."""
+    sections = [f"## Goal {result['number']} ({result['status']}): {result['goal']}\n\n{result['response']}" for result in results]
+    return ("The goals of your plan were worked on by parallel sessions. Their results:\n\n" + "\n\n".join(sections) +
+            "\n\nReview the results, finish anything left undone, or say 'AUTOMODE_COMPLETE' if the original request is achieved.")
+
+def display_goal_results(results):
+    table = Table(box=ROUNDED)
+    table.add_column("Goal", style="cyan")
+    table.add_column("Status", style="magenta")
+    table.add_column("Iterations", style="magenta")
+    table.add_column("Time (s)", style="green")
+
+    for result in results:
+        table.add_row(f"{result['number']}: {result['goal'][:60]}", result["status"], str(result["iterations"]), f"{result['duration']:.1f}")
+
+    console.print(table)
@@ -0,0 +1,136 @@
+import asyncio
+import base64
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+from config import IMAGE_CACHE_DIR, IMAGE_MAX_EDGE, IMAGE_TARGET_BYTES, IMAGE_CACHE_SIZE
+
+MEDIA_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp"}
+EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/gif": "gif", "image/webp": "webp"}
+
+# Encoded images keyed by content hash, most recently used last
+_memory_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _is_diagram(img):
+    """
+    Topology diagrams, screenshots of CLI output and other mostly-text images
+    use few distinct colours. Those stay lossless so small text stays legible.
+    """
+    sample = img.convert("RGB")
+    # NEAREST avoids inventing blended colours while sampling
+    sample.thumbnail((256, 256), Image.NEAREST)
+    colors = sorted(sample.getcolors(maxcolors=sample.width * sample.height), reverse=True)
+    dominant = sum(count for count, _ in colors[:16])
+    return dominant >= 0.8 * sample.width * sample.height
+
+def _save(img, fmt, **options):
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+def _encode_png(img):
+    if img.mode not in ("RGB", "RGBA", "L", "P"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    data = _save(img, "PNG", optimize=True)
+    if img.mode in ("RGB", "L"):
+        # A 256-colour palette is lossless for most diagrams and much smaller
+        quantized = img.convert("RGB").quantize(colors=256)
+        data = min(data, _save(quantized, "PNG", optimize=True), key=len)
+    return data
+
+def _encode_jpeg(img, target_bytes):
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    best = None
+    low, high = 40, 92
+    # Highest quality that still fits the byte budget
+    while low <= high:
+        quality = (low + high) // 2
+        data = _save(img, "JPEG", quality=quality, optimize=True)
+        if len(data) <= target_bytes:
+            best = data
+            low = quality + 1
+        else:
+            high = quality - 1
+    return best or _save(img, "JPEG", quality=40, optimize=True)
+
+def _encode(data, target_bytes, max_edge):
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        media_type = MEDIA_TYPES.get(img.format)
+
+        # Already small enough in a format the API accepts: send as is
+        if media_type and len(data) <= target_bytes and max(img.size) <= max_edge:
+            return media_type, data
+
+        diagram = _is_diagram(img)
+        if max(img.size) > max_edge:
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        if diagram:
+            encoded = _encode_png(img)
+            # Shrink rather than switch to lossy compression
+            while len(encoded) > target_bytes and max(img.size) > 512:
+                img = img.resize((int(img.width * 0.8), int(img.height * 0.8)), Image.LANCZOS)
+                encoded = _encode_png(img)
+            if len(encoded) <= target_bytes:
+                return "image/png", encoded
+
+        encoded = _encode_jpeg(img, target_bytes)
+        while len(encoded) > target_bytes and max(img.size) > 512:
+            img = img.resize((int(img.width * 0.8), int(img.height * 0.8)), Image.LANCZOS)
+            encoded = _encode_jpeg(img, target_bytes)
+        return "image/jpeg", encoded
+
+def _cache_get(key):
+    with _cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+    for media_type, extension in EXTENSIONS.items():
+        path = os.path.join(IMAGE_CACHE_DIR, f"{key}.{extension}")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                entry = (media_type, base64.b64encode(f.read()).decode('utf-8'))
+            _cache_put(key, entry, persist=False)
+            return entry
+    return None
+
+def _cache_put(key, entry, persist=True):
+    with _cache_lock:
+        _memory_cache[key] = entry
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > IMAGE_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    if persist:
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        media_type, data = entry
+        with open(os.path.join(IMAGE_CACHE_DIR, f"{key}.{EXTENSIONS[media_type]}"), 'wb') as f:
+            f.write(base64.b64decode(data))
+
+def encode_image(image_path, target_bytes=IMAGE_TARGET_BYTES, max_edge=IMAGE_MAX_EDGE):
+    """
+    Encode an image for the Messages API and return (media_type, base64_data).
+    Results are cached by file content, so re-sending the same image is free.
+    """
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    key = hashlib.sha256(data + f"|{target_bytes}|{max_edge}".encode()).hexdigest()
+    entry = _cache_get(key)
+    if entry is None:
+        media_type, encoded = _encode(data, target_bytes, max_edge)
+        entry = (media_type, base64.b64encode(encoded).decode('utf-8'))
+        _cache_put(key, entry)
+    return entry
+
+async def encode_images(image_paths):
+    """Encode several images concurrently in worker threads, keeping the event loop free."""
+    return await asyncio.gather(*(asyncio.to_thread(encode_image, path) for path in image_paths))
+
+def image_block(media_type, data):
+    return {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": data}}
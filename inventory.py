@@ -0,0 +1,324 @@
+"""
+Device inventory with indexed selector queries.
+
+Sources are YAML, CSV or JSON files listing devices. YAML and JSON files
+hold either a list of devices or {"defaults": {...}, "devices": [...]};
+CSV files have one device per row with a header line. Fields:
+
+    name, host, platform (Netmiko device_type), site, role, tags,
+    username, password, secret, port
+
+tags is a list (or a space/comma separated string in CSV). Credentials may
+reference environment variables as ${VAR}, so secrets can stay out of the
+files. Selectors combine field tests with and/or/not and parentheses:
+
+    site=nyc and role=access
+    platform=cisco_* and not tag=lab
+    subnet=10.20.0.0/16 or name=core1,core2
+
+This module only uses the standard library (PyYAML for YAML sources), so
+executed scripts can import it in the 'netmikoai' environment:
+
+    from inventory import load_inventory
+    for device in load_inventory().netmiko_params("site=nyc and role=access"):
+        connection = ConnectHandler(**device)
+"""
+import bisect
+import csv
+import fnmatch
+import ipaddress
+import json
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+SOURCES_ENV = "INVENTORY_SOURCES"
+INDEXED_FIELDS = ("name", "host", "platform", "site", "role", "tag")
+CREDENTIAL_FIELDS = ("username", "password", "secret", "port")
+
+Device = namedtuple("Device", ["name", "host", "platform", "site", "role", "tags"])
+
+_ENV_REFERENCE = re.compile(r"\$\{(\w+)\}")
+_TOKEN = re.compile(r"\s*(\(|\)|[^\s()]+)")
+
+class SelectorError(ValueError):
+    pass
+
+def _expand(value):
+    if isinstance(value, str):
+        return _ENV_REFERENCE.sub(lambda m: os.environ.get(m.group(1), ""), value)
+    return value
+
+def _read_source(path):
+    """Return (defaults, list of device dicts) from one source file."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            return {}, [{k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()} for row in csv.DictReader(f)]
+    with open(path, 'r', encoding='utf-8') as f:
+        if extension in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError(f"PyYAML is required to read {path}; install it or use a CSV/JSON source")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if isinstance(data, dict):
+        return data.get("defaults") or {}, data.get("devices") or []
+    return {}, data or []
+
+class _Source:
+    """Devices of one source file with their bitmap indexes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        defaults, entries = _read_source(path)
+        self.defaults = {key: _expand(defaults[key]) for key in CREDENTIAL_FIELDS if key in defaults}
+        self.default_platform = defaults.get("platform") or defaults.get("device_type")
+        self.devices = []
+        # Only devices whose credentials differ from the defaults carry their own
+        self.credentials = {}
+        self.index = {field: {} for field in INDEXED_FIELDS}
+        self.addresses = []
+        for entry in entries:
+            self._add(entry)
+        self.addresses.sort()
+        self.all = (1 << len(self.devices)) - 1
+
+    def _add(self, entry):
+        position = len(self.devices)
+        host = str(entry.get("host") or entry.get("ip") or entry.get("name") or "")
+        tags = entry.get("tags") or ()
+        if isinstance(tags, str):
+            tags = re.split(r"[\s,;]+", tags.strip())
+        device = Device(
+            name=sys.intern(str(entry.get("name") or host)),
+            host=host,
+            platform=sys.intern(str(entry.get("platform") or entry.get("device_type") or self.default_platform or "")),
+            site=sys.intern(str(entry.get("site", ""))),
+            role=sys.intern(str(entry.get("role", ""))),
+            tags=tuple(sys.intern(str(tag)) for tag in tags if tag),
+        )
+        self.devices.append(device)
+        own = {key: _expand(entry[key]) for key in CREDENTIAL_FIELDS if key in entry}
+        if own:
+            self.credentials[position] = own
+        bit = 1 << position
+        for field, value in (("name", device.name), ("host", device.host), ("platform", device.platform),
+                             ("site", device.site), ("role", device.role)):
+            if value:
+                self.index[field][value] = self.index[field].get(value, 0) | bit
+        for tag in device.tags:
+            self.index["tag"][tag] = self.index["tag"].get(tag, 0) | bit
+        try:
+            self.addresses.append((int(ipaddress.ip_address(host)), position))
+        except ValueError:
+            pass
+
+    def match(self, field, value):
+        """Bitmap of the devices whose field matches value (a glob, a comma list, or a subnet)."""
+        if field == "subnet":
+            try:
+                network = ipaddress.ip_network(value, strict=False)
+            except ValueError:
+                raise SelectorError(f"Invalid subnet: {value}")
+            low = bisect.bisect_left(self.addresses, (int(network.network_address), -1))
+            high = bisect.bisect_right(self.addresses, (int(network.broadcast_address), len(self.devices)))
+            bits = bytearray((len(self.devices) + 7) // 8)
+            for _, position in self.addresses[low:high]:
+                bits[position >> 3] |= 1 << (position & 7)
+            return int.from_bytes(bits, "little")
+        if field == "tags":
+            field = "tag"
+        if field not in self.index:
+            raise SelectorError(f"Unknown field '{field}'; use one of {', '.join(INDEXED_FIELDS + ('subnet',))}")
+        index = self.index[field]
+        mask = 0
+        for alternative in value.split(","):
+            if any(char in alternative for char in "*?["):
+                for key in fnmatch.filter(index, alternative):
+                    mask |= index[key]
+            else:
+                mask |= index.get(alternative, 0)
+        return mask
+
+@lru_cache(maxsize=256)
+def _parse(selector):
+    """Parse a selector into a nested tuple tree: ("or"|"and", a, b), ("not", a) or ("test", field, op, value)."""
+    tokens = _TOKEN.findall(re.sub(r"\s*(!=|=)\s*", r"\1", selector))
+    position = 0
+
+    def peek():
+        return tokens[position].lower() if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or():
+        node = parse_and()
+        while peek() == "or":
+            take()
+            node = ("or", node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while peek() == "and":
+            take()
+            node = ("and", node, parse_not())
+        return node
+
+    def parse_not():
+        if peek() == "not":
+            take()
+            return ("not", parse_not())
+        if peek() == "(":
+            take()
+            node = parse_or()
+            if peek() != ")":
+                raise SelectorError("Missing closing parenthesis")
+            take()
+            return node
+        if peek() is None:
+            raise SelectorError("Unexpected end of selector")
+        token = take()
+        match = re.fullmatch(r"(\w+)(!=|=)(.+)", token)
+        if not match:
+            raise SelectorError(f"Expected field=value, got '{token}'")
+        return ("test", match.group(1).lower(), match.group(2), match.group(3))
+
+    if not tokens or selector.strip() in ("*", "all"):
+        return None
+    tree = parse_or()
+    if position != len(tokens):
+        raise SelectorError(f"Unexpected '{tokens[position]}'")
+    return tree
+
+def _evaluate(tree, source):
+    if tree is None:
+        return source.all
+    kind = tree[0]
+    if kind == "or":
+        return _evaluate(tree[1], source) | _evaluate(tree[2], source)
+    if kind == "and":
+        left = _evaluate(tree[1], source)
+        return left & _evaluate(tree[2], source) if left else 0
+    if kind == "not":
+        return source.all & ~_evaluate(tree[1], source)
+    _, field, op, value = tree
+    mask = source.match(field, value)
+    return source.all & ~mask if op == "!=" else mask
+
+def _positions(mask):
+    """Set bit positions of a bitmap, lowest first, in one pass over its binary digits."""
+    bits = bin(mask)[:1:-1]
+    positions = []
+    position = bits.find("1")
+    while position != -1:
+        positions.append(position)
+        position = bits.find("1", position + 1)
+    return positions
+
+class Inventory:
+    """
+    In-memory device inventory built from one or more source files.
+
+    Each source keeps compact Device tuples and, per indexed field, a bitmap
+    (a Python int with one bit per device) for every value. A selector is
+    answered by combining bitmaps with and/or/not, so queries cost a few
+    integer operations regardless of fleet size; subnets are answered by
+    bisecting a sorted address list. Sources are re-read individually when
+    their modification time changes, checked at most every check_interval
+    seconds.
+    """
+
+    def __init__(self, sources=(), check_interval=2.0):
+        self.paths = [os.path.abspath(path) for path in sources if path]
+        self.check_interval = check_interval
+        self.sources = {}
+        self.errors = {}
+        self._checked = 0.0
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """Reload the sources whose files changed. Returns the paths that were reloaded."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return []
+        self._checked = now
+        reloaded = []
+        for path in self.paths:
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                if self.sources.pop(path, None) is not None:
+                    reloaded.append(path)
+                continue
+            if path in self.sources and self.sources[path].mtime == mtime:
+                continue
+            try:
+                self.sources[path] = _Source(path)
+                self.errors.pop(path, None)
+            except Exception as e:
+                # Keep serving the last good copy of a source that fails to parse
+                self.errors[path] = str(e)
+            reloaded.append(path)
+        return reloaded
+
+    def __len__(self):
+        return sum(len(source.devices) for source in self.sources.values())
+
+    def _matches(self, selector):
+        self.refresh()
+        tree = _parse(selector or "")
+        for source in self.sources.values():
+            mask = _evaluate(tree, source)
+            if mask:
+                yield source, mask
+
+    def count(self, selector=""):
+        return sum(bin(mask).count("1") for _, mask in self._matches(selector))
+
+    def select(self, selector="", limit=None):
+        """Return the Device tuples matching a selector, in source order."""
+        devices = []
+        for source, mask in self._matches(selector):
+            for position in _positions(mask):
+                devices.append(source.devices[position])
+                if limit is not None and len(devices) >= limit:
+                    return devices
+        return devices
+
+    def netmiko_params(self, selector=""):
+        """Connection dictionaries for ConnectHandler, credentials included."""
+        params = []
+        for source, mask in self._matches(selector):
+            for position in _positions(mask):
+                device = source.devices[position]
+                entry = {"device_type": device.platform, "host": device.host}
+                entry.update(source.defaults)
+                entry.update(source.credentials.get(position, {}))
+                if "port" in entry:
+                    entry["port"] = int(entry["port"])
+                params.append(entry)
+        return params
+
+def load_inventory(sources=None):
+    """Inventory from the given paths, or from the comma separated INVENTORY_SOURCES variable."""
+    if sources is None:
+        sources = [path.strip() for path in os.environ.get(SOURCES_ENV, "").split(",")]
+    return Inventory(sources)
+
+def format_devices(devices, total):
+    lines = [f"{total} device(s) matched" + (f", showing {len(devices)}" if len(devices) < total else "")]
+    for device in devices:
+        tags = f" tags={','.join(device.tags)}" if device.tags else ""
+        lines.append(f"{device.name} host={device.host} platform={device.platform} site={device.site} role={device.role}{tags}")
+    return "\n".join(lines)
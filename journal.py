@@ -0,0 +1,161 @@
+import glob
+import json
+import os
+import time
+from datetime import datetime
+
+from config import JOURNAL_DIR, JOURNAL_FSYNC_EVERY, JOURNAL_FSYNC_INTERVAL
+
+def new_journal_path(directory=JOURNAL_DIR, suffix=""):
+    now = datetime.now()
+    return os.path.join(directory, f"session_{now.strftime('%Y%m%d_%H%M%S_%f')}{suffix}.jsonl")
+
+class SessionJournal:
+    """
+    Append-only JSONL record of every message in a session.
+
+    Each message is written and flushed as soon as it is produced, so a crash
+    loses at most what the OS had not yet written. fsync is batched: it runs
+    after fsync_every records or fsync_interval seconds, whichever comes
+    first, and on close.
+    """
+
+    def __init__(self, path=None, fsync_every=JOURNAL_FSYNC_EVERY, fsync_interval=JOURNAL_FSYNC_INTERVAL):
+        self.path = path or new_journal_path()
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    def append(self, message):
+        f = self._open()
+        record = {"ts": datetime.now().isoformat(), "role": message["role"], "content": message["content"]}
+        f.write(json.dumps(record, default=str) + "\n")
+        f.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def rotate(self):
+        """Close this journal and continue in a fresh file, e.g. after a reset."""
+        self.close()
+        self.path = new_journal_path(os.path.dirname(self.path))
+
+def iter_journal(path):
+    """
+    Yield the messages recorded in a journal. A partially written final line,
+    left behind by a crash, is skipped.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            yield {"role": record["role"], "content": record["content"]}
+
+def _unanswered_tool_uses(history):
+    """Error results and a closing note for a trailing tool_use without results, or [] if there is none."""
+    last = history[-1] if history else None
+    if not last or last["role"] != "assistant" or not isinstance(last["content"], list):
+        return []
+    tool_uses = [block for block in last["content"] if isinstance(block, dict) and block.get("type") == "tool_use"]
+    if not tool_uses:
+        return []
+    return [
+        {"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": block["id"], "is_error": True,
+             "content": "Not executed: the session ended before the tool returned."} for block in tool_uses]},
+        {"role": "assistant", "content": "The previous session ended while a tool was running."},
+    ]
+
+def load_journal(path):
+    """
+    Rebuild a conversation history from a journal in a single pass. A
+    trailing tool_use without results, from a session killed while a tool
+    ran, is answered with error results so the history is valid to send.
+    """
+    history = list(iter_journal(path))
+    return history + _unanswered_tool_uses(history)
+
+def repair_journal(path, block_size=65536):
+    """
+    Make a journal left by a crash safe to append to: a partially written
+    final line is cut off, so the next record does not merge with it, and
+    the answer load_journal gives a trailing tool_use is written to the
+    file. Returns the number of records added.
+    """
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        end = 0
+        position = size
+        while position > 0:
+            start = max(0, position - block_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            position = start
+        if end < size:
+            f.truncate(end)
+    added = _unanswered_tool_uses(list(iter_journal(path)))
+    if added:
+        journal = SessionJournal(path)
+        for message in added:
+            journal.append(message)
+        journal.close()
+    return len(added)
+
+def latest_journal(directory=JOURNAL_DIR):
+    paths = glob.glob(os.path.join(directory, "session_*.jsonl"))
+    return max(paths, key=os.path.getmtime) if paths else None
+
+def _format_block(block):
+    if not isinstance(block, dict):
+        return str(block)
+    if block.get("type") == "text":
+        return block["text"]
+    if block.get("type") == "tool_use":
+        return f"**Tool use:** `{block['name']}`\n\n```json\n{json.dumps(block.get('input'), indent=2, default=str)}\n```"
+    if block.get("type") == "tool_result":
+        label = "Tool error" if block.get("is_error") else "Tool result"
+        content = block.get("content")
+        if isinstance(content, list):
+            content = "\n".join(_format_block(item) for item in content)
+        return f"**{label}:**\n\n```\n{content}\n```"
+    if block.get("type") == "image":
+        return f"*[image: {block.get('source', {}).get('media_type', 'unknown')}]*"
+    return json.dumps(block, default=str)
+
+def export_markdown(journal_path, markdown_path):
+    """Stream a journal into a Markdown chat log without loading it into memory."""
+    with open(markdown_path, 'w', encoding='utf-8') as out:
+        out.write("# Netmiko AI Chat Log\n\n")
+        for message in iter_journal(journal_path):
+            content = message["content"]
+            if isinstance(content, list):
+                content = "\n\n".join(_format_block(block) for block in content)
+            out.write(f"## {message['role'].capitalize()}\n\n{content}\n\n")
+    return markdown_path
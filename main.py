@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 import asyncio
+import shlex
 from anthropic import Anthropic
 from rich.console import Console
 from rich.panel import Panel
@@ -9,13 +10,16 @@ from prompt_toolkit import PromptSession
 from prompt_toolkit.styles import Style
 
 # Import other modules (assuming they've been created)
-from models import MAINMODEL, TOOLCHECKERMODEL, CODEEDITORMODEL, CODEEXECUTIONMODEL
-from tools import tools, execute_tool
-from utils import (encode_image_to_base64, parse_goals, execute_goals, save_chat,
-                   display_token_usage, read_file, read_multiple_files, list_files, reset_conversation)
-from config import (load_prompt, BASE_SYSTEM_PROMPT, AUTOMODE_SYSTEM_PROMPT,
-                    CONTINUATION_EXIT_PHRASE, MAX_CONTINUATION_ITERATIONS, MAX_CONTEXT_TOKENS,
-                    update_system_prompt)
+from session import ChatSession
+from batch import load_devices, run_batch, display_batch_results, save_batch_report
+from utils import save_chat, execute_goals
+from goals import parse_plan, goal_levels, display_goal_results
+from journal import SessionJournal, latest_journal
+from analysis_queue import analysis_queue
+from search import close_session as close_search_session
+from profiler import profiler
+from config import (CONTINUATION_EXIT_PHRASE, CONTINUATION_PROMPT, AUTOMODE_PLAN_PROMPT, MAX_CONTINUATION_ITERATIONS,
+                    BATCH_MAX_ITERATIONS, GOAL_MAX_PARALLEL, GOAL_MIN_GOALS)
 
 # Load environment variables
 load_dotenv()
@@ -29,9 +33,7 @@ client = Anthropic(api_key=anthropic_api_key)
 console = Console()
 
 # Global variables
-conversation_history = []
-file_contents = {}
-automode = False
+session = ChatSession(console=console, journal=SessionJournal())
 running_processes = {}
 
 async def get_user_input(prompt="You: "):
@@ -39,151 +41,117 @@ async def get_user_input(prompt="You: "):
     session = PromptSession(style=style)
     return await session.prompt_async(prompt, multiline=False)
 
-def update_system_prompt(current_iteration=None, max_iterations=None):
-    global file_contents
-    chain_of_thought_prompt = load_prompt('chain_of_thought_prompt.txt')
-    
-    file_contents_prompt = "\n\nFile Contents:\n"
-    for path, content in file_contents.items():
-        file_contents_prompt += f"\n--- {path} ---\n{content}\n"
-    
-    if automode:
-        iteration_info = ""
-        if current_iteration is not None and max_iterations is not None:
-            iteration_info = f"You are currently on iteration {current_iteration} out of {max_iterations} in automode."
-        return BASE_SYSTEM_PROMPT + file_contents_prompt + "\n\n" + AUTOMODE_SYSTEM_PROMPT.format(iteration_info=iteration_info) + "\n\n" + chain_of_thought_prompt
-    else:
-        return BASE_SYSTEM_PROMPT + file_contents_prompt + "\n\n" + chain_of_thought_prompt
-
 async def chat_with_claude(user_input, image_path=None, current_iteration=None, max_iterations=None):
-    global conversation_history, automode
-
-    current_conversation = []
-
-    if image_path:
-        console.print(Panel(f"Processing image at path: {image_path}", title="Image Processing", style="yellow"))
-        image_base64 = encode_image_to_base64(image_path)
-        if image_base64.startswith("Error"):
-            console.print(Panel(f"Error encoding image: {image_base64}", title="Error", style="bold red"))
-            return "I'm sorry, there was an error processing the image. Please try again.", False
-        image_message = {
-            "role": "user",
-            "content": [
-                {"type": "image", "source": {"type": "base64", "media_type": "image/jpeg", "data": image_base64}},
-                {"type": "text", "text": f"User input for image: {user_input}"}
-            ]
-        }
-        current_conversation.append(image_message)
-    else:
-        current_conversation.append({"role": "user", "content": user_input})
-
-    # Filter conversation history to maintain context
-    filtered_conversation_history = [
-        message for message in conversation_history
-        if not (isinstance(message['content'], list) and
-                any(content.get('type') == 'tool_result' and
-                    any(keyword in content.get('output', '') for keyword in [
-                        "File contents updated in system prompt",
-                        "File created and added to system prompt",
-                        "has been read and stored in the system prompt"
-                    ]) for content in message['content']))
-    ]
-
-    messages = filtered_conversation_history + current_conversation
-
-    try:
-        response = client.messages.create(
-            model=MAINMODEL,
-            max_tokens=8000,
-            system=update_system_prompt(current_iteration, max_iterations),
-            extra_headers={"anthropic-beta": "max-tokens-3-5-sonnet-2024-07-15"},
-            messages=messages,
-            tools=tools,
-            tool_choice={"type": "auto"}
-        )
-        from models import update_token_usage
-        update_token_usage("main", response.usage.input_tokens, response.usage.output_tokens)
-    except Exception as e:
-        console.print(Panel(f"API Error: {str(e)}", title="API Error", style="bold red"))
-        return "I'm sorry, there was an error communicating with the AI. Please try again.", False
-
-    assistant_response = ""
-    exit_continuation = False
-    tool_uses = []
-
-    for content_block in response.content:
-        if content_block.type == "text":
-            assistant_response += content_block.text
-            if CONTINUATION_EXIT_PHRASE in content_block.text:
-                exit_continuation = True
-        elif content_block.type == "tool_use":
-            tool_uses.append(content_block)
-
-    console.print(Panel(Markdown(assistant_response), title="Claude's Response", border_style="blue"))
-
-    for tool_use in tool_uses:
-        tool_result = await execute_tool(tool_use.name, tool_use.input)
-        console.print(Panel(tool_result["content"], title="Tool Result", style="green" if not tool_result["is_error"] else "bold red"))
-        current_conversation.extend([
-            {"role": "assistant", "content": [{"type": "tool_use", "id": tool_use.id, "name": tool_use.name, "input": tool_use.input}]},
-            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": tool_use.id, "content": tool_result["content"], "is_error": tool_result["is_error"]}]}
-        ])
-
-        try:
-            tool_response = client.messages.create(
-                model=TOOLCHECKERMODEL,
-                max_tokens=8000,
-                system=update_system_prompt(current_iteration, max_iterations),
-                extra_headers={"anthropic-beta": "max-tokens-3-5-sonnet-2024-07-15"},
-                messages=filtered_conversation_history + current_conversation,
-                tools=tools,
-                tool_choice={"type": "auto"}
-            )
-            update_token_usage("tool_checker", tool_response.usage.input_tokens, tool_response.usage.output_tokens)
-            tool_checker_response = "".join(block.text for block in tool_response.content if block.type == "text")
-            console.print(Panel(Markdown(tool_checker_response), title="Claude's Response to Tool Result", border_style="blue"))
-            assistant_response += "\n\n" + tool_checker_response
-        except Exception as e:
-            error_message = f"Error in tool response: {str(e)}"
-            console.print(Panel(error_message, title="Error", style="bold red"))
-            assistant_response += f"\n\n{error_message}"
-
-    conversation_history = messages + [{"role": "assistant", "content": assistant_response}]
-    display_token_usage()
-    return assistant_response, exit_continuation
+    with profiler.turn(session):
+        return await session.chat(user_input, image_path, current_iteration, max_iterations)
 
 async def main():
-    global automode
     console.print(Panel("Welcome to the Netmiko AI Chat with Multi-Agent Support!", title="Welcome", style="bold green"))
     console.print("Type 'exit' to end the conversation.")
-    console.print("Type 'image' to include an image in your message.")
+    console.print("Type 'image' to include one or more images in your message.")
     console.print("Type 'automode [number]' to enter Autonomous mode with a specific number of iterations.")
+    console.print("Type 'batch <inventory> [number]' to run one goal across many devices in parallel.")
+    console.print("Type 'analysis' to submit queued execution analyses and collect finished batch results.")
     console.print("Type 'reset' to clear the conversation history.")
     console.print("Type 'save chat' to save the conversation to a Markdown file.")
+    console.print("Type 'pin <fact>' to keep a fact verbatim when old turns are compacted ('pin' alone lists them).")
+    console.print("Type 'profile on [memory]|off|dump' to profile the following turns (memory also tracks memory growth).")
+    console.print("Type 'resume [journal]' to continue a previous session (defaults to the most recent one).")
     console.print("While in automode, press Ctrl+C at any time to exit the automode to return to regular chat.")
 
     while True:
         user_input = await get_user_input()
 
         if user_input.lower() == 'exit':
+            profiler.stop()
+            session.journal.close()
+            await close_search_session()
+            if analysis_queue.pending:
+                try:
+                    await analysis_queue.flush()
+                except Exception as e:
+                    console.print(Panel(f"Error submitting queued analyses: {str(e)}", title="Error", style="bold red"))
             console.print(Panel("Thank you for chatting. Goodbye!", title="Goodbye", style="bold green"))
             break
 
+        if user_input.lower() == 'analysis':
+            try:
+                batch_id = await analysis_queue.flush()
+                stored = await analysis_queue.collect()
+            except Exception as e:
+                console.print(Panel(f"Error processing analysis batches: {str(e)}", title="Error", style="bold red"))
+                continue
+            message = f"Collected {stored} analysis results into {analysis_queue.results_file}."
+            if batch_id:
+                message += f" Submitted new batch {batch_id}."
+            if analysis_queue.submitted:
+                message += f" {len(analysis_queue.submitted)} batch(es) still processing."
+            console.print(Panel(message, title="Analysis", style="bold green"))
+            continue
+
         if user_input.lower() == 'reset':
-            conversation_history = reset_conversation()
+            session.reset()
             console.print(Panel("Conversation history has been reset.", style="bold green"))
             continue
 
         if user_input.lower() == 'save chat':
-            filename = save_chat()
+            try:
+                filename = save_chat(session.journal)
+            except Exception as e:
+                console.print(Panel(f"Error saving chat: {str(e)}", title="Error", style="bold red"))
+                continue
             console.print(Panel(f"Chat saved to {filename}", title="Chat Saved", style="bold green"))
             continue
 
+        if user_input.lower().split()[:1] == ['pin']:
+            fact = user_input.split(maxsplit=1)[1].strip() if len(user_input.split()) > 1 else ""
+            if fact:
+                session.pinned_facts.append(fact)
+            facts = "\n".join(f"{number}. {fact}" for number, fact in enumerate(session.pinned_facts, 1))
+            console.print(Panel(facts or "No pinned facts.", title="Pinned Facts", style="bold green"))
+            continue
+
+        if user_input.lower().split()[:1] == ['profile']:
+            parts = user_input.lower().split()
+            action = parts[1] if len(parts) > 1 else ""
+            if action == 'on':
+                profiler.start(memory='memory' in parts[2:])
+                mode = " with memory tracking" if profiler.memory else ""
+                console.print(Panel(f"Profiling the following turns{mode}. Type 'profile dump' to write a flamegraph.", title="Profile", style="bold green"))
+            elif action == 'off':
+                profiler.stop()
+                profiler.report(console)
+            elif action == 'dump':
+                try:
+                    folded, summary_file, summary = profiler.dump()
+                except Exception as e:
+                    console.print(Panel(f"Error writing profile: {str(e)}", title="Error", style="bold red"))
+                    continue
+                profiler.report(console, summary)
+                console.print(Panel(f"Collapsed stacks written to {folded} (flamegraph.pl, speedscope)\nStage summary written to {summary_file}", title="Profile", style="bold green"))
+            else:
+                console.print(Panel("Usage: profile on [memory] | off | dump", title="Error", style="bold red"))
+            continue
+
+        if user_input.lower().split()[:1] == ['resume']:
+            parts = user_input.split(maxsplit=1)
+            journal_path = parts[1].strip() if len(parts) > 1 else latest_journal()
+            if not journal_path or not os.path.isfile(journal_path):
+                console.print(Panel("No session journal found to resume.", title="Error", style="bold red"))
+                continue
+            count = session.resume(journal_path)
+            console.print(Panel(f"Resumed {count} messages from {journal_path}", title="Resume", style="bold green"))
+            continue
+
         if user_input.lower() == 'image':
-            image_path = (await get_user_input("Drag and drop your image here, then press enter: ")).strip().replace("'", "")
-            if os.path.isfile(image_path):
+            try:
+                image_paths = shlex.split(await get_user_input("Drag and drop one or more images here, then press enter: "))
+            except ValueError:
+                image_paths = []
+            invalid_paths = [path for path in image_paths if not os.path.isfile(path)]
+            if image_paths and not invalid_paths:
                 user_input = await get_user_input("You (prompt for image): ")
-                response, _ = await chat_with_claude(user_input, image_path)
+                response, _ = await chat_with_claude(user_input, image_paths)
             else:
                 console.print(Panel("Invalid image path. Please try again.", title="Error", style="bold red"))
                 continue
@@ -195,10 +163,11 @@ async def main():
                     console.print(Panel("Automode cancelled.", style="bold red"))
                     continue
                 
-                automode = True
+                session.automode = True
                 console.print(Panel(f"Entering automode with {max_iterations} iterations. Please provide the goal of the automode.", title="Automode", style="bold yellow"))
                 console.print(Panel("Press Ctrl+C at any time to exit the automode loop.", style="bold yellow"))
-                user_input = await get_user_input()
+                # Only this first request asks for a plan; goal sub-sessions and batch sessions act from the start
+                user_input = (await get_user_input()) + "\n\n" + AUTOMODE_PLAN_PROMPT
 
                 for iteration_count in range(max_iterations):
                     try:
@@ -207,7 +176,18 @@ async def main():
                             console.print(Panel("Automode completed.", title="Automode", style="green"))
                             break
                         console.print(Panel(f"Continuation iteration {iteration_count + 1} completed. Press Ctrl+C to exit automode.", title="Automode", style="yellow"))
-                        user_input = "Continue with the next step. Or STOP by saying 'AUTOMODE_COMPLETE' if you think you've achieved the results established in the original request."
+                        user_input = CONTINUATION_PROMPT
+                        goals = parse_plan(response) if iteration_count == 0 else []
+                        if len(goals) >= GOAL_MIN_GOALS and session.turn_tool_uses:
+                            # The planning turn may already have acted on its goals; running them again could repeat config pushes
+                            console.print(Panel("The planning turn already used tools, so its goals continue in this session "
+                                                "instead of parallel sub-sessions.", title="Goals", style="yellow"))
+                        elif len(goals) >= GOAL_MIN_GOALS:
+                            waves = goal_levels(goals)
+                            console.print(Panel(f"Running {len(goals)} goals in {len(waves)} dependency wave(s), "
+                                                f"up to {GOAL_MAX_PARALLEL} at a time.", title="Goals", style="bold yellow"))
+                            results, user_input = await execute_goals(goals, session)
+                            display_goal_results(results)
                     except KeyboardInterrupt:
                         console.print(Panel("\nAutomode interrupted by user. Exiting automode.", title="Automode", style="bold red"))
                         break
@@ -216,8 +196,35 @@ async def main():
             except KeyboardInterrupt:
                 console.print(Panel("\nAutomode interrupted by user. Exiting automode.", title="Automode", style="bold red"))
             
-            automode = False
+            session.automode = False
             console.print(Panel("Exited automode. Returning to regular chat.", style="green"))
+        elif user_input.lower().startswith('batch'):
+            parts = user_input.split()
+            if len(parts) < 2:
+                console.print(Panel("Usage: batch <inventory.json|inventory.csv> [number]", title="Error", style="bold red"))
+                continue
+            try:
+                devices = load_devices(parts[1])
+                max_iterations = int(parts[2]) if len(parts) > 2 else BATCH_MAX_ITERATIONS
+            except Exception as e:
+                console.print(Panel(f"Error loading inventory: {str(e)}", title="Error", style="bold red"))
+                continue
+
+            console.print(Panel(f"Warning: Batch mode will run {len(devices)} automode sessions in parallel and execute Netmiko scripts automatically. Ensure the goal is safe for every device before proceeding.", style="bold yellow"))
+            if (await get_user_input("Type 'CONFIRM' to proceed with batch mode: ")).upper() != 'CONFIRM':
+                console.print(Panel("Batch mode cancelled.", style="bold red"))
+                continue
+
+            console.print(Panel("Provide the goal template. Device fields can be referenced as {host}, {device_type}, etc.", title="Batch", style="bold yellow"))
+            goal_template = await get_user_input()
+            try:
+                results = await run_batch(goal_template, devices, max_iterations=max_iterations)
+            except KeyboardInterrupt:
+                console.print(Panel("\nBatch mode interrupted by user.", title="Batch", style="bold red"))
+                continue
+            display_batch_results(results)
+            filename = save_batch_report(goal_template, results)
+            console.print(Panel(f"Batch report saved to {filename}", title="Batch", style="bold green"))
         else:
             await chat_with_claude(user_input)
 
@@ -1,46 +1,94 @@
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 import os
 
-# Model constants
-MAINMODEL = "claude-3-5-sonnet-20240620"
-TOOLCHECKERMODEL = "claude-3-5-sonnet-20240620"
-CODEEDITORMODEL = "claude-3-5-sonnet-20240620"
-CODEEXECUTIONMODEL = "claude-3-5-sonnet-20240620"
+from cassettes import wrap_client
+from config import API_CASSETTE_MODE, API_CASSETTE_FILE, CASSETTE_LATENCY_SCALE, CASSETTE_LATENCY_FIXED, CASSETTE_STRICT
+
+# Model tiers used by routing.py; each role picks a tier per request shape
+LARGE_MODEL = os.getenv("LARGE_MODEL", "claude-3-5-sonnet-20240620")
+SMALL_MODEL = os.getenv("SMALL_MODEL", "claude-3-5-haiku-20241022")
+TINY_MODEL = os.getenv("TINY_MODEL", "claude-3-haiku-20240307")
+MODEL_TIERS = {"large": LARGE_MODEL, "small": SMALL_MODEL, "tiny": TINY_MODEL}
+
+# Model constants (default model per role)
+MAINMODEL = LARGE_MODEL
+TOOLCHECKERMODEL = LARGE_MODEL
+CODEEDITORMODEL = LARGE_MODEL
+CODEEXECUTIONMODEL = SMALL_MODEL
+COMPACTORMODEL = SMALL_MODEL
 
 # Initialize Anthropic client
 client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Retries are handled by ratelimit.RateLimiter
+async_client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), max_retries=0)
+if API_CASSETTE_MODE:
+    # Record every response, or answer from the cassette without calling the API
+    async_client = wrap_client(async_client, API_CASSETTE_FILE, API_CASSETTE_MODE,
+                               CASSETTE_LATENCY_SCALE, CASSETTE_LATENCY_FIXED, CASSETTE_STRICT)
+
+# Pricing table in dollars per million tokens
+PRICING = {
+    "claude-3-5-sonnet-20240620": {"input": 3.00, "output": 15.00},
+    "claude-3-5-sonnet-20241022": {"input": 3.00, "output": 15.00},
+    "claude-3-5-haiku-20241022": {"input": 0.80, "output": 4.00},
+    "claude-3-haiku-20240307": {"input": 0.25, "output": 1.25},
+    "claude-3-opus-20240229": {"input": 15.00, "output": 75.00},
+}
+# Message Batches API requests are billed at half the standard rate
+BATCH_DISCOUNT = 0.5
+
+def model_cost(model):
+    return PRICING.get(model, PRICING[LARGE_MODEL])
 
 # Token tracking variables
-main_model_tokens = {'input': 0, 'output': 0}
-tool_checker_tokens = {'input': 0, 'output': 0}
-code_editor_tokens = {'input': 0, 'output': 0}
-code_execution_tokens = {'input': 0, 'output': 0}
+def _usage():
+    return {'input': 0, 'output': 0, 'cost': 0.0, 'calls': 0, 'latency': 0.0}
+
+main_model_tokens = _usage()
+tool_checker_tokens = _usage()
+code_editor_tokens = _usage()
+code_execution_tokens = _usage()
+code_execution_batch_tokens = _usage()
+compactor_tokens = _usage()
 
-# Token cost dictionary
+# Token cost dictionary, per role at its default model
 TOKEN_COST = {
-    "MAINMODEL": {"input": 3.00, "output": 15.00},
-    "TOOLCHECKERMODEL": {"input": 3.00, "output": 15.00},
-    "CODEEDITORMODEL": {"input": 3.00, "output": 15.00},
-    "CODEEXECUTIONMODEL": {"input": 3.00, "output": 15.00}
+    "MAINMODEL": model_cost(MAINMODEL),
+    "TOOLCHECKERMODEL": model_cost(TOOLCHECKERMODEL),
+    "CODEEDITORMODEL": model_cost(CODEEDITORMODEL),
+    "CODEEXECUTIONMODEL": model_cost(CODEEXECUTIONMODEL),
+    "CODEEXECUTIONBATCH": {key: value * BATCH_DISCOUNT for key, value in model_cost(CODEEXECUTIONMODEL).items()},
+    "COMPACTORMODEL": model_cost(COMPACTORMODEL),
+}
+
+_ROLE_USAGE = {
+    "main": ("MAINMODEL", main_model_tokens),
+    "tool_checker": ("TOOLCHECKERMODEL", tool_checker_tokens),
+    "code_editor": ("CODEEDITORMODEL", code_editor_tokens),
+    "code_execution": ("CODEEXECUTIONMODEL", code_execution_tokens),
+    "code_execution_batch": ("CODEEXECUTIONBATCH", code_execution_batch_tokens),
+    "compactor": ("COMPACTORMODEL", compactor_tokens),
 }
 
-def update_token_usage(model_type, input_tokens, output_tokens):
+def update_token_usage(model_type, input_tokens, output_tokens, model=None, latency=0.0):
     """
-    Update the token usage for a specific model type.
+    Update the token usage for a specific model type. When the model that
+    actually served the request is known, its price is used for the cost.
     """
-    global main_model_tokens, tool_checker_tokens, code_editor_tokens, code_execution_tokens
-    if model_type == "main":
-        main_model_tokens['input'] += input_tokens
-        main_model_tokens['output'] += output_tokens
-    elif model_type == "tool_checker":
-        tool_checker_tokens['input'] += input_tokens
-        tool_checker_tokens['output'] += output_tokens
-    elif model_type == "code_editor":
-        code_editor_tokens['input'] += input_tokens
-        code_editor_tokens['output'] += output_tokens
-    elif model_type == "code_execution":
-        code_execution_tokens['input'] += input_tokens
-        code_execution_tokens['output'] += output_tokens
+    if model_type not in _ROLE_USAGE:
+        return
+    cost_key, tokens = _ROLE_USAGE[model_type]
+    if model is not None:
+        price = model_cost(model)
+        if model_type == "code_execution_batch":
+            price = {key: value * BATCH_DISCOUNT for key, value in price.items()}
+    else:
+        price = TOKEN_COST[cost_key]
+    tokens['input'] += input_tokens
+    tokens['output'] += output_tokens
+    tokens['cost'] += (input_tokens * price["input"] + output_tokens * price["output"]) / 1_000_000
+    tokens['calls'] += 1
+    tokens['latency'] += latency
 
 def get_total_token_usage():
     """
@@ -50,5 +98,7 @@ def get_total_token_usage():
         "MAINMODEL": main_model_tokens,
         "TOOLCHECKERMODEL": tool_checker_tokens,
         "CODEEDITORMODEL": code_editor_tokens,
-        "CODEEXECUTIONMODEL": code_execution_tokens
-    }
\ No newline at end of file
+        "CODEEXECUTIONMODEL": code_execution_tokens,
+        "CODEEXECUTIONBATCH": code_execution_batch_tokens,
+        "COMPACTORMODEL": compactor_tokens,
+    }
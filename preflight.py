@@ -0,0 +1,232 @@
+import ast
+import ipaddress
+import json
+import os
+import subprocess
+import sys
+import time
+
+from config import CONDA_ENV_NAME, PREFLIGHT_MODULES_FILE, PREFLIGHT_MODULES_TTL
+
+# Keyword arguments accepted by netmiko's BaseConnection / ConnectHandler
+CONNECT_HANDLER_PARAMS = {
+    "ip", "host", "username", "password", "secret", "port", "device_type", "verbose",
+    "global_delay_factor", "global_cmd_verify", "use_keys", "key_file", "pkey", "passphrase",
+    "disabled_algorithms", "disable_sha2_fix", "allow_agent", "ssh_strict", "system_host_keys",
+    "alt_host_keys", "alt_key_file", "ssh_config_file", "conn_timeout", "auth_timeout",
+    "banner_timeout", "blocking_timeout", "timeout", "session_timeout", "read_timeout_override",
+    "keepalive", "default_enter", "response_return", "serial_settings", "fast_cli", "session_log",
+    "session_log_record_writes", "session_log_file_mode", "allow_auto_change", "encoding", "sock",
+    "sock_telnet", "auto_connect", "delay_factor_compat", "disable_lf_normalization",
+}
+
+_LIST_MODULES = (
+    "import json, pkgutil, sys; "
+    "print(json.dumps(sorted(set(m.name for m in pkgutil.iter_modules()) | set(sys.builtin_module_names) | set(sys.stdlib_module_names))))"
+)
+
+_installed_modules = None
+_modules_unavailable = False
+
+stats = {"checked": 0, "spawns_avoided": 0}
+
+def installed_modules():
+    """
+    Top-level module names importable in the execution environment. Listed
+    once through conda and cached on disk; None if the environment cannot be
+    inspected, in which case import checks are skipped.
+    """
+    global _installed_modules, _modules_unavailable
+    if _installed_modules is not None or _modules_unavailable:
+        return _installed_modules
+    try:
+        if time.time() - os.path.getmtime(PREFLIGHT_MODULES_FILE) < PREFLIGHT_MODULES_TTL:
+            with open(PREFLIGHT_MODULES_FILE, 'r') as f:
+                _installed_modules = set(json.load(f))
+                return _installed_modules
+    except (OSError, ValueError):
+        pass
+    try:
+        output = subprocess.run(["conda", "run", "-n", CONDA_ENV_NAME, "python", "-c", _LIST_MODULES],
+                                capture_output=True, text=True, timeout=60, check=True,
+                                shell=sys.platform == "win32").stdout
+        modules = json.loads(output.strip().splitlines()[-1])
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+        _modules_unavailable = True
+        return None
+    os.makedirs(os.path.dirname(PREFLIGHT_MODULES_FILE) or ".", exist_ok=True)
+    with open(PREFLIGHT_MODULES_FILE, 'w') as f:
+        json.dump(modules, f)
+    _installed_modules = set(modules)
+    return _installed_modules
+
+def refresh_installed_modules():
+    global _installed_modules, _modules_unavailable
+    _installed_modules = None
+    _modules_unavailable = False
+    try:
+        os.remove(PREFLIGHT_MODULES_FILE)
+    except OSError:
+        pass
+
+def _guarded_by_import_error(node, parents):
+    # Imports inside "try: ... except ImportError" are optional by design
+    current = parents.get(node)
+    while current is not None:
+        if isinstance(current, ast.Try):
+            for handler in current.handlers:
+                names = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+                if handler.type is None or any(isinstance(n, ast.Name) and n.id in ("ImportError", "ModuleNotFoundError", "Exception") for n in names):
+                    return True
+        current = parents.get(current)
+    return False
+
+def _check_imports(tree, parents, modules):
+    errors = []
+    local_modules = {name[:-3] for name in os.listdir(".") if name.endswith(".py")}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            top = name.split(".")[0]
+            if top in modules or top in local_modules or _guarded_by_import_error(node, parents):
+                continue
+            errors.append(f"line {node.lineno}: module '{top}' is not installed in the '{CONDA_ENV_NAME}' environment")
+    return errors
+
+def _literal_str(node):
+    return node.value if isinstance(node, ast.Constant) and isinstance(node.value, str) else None
+
+def _check_host(value, lineno):
+    if not value or not all(part.isdigit() for part in value.split(".")) or value.count(".") != 3:
+        return None
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return f"line {lineno}: '{value}' is not a valid IPv4 address"
+    if address.is_unspecified or address.is_multicast or address == ipaddress.ip_address("255.255.255.255"):
+        return f"line {lineno}: '{value}' cannot be used as a device address"
+    return None
+
+def _check_device_params(pairs, lineno, context):
+    errors = []
+    for key, value in pairs:
+        if key not in CONNECT_HANDLER_PARAMS:
+            errors.append(f"line {lineno}: unknown ConnectHandler parameter '{key}' in {context}")
+        elif key in ("host", "ip"):
+            error = _check_host(_literal_str(value), lineno)
+            if error:
+                errors.append(error)
+    return errors
+
+def _missing_host(pairs, lineno, context):
+    keys = {key for key, _ in pairs}
+    if "device_type" in keys and not keys & {"host", "ip", "sock"}:
+        return [f"line {lineno}: {context} has no 'host' or 'ip'"]
+    return []
+
+def _dict_pairs(node):
+    keys = [_literal_str(key) for key in node.keys]
+    return None if None in keys else list(zip(keys, node.values))
+
+# dict methods that change the keys of a dict in place
+_MUTATING_METHODS = {"update", "setdefault", "pop", "popitem", "clear"}
+
+def _changed_names(tree, assigned):
+    """Names whose dict may hold other keys at a call than in the literal bound to them."""
+    changed = set()
+    stores = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            stores[node.id] = stores.get(node.id, 0) + 1
+        elif (isinstance(node, ast.Subscript) and isinstance(node.ctx, (ast.Store, ast.Del))
+              and isinstance(node.value, ast.Name)):
+            changed.add(node.value.id)
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+              and node.func.attr in _MUTATING_METHODS and isinstance(node.func.value, ast.Name)):
+            changed.add(node.func.value.id)
+    # Bound more than once: to several literals, augmented (|=), or as a loop or with target
+    changed.update(name for name, count in stores.items() if count > 1 or name not in assigned)
+    return changed
+
+def _check_devices(tree):
+    """
+    Errors for the arguments that certainly reach ConnectHandler (keywords,
+    **{...} and **name of a dict literal assigned to name and not changed
+    afterwards), warnings for other dict literals that look like a device,
+    which may be inventory records filtered before they are passed on. A
+    missing host is only ever a warning, as the dict may get it later.
+    """
+    errors, warnings = [], []
+    assigned = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Dict):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    assigned.setdefault(target.id, []).append(node.value)
+    changed = _changed_names(tree, assigned)
+    changed_dicts = {id(d) for name in changed for d in assigned.get(name, ())}
+    checked = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+        if name != "ConnectHandler":
+            continue
+        pairs = [(keyword.arg, keyword.value) for keyword in node.keywords if keyword.arg]
+        complete = True
+        for keyword in node.keywords:
+            if keyword.arg:
+                continue
+            value = keyword.value
+            dicts = [value] if isinstance(value, ast.Dict) else assigned.get(value.id, []) if isinstance(value, ast.Name) else []
+            resolved = [_dict_pairs(d) for d in dicts]
+            # A name bound to several dicts, to anything else, or changed later can only be guessed at
+            if len(resolved) != 1 or resolved[0] is None or id(dicts[0]) in changed_dicts:
+                complete = False
+                continue
+            checked.add(id(dicts[0]))
+            pairs.extend(resolved[0])
+        errors.extend(_check_device_params(pairs, node.lineno, "ConnectHandler call"))
+        if complete:
+            warnings.extend(_missing_host(pairs, node.lineno, "ConnectHandler call"))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Dict) and id(node) not in checked:
+            pairs = _dict_pairs(node)
+            # Only dict literals that look like a device definition
+            if pairs and "device_type" in dict(pairs):
+                warnings.extend(_check_device_params(pairs, node.lineno, "device dictionary"))
+                if id(node) not in changed_dicts:
+                    warnings.extend(_missing_host(pairs, node.lineno, "device dictionary"))
+    return errors, warnings
+
+def check_script(code, warnings=None):
+    """
+    Static checks run before a script is handed to the execution environment.
+    Returns a list of error strings; an empty list means the script may run.
+    Findings that do not block the run are appended to warnings, if given.
+    """
+    stats["checked"] += 1
+    try:
+        compile(code, "<script>", "exec")
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        errors = [f"SyntaxError at line {e.lineno}, column {e.offset}: {e.msg}" + (f"\n    {e.text.rstrip()}" if e.text else "")]
+    else:
+        parents = {child: parent for parent in ast.walk(tree) for child in ast.iter_child_nodes(parent)}
+        errors = []
+        modules = installed_modules()
+        if modules is not None:
+            errors.extend(_check_imports(tree, parents, modules))
+        device_errors, device_warnings = _check_devices(tree)
+        errors.extend(device_errors)
+        if warnings is not None:
+            warnings.extend(device_warnings)
+    if errors:
+        stats["spawns_avoided"] += 1
+    return errors
@@ -0,0 +1,329 @@
+"""
+On-demand profiling of chat turns, driven by 'profile on|off|dump' in main.
+
+While on, a sampler thread reads the stack of every thread each
+PROFILE_INTERVAL seconds (sys._current_frames, so nothing is traced and the
+cost stays with the sampler) and counts collapsed stacks, which 'dump'
+writes as a .folded file for flamegraph.pl, speedscope or inferno. Turns
+are also split into wall-time stages: the code marks 'api <role>',
+'tool <name>' and 'prompt' sections, Rich output is timed as 'render', and
+whatever a turn spends outside them is 'other'. Stage time is exclusive:
+an analysis request made inside execute_code counts as api, not as the
+tool. In memory mode tracemalloc runs as well, and after every turn the
+session's history, file contents and tool outputs are measured next to
+the allocation sites that grew since profiling started.
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import PROFILE_DIR, PROFILE_INTERVAL, PROFILE_MAX_DEPTH, PROFILE_TOP_ALLOCATIONS
+
+# The innermost open stage of the running task
+_current = contextvars.ContextVar("profile_stage", default=None)
+
+class _Stage:
+    __slots__ = ("name", "start", "children")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.children = 0.0
+
+def deep_size(value, seen=None):
+    """Bytes held by value and everything it contains, each object counted once."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(key, seen) + deep_size(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += deep_size(vars(value), seen)
+    return size
+
+def structure_sizes(session):
+    """Bytes held by the session's history (without tool results), file contents and tool outputs."""
+    seen = set()
+    history = tool_outputs = 0
+    for message in session.conversation_history:
+        content = message["content"]
+        if isinstance(content, list):
+            for block in content:
+                if isinstance(block, dict) and block.get("type") == "tool_result":
+                    tool_outputs += deep_size(block, seen)
+                else:
+                    history += deep_size(block, seen)
+        else:
+            history += deep_size(content, seen)
+    # Outputs kept for re-poll deltas are tool output the model saw earlier
+    tool_outputs += deep_size(session.output_history.entries, seen)
+    return {"history": history, "file_contents": deep_size(session.file_contents, seen), "tool_outputs": tool_outputs}
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class Profiler:
+    def __init__(self, interval=PROFILE_INTERVAL, max_depth=PROFILE_MAX_DEPTH, directory=PROFILE_DIR):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.directory = directory
+        self.active = False
+        self.memory = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._print = None
+        self._own_tracing = False
+        self.clear()
+
+    def clear(self):
+        self.stacks = Counter()
+        self.samples = 0
+        self.overhead = 0.0
+        self.elapsed = 0.0
+        self.stages = {}
+        self.turns = 0
+        self.turn_seconds = 0.0
+        self.memory_rows = []
+        self.allocations = []
+        self._first_snapshot = None
+        self._started = None
+
+    def start(self, memory=False):
+        """Start sampling and stage timing (and tracemalloc in memory mode), discarding earlier data."""
+        if self.active:
+            self.stop()
+        self.clear()
+        self.memory = memory
+        self._own_tracing = memory and not tracemalloc.is_tracing()
+        if self._own_tracing:
+            tracemalloc.start()
+        if memory:
+            self._first_snapshot = tracemalloc.take_snapshot()
+        self._patch_console()
+        self._started = time.perf_counter()
+        self._stop.clear()
+        self.active = True
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.active:
+            return
+        self.active = False
+        self._stop.set()
+        self._thread.join()
+        self.elapsed += time.perf_counter() - self._started
+        self._restore_console()
+        if self.memory:
+            self.allocations = self.allocation_growth()
+            if self._own_tracing:
+                tracemalloc.stop()
+
+    def _patch_console(self):
+        from rich.console import Console
+        original = self._print = Console.print
+        profiler = self
+
+        def timed_print(console, *args, **kwargs):
+            # Only output inside a turn is charged to it
+            if _current.get() is None:
+                return original(console, *args, **kwargs)
+            with profiler.stage("render"):
+                return original(console, *args, **kwargs)
+        Console.print = timed_print
+
+    def _restore_console(self):
+        from rich.console import Console
+        Console.print = self._print
+
+    def _sample(self):
+        # Samples are counted as tuples of code objects, leaf first, and only
+        # named when read, which keeps the sampler's share of the GIL small
+        own = threading.get_ident()
+        max_depth = self.max_depth
+        while not self._stop.wait(self.interval):
+            begin = time.perf_counter()
+            sampled = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = [ident]
+                while frame is not None and len(stack) <= max_depth:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                if frame is not None:
+                    stack.append(None)
+                sampled.append(tuple(stack))
+            with self._lock:
+                self.stacks.update(sampled)
+                self.samples += 1
+                self.overhead += time.perf_counter() - begin
+
+    def collapsed(self):
+        """Sampled stacks as 'thread;outer frame;...;leaf frame' -> count."""
+        with self._lock:
+            stacks = list(self.stacks.items())
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        names = {}
+        collapsed = Counter()
+        for stack, count in stacks:
+            frames = [names.setdefault(code, _frame_name(code)) if code is not None else "..." for code in stack[1:]]
+            frames.append(threads.get(stack[0], f"thread-{stack[0]}"))
+            collapsed[";".join(reversed(frames))] += count
+        return collapsed
+
+    @contextmanager
+    def stage(self, name):
+        """Charge the wall time of the block, less that of stages opened inside it, to name."""
+        if not self.active:
+            yield
+            return
+        stage = _Stage(name)
+        parent = _current.get()
+        token = _current.set(stage)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - stage.start
+            if parent is not None:
+                parent.children += elapsed
+            # Concurrent children (goal sessions, background compaction) can outlast the block
+            totals = self.stages.setdefault(name, [0.0, 0])
+            totals[0] += max(0.0, elapsed - stage.children)
+            totals[1] += 1
+
+    @contextmanager
+    def turn(self, session):
+        """One chat turn: time outside the marked stages is 'other'; memory is measured after it."""
+        if not self.active:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            with self.stage("other"):
+                yield
+        finally:
+            self.turns += 1
+            self.turn_seconds += time.perf_counter() - start
+            if self.memory and self.active:
+                self.measure(session)
+
+    def measure(self, session):
+        row = structure_sizes(session)
+        row["traced"] = tracemalloc.get_traced_memory()[0]
+        row["turn"] = self.turns
+        self.memory_rows.append(row)
+
+    def allocation_growth(self, limit=PROFILE_TOP_ALLOCATIONS):
+        """Allocation sites that grew most since profiling started, as (location, bytes, blocks)."""
+        if self._first_snapshot is None or not tracemalloc.is_tracing():
+            return []
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+        stats = snapshot.compare_to(self._first_snapshot.filter_traces(ignore), "lineno")
+        growth = [stat for stat in stats if stat.size_diff > 0][:limit]
+        return [(f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", stat.size_diff, stat.count_diff)
+                for stat in growth]
+
+    def summary(self):
+        """Stages, hottest frames and memory rows collected so far."""
+        stacks = self.collapsed()
+        with self._lock:
+            samples = self.samples
+            overhead = self.overhead
+        elapsed = self.elapsed + (time.perf_counter() - self._started if self.active else 0.0)
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "turns": self.turns,
+            "turn_seconds": self.turn_seconds,
+            "elapsed": elapsed,
+            "samples": samples,
+            "interval": self.interval,
+            "overhead": overhead,
+            "stages": {name: {"seconds": seconds, "calls": calls}
+                       for name, (seconds, calls) in sorted(self.stages.items(), key=lambda item: -item[1][0])},
+            "hottest": leaves.most_common(10),
+            "memory": list(self.memory_rows),
+            "allocations": self.allocation_growth() if self.memory and self.active else self.allocations,
+        }
+
+    def dump(self):
+        """Write collapsed stacks and the summary; returns their paths."""
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+        stacks = self.collapsed()
+        with open(base + ".folded", 'w', encoding='utf-8') as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        summary = self.summary()
+        with open(base + ".json", 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        return base + ".folded", base + ".json", summary
+
+    def report(self, console, summary=None):
+        from rich.table import Table
+        from rich.box import ROUNDED
+
+        summary = summary or self.summary()
+        table = Table(title="Turn Profile", box=ROUNDED)
+        table.add_column("Stage", style="cyan")
+        table.add_column("Wall (s)", style="magenta")
+        table.add_column("Share", style="green")
+        table.add_column("Calls", style="cyan")
+        table.add_column("Avg (ms)", style="cyan")
+        total = summary["turn_seconds"] or 1.0
+        for name, stage in summary["stages"].items():
+            table.add_row(name, f"{stage['seconds']:.3f}", f"{stage['seconds'] / total:.1%}", f"{stage['calls']:,}",
+                          f"{stage['seconds'] / stage['calls'] * 1000:.1f}")
+        table.caption = (f"{summary['turns']} turn(s) in {summary['turn_seconds']:.2f}s; {summary['samples']:,} samples "
+                         f"every {summary['interval'] * 1000:.0f} ms, sampler overhead "
+                         f"{summary['overhead'] / (summary['elapsed'] or 1.0):.1%} of wall time")
+        console.print(table)
+
+        if summary["hottest"]:
+            hottest = Table(title="Hottest Frames", box=ROUNDED)
+            hottest.add_column("Frame", style="cyan")
+            hottest.add_column("Samples", style="magenta")
+            samples = sum(count for _, count in summary["hottest"]) or 1
+            for frame, count in summary["hottest"]:
+                hottest.add_row(frame, f"{count:,} ({count / samples:.0%})")
+            console.print(hottest)
+
+        if summary["memory"]:
+            memory = Table(title="Memory After Each Turn (KB)", box=ROUNDED)
+            for column in ("Turn", "History", "File contents", "Tool outputs", "Traced"):
+                memory.add_column(column, style="cyan" if column == "Turn" else "magenta")
+            first = summary["memory"][0]
+            for row in summary["memory"]:
+                memory.add_row(str(row["turn"]), *(f"{row[key] / 1024:,.0f}" for key in ("history", "file_contents", "tool_outputs", "traced")))
+            last = summary["memory"][-1]
+            memory.caption = "Growth since the first turn: " + ", ".join(
+                f"{label} {(last[key] - first[key]) / 1024:+,.0f} KB" for label, key in
+                (("history", "history"), ("file contents", "file_contents"), ("tool outputs", "tool_outputs")))
+            console.print(memory)
+
+        if summary["allocations"]:
+            allocations = Table(title="Allocation Growth Since 'profile on'", box=ROUNDED)
+            allocations.add_column("Location", style="cyan")
+            allocations.add_column("KB", style="magenta")
+            allocations.add_column("Blocks", style="magenta")
+            for location, size, count in summary["allocations"]:
+                allocations.add_row(location, f"{size / 1024:+,.1f}", f"{count:+,}")
+            console.print(allocations)
+
+profiler = Profiler()
@@ -0,0 +1,228 @@
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+from anthropic import APIConnectionError, APIStatusError
+
+from config import (API_MAX_CONCURRENCY, API_REQUESTS_PER_MINUTE, API_INPUT_TOKENS_PER_MINUTE,
+                    API_OUTPUT_TOKENS_PER_MINUTE, API_MAX_RETRIES, API_BACKOFF_BASE, API_BACKOFF_MAX)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+class TokenBucket:
+    """
+    Per-minute budget that refills continuously. The level may go negative
+    when actual usage turns out larger than what was reserved; callers then
+    wait until it has refilled.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def delay_for(self, amount):
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+    def consume(self, amount):
+        self._refill()
+        self.level -= amount
+
+    def refund(self, amount):
+        """Give back a reservation that was not used."""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def pause(self, seconds):
+        """Leave exactly one unit available after the given number of seconds."""
+        self._refill()
+        self.level = min(self.level, 1.0 - seconds * self.capacity / 60.0)
+
+    def sync(self, limit, remaining, reset_at=None):
+        """Align the bucket with the server's view from rate-limit headers."""
+        self._refill()
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+        if reset_at is not None and remaining == 0:
+            # Nothing left until the server resets the window
+            self.level = min(self.level, -max(0.0, reset_at - time.time()) * self.capacity / 60.0)
+
+def estimate_input_tokens(request):
+    """Rough input size from the serialized request, about four characters per token."""
+    size = len(json.dumps(request.get("messages", []), default=str))
+    size += len(str(request.get("system", "")))
+    size += len(json.dumps(request.get("tools", []), default=str))
+    return size // 4 + 1
+
+def _parse_reset(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def retry_after_seconds(headers):
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+class RateLimiter:
+    """
+    Client-side limiter shared by every session that talks to the API.
+
+    Tracks requests, input tokens and output tokens per minute as token
+    buckets, kept in sync with the anthropic-ratelimit-* response headers,
+    caps the number of in-flight requests, and retries throttled or
+    overloaded calls with jittered exponential backoff that honours
+    retry-after. Use create_message() for calls that should be retried, or
+    the instance as an async context manager for plain admission control.
+    """
+
+    def __init__(self, max_concurrency=API_MAX_CONCURRENCY, requests_per_minute=API_REQUESTS_PER_MINUTE,
+                 input_tokens_per_minute=API_INPUT_TOKENS_PER_MINUTE,
+                 output_tokens_per_minute=API_OUTPUT_TOKENS_PER_MINUTE,
+                 max_retries=API_MAX_RETRIES, backoff_base=API_BACKOFF_BASE, backoff_max=API_BACKOFF_MAX):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.buckets = {
+            "requests": TokenBucket(requests_per_minute),
+            "input_tokens": TokenBucket(input_tokens_per_minute),
+            "output_tokens": TokenBucket(output_tokens_per_minute),
+        }
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "wait_seconds": 0.0}
+
+    async def _reserve(self, input_tokens):
+        # The lock keeps waiters in FIFO order so large requests are not starved
+        async with self._lock:
+            while True:
+                wait = max(self.buckets["requests"].delay_for(1),
+                           self.buckets["input_tokens"].delay_for(input_tokens),
+                           self.buckets["output_tokens"].delay_for(1))
+                if wait <= 0:
+                    break
+                self.stats["wait_seconds"] += wait
+                await asyncio.sleep(wait)
+            self.buckets["requests"].consume(1)
+            self.buckets["input_tokens"].consume(input_tokens)
+
+    async def acquire(self, input_tokens=0):
+        await self._semaphore.acquire()
+        try:
+            await self._reserve(input_tokens)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def release(self):
+        self._semaphore.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def update_from_headers(self, headers):
+        if headers is None:
+            return
+        for name, bucket in self.buckets.items():
+            prefix = "anthropic-ratelimit-" + name.replace("_", "-")
+            limit = _parse_int(headers.get(prefix + "-limit"))
+            remaining = _parse_int(headers.get(prefix + "-remaining"))
+            if limit is None and remaining is None:
+                continue
+            bucket.sync(limit, remaining, _parse_reset(headers.get(prefix + "-reset")))
+
+    def record_usage(self, input_tokens, output_tokens, estimated_input):
+        # Reconcile the reservation with what the API actually counted
+        self.buckets["input_tokens"].consume(input_tokens - estimated_input)
+        self.buckets["output_tokens"].consume(output_tokens)
+
+    def backoff(self, attempt, headers=None):
+        retry_after = retry_after_seconds(headers)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def create_message(self, client, **request):
+        """
+        Send a Messages API request through the limiter, retrying 429/529 and
+        transient errors. The client should be created with max_retries=0 so
+        retries are not doubled up inside the SDK.
+        """
+        estimated_input = estimate_input_tokens(request)
+        attempt = 0
+        while True:
+            await self.acquire(estimated_input)
+            reserved = estimated_input
+            try:
+                raw = await client.messages.with_raw_response.create(**request)
+                self.update_from_headers(raw.headers)
+                response = await raw.parse()
+                self.stats["requests"] += 1
+                reserved = 0
+                self.record_usage(response.usage.input_tokens, response.usage.output_tokens, estimated_input)
+                return response
+            except APIStatusError as e:
+                self.update_from_headers(e.response.headers)
+                if e.status_code == 429:
+                    # Hold back every caller, not only this one, until the server says to retry
+                    self.buckets["requests"].pause(retry_after_seconds(e.response.headers) or self.backoff_base)
+                if e.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self.backoff(attempt, e.response.headers)
+            except APIConnectionError:
+                if attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self.backoff(attempt)
+            finally:
+                # A failed attempt is not billed, so only the attempt that succeeds keeps its tokens
+                if reserved:
+                    self.buckets["input_tokens"].refund(reserved)
+                self.release()
+
+            attempt += 1
+            self.stats["retries"] += 1
+            self.stats["wait_seconds"] += delay
+            await asyncio.sleep(delay)
+
+# Shared by the interactive session, batch sessions and the analysis calls
+limiter = RateLimiter()
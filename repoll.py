@@ -0,0 +1,154 @@
+import difflib
+import hashlib
+import os
+import time
+from collections import Counter
+
+from clustering import find_verbatim
+from config import REPOLL_OUTPUT_DIR, REPOLL_MAX_AGE, REPOLL_MIN_OUTPUT_CHARS, REPOLL_RETENTION
+
+POLL_METHODS = ("send_command", "send_command_timing")
+
+def store_output(text, output_dir=REPOLL_OUTPUT_DIR):
+    """Save text under its content hash (kept for REPOLL_RETENTION) and return the path."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, hashlib.sha256(text.encode("utf-8")).hexdigest()[:20] + ".txt")
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return path
+
+def command_key(command):
+    return " ".join(command.split()).lower()
+
+def _field_change(old, new):
+    """'~ label: a -> b, ...' for two lines that differ in a few whitespace separated fields, else None."""
+    old_fields, new_fields = old.split(), new.split()
+    if len(old_fields) != len(new_fields) or not old_fields or old_fields[0] != new_fields[0]:
+        return None
+    changed = [(a, b) for a, b in zip(old_fields, new_fields) if a != b]
+    if not changed or len(changed) > 3:
+        return None
+    return f"~ {old_fields[0]}: " + ", ".join(f"{a} -> {b}" for a, b in changed)
+
+def format_delta(old, new):
+    """
+    Compact line delta from old to new: '~' lines for rows where only a few
+    fields changed (labelled by their first field), '-'/'+' lines otherwise.
+    Returns (delta text, number of changed lines).
+    """
+    old_lines, new_lines = old.split("\n"), new.split("\n")
+    lines = []
+    changed = 0
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        changed += max(i2 - i1, j2 - j1)
+        if tag == "replace" and i2 - i1 == j2 - j1:
+            for a, b in zip(old_lines[i1:i2], new_lines[j1:j2]):
+                field_change = _field_change(a, b)
+                lines.extend([field_change] if field_change else ["- " + a, "+ " + b])
+            continue
+        lines.extend("- " + line for line in old_lines[i1:i2])
+        lines.extend("+ " + line for line in new_lines[j1:j2])
+    return "\n".join(lines), changed
+
+class OutputHistory:
+    """
+    Last output of every (host, command) polled in one conversation.
+
+    When a script re-runs a show command on a device within max_age seconds,
+    the output it printed is replaced in the tool result by the delta
+    against the previous run, with the path of a file holding the full
+    text. History lives on the session, so a delta always refers to output
+    the model has already seen; the full texts are content addressed files
+    shared by all sessions and pruned after REPOLL_RETENTION seconds.
+    """
+
+    def __init__(self, output_dir=REPOLL_OUTPUT_DIR, max_age=REPOLL_MAX_AGE, min_chars=REPOLL_MIN_OUTPUT_CHARS):
+        self.output_dir = output_dir
+        self.max_age = max_age
+        self.min_chars = min_chars
+        self.entries = {}
+        self.served = 0
+        self.unchanged = 0
+        self._prune()
+
+    def clear(self):
+        self.entries = {}
+
+    def _prune(self):
+        cutoff = time.time() - REPOLL_RETENTION
+        try:
+            names = os.listdir(self.output_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.output_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _store(self, text):
+        return store_output(text, self.output_dir)
+
+    def condense(self, stdout, records):
+        """
+        Record the outputs of one run that the script printed verbatim, and
+        replace those that repeat a recent poll of the same (host, command)
+        by their delta. Outputs the model never saw are not recorded, so no
+        later delta refers to them. Returns the new stdout.
+        """
+        polled = []
+        for record in records:
+            output = record.get("output")
+            command = record.get("command")
+            if record.get("method") not in POLL_METHODS or not record.get("host") or not isinstance(output, str) or not isinstance(command, str):
+                continue
+            text = output.strip()
+            if len(text) >= self.min_chars:
+                polled.append((record, command, text))
+        found = find_verbatim(stdout, {text for _, _, text in polled})
+        # Identical texts from different hosts are matched in print order
+        printed = Counter(text for _, text in found)
+        deltas = {}
+        for record, command, text in polled:
+            if not printed[text]:
+                continue
+            printed[text] -= 1
+            key = (record["host"], command_key(command))
+            ts = record.get("ts") or time.time()
+            path = self._store(text)
+            previous = self.entries.get(key)
+            self.entries[key] = (ts, text, path)
+            replacement = None
+            if previous is not None and ts - previous[0] <= self.max_age:
+                delta, changed = format_delta(previous[1], text)
+                since = time.strftime("%H:%M:%S", time.localtime(previous[0]))
+                if changed:
+                    block = f"[{command} on {record['host']}: {changed} line(s) changed since the run at {since}; full output: {path}]\n{delta}"
+                else:
+                    block = f"[{command} on {record['host']}: unchanged since the run at {since}; full output: {path}]"
+                if len(block) < len(text):
+                    replacement = (block, changed)
+            deltas.setdefault(text, []).append(replacement)
+        if not any(any(replacements) for replacements in deltas.values()):
+            return stdout
+        pieces = []
+        last = 0
+        for start, text in found:
+            replacement = deltas[text].pop(0) if deltas.get(text) else None
+            if replacement is not None:
+                block, changed = replacement
+                pieces.append(stdout[last:start])
+                pieces.append(block)
+                last = start + len(text)
+                self.served += 1
+                self.unchanged += not changed
+        pieces.append(stdout[last:])
+        return "".join(pieces)
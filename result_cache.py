@@ -0,0 +1,306 @@
+"""
+Read-only command classification and the shared TTL result cache.
+
+A command is read-only if it only displays state (show, display, ping,
+traceroute, dir, more) and does not write the output anywhere on the
+device. A script is read-only if every command it can send is a
+read-only literal, it calls no configuration method, and it has no
+effect outside the devices (file writes, deletes, sockets or HTTP,
+subprocesses). Results of
+read-only commands are cached per (host, command) with a TTL taken from
+COMMAND_TTLS; sending configuration to a device drops its entries. Whole
+read-only scripts are cached by their text for the shortest TTL of the
+commands they ran.
+
+Standard library only: exec_runtime uses it inside the 'netmikoai'
+environment to answer send_command from the cache, with the cache file
+passed in the NETMIKOAI_RESULT_CACHE variable.
+"""
+import ast
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+CACHE_FILE_ENV = "NETMIKOAI_RESULT_CACHE"
+
+READ_ONLY_COMMAND = re.compile(r"^\s*(sh(ow?)?|display|dis|ping|traceroute|trace|dir|more|terminal\s+(length|width))\b", re.I)
+# Output redirection turns a show command into a write on the device
+WRITES_OUTPUT = re.compile(r"\|\s*(redirect|tee|append|save)\b|>\s*\S", re.I)
+
+# Seconds a result stays valid, first match wins. Inventory facts change
+# rarely, configuration views are invalidated by pushes anyway, and
+# anything that reflects live state is never cached.
+COMMAND_TTLS = [
+    (re.compile(r"clock|log|counter|process|cpu|memory|users|session|ping|trace|terminal|"
+                r"bgp|ospf|eigrp|isis|neighbor|route|arp|mac|interface|status|spanning|channel|"
+                r"standby|vrrp|hsrp|sla|track|environment|power|platform\s+resources", re.I), 0),
+    (re.compile(r"version|inventory|module|license|hardware|boot|diag|idprom|serial|chassis", re.I), 3600),
+    (re.compile(r"run|start|conf|vlan|snmp|aaa|user", re.I), 600),
+]
+
+CONFIG_METHODS = ("send_config_set", "send_config_from_file", "config_mode", "commit", "write_channel",
+                  "send_multiline", "send_multiline_timing", "file_transfer")
+SHOW_METHODS = ("send_command", "send_command_timing", "send_command_expect")
+
+def command_key(command):
+    return " ".join(command.split()).lower()
+
+def is_read_only(command):
+    return bool(READ_ONLY_COMMAND.match(command)) and not WRITES_OUTPUT.search(command)
+
+def changes_device(method, command):
+    """
+    True if a call may change the device: a configuration method, or any
+    other command that is not read-only (conf t, write mem, copy run start,
+    clear, reload, ... sent through send_command).
+    """
+    if method in CONFIG_METHODS:
+        return True
+    return method != "connect" and isinstance(command, str) and bool(command.strip()) and not is_read_only(command)
+
+def command_ttl(command, default_ttl):
+    """Cache lifetime of a command's result in seconds; 0 means never cached."""
+    if not is_read_only(command):
+        return 0
+    for pattern, ttl in COMMAND_TTLS:
+        if pattern.search(command):
+            return ttl
+    return default_ttl
+
+def _string_values(node, assignments):
+    """Possible literal string values of an expression, or None if unknown."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, ast.JoinedStr):
+        # f"show interface {name}": the literal prefix decides the command
+        first = node.values[0] if node.values else None
+        return [first.value] if isinstance(first, ast.Constant) and isinstance(first.value, str) else None
+    if isinstance(node, (ast.List, ast.Tuple)):
+        values = [_string_values(element, assignments) for element in node.elts]
+        return None if any(v is None for v in values) else [s for v in values for s in v]
+    if isinstance(node, ast.Name) and node.id in assignments:
+        values = [_string_values(value, assignments) for value in assignments[node.id]]
+        return None if any(v is None for v in values) else [s for v in values for s in v]
+    return None
+
+# A cached script run is answered without executing the script, so any
+# effect besides talking to devices through netmiko rules it out
+SIDE_EFFECT_MODULES = {"subprocess", "socket", "requests", "urllib", "urllib3", "http", "httpx", "aiohttp",
+                       "smtplib", "ftplib", "telnetlib", "paramiko", "scp", "shutil", "multiprocessing"}
+# os functions that write, delete or run something, only when called on os
+# (list.remove and str.replace are not side effects)
+OS_SIDE_EFFECTS = {"system", "popen", "remove", "unlink", "rmdir", "removedirs", "rename", "renames", "replace",
+                   "mkdir", "makedirs", "symlink", "link", "chmod", "chown", "truncate", "startfile", "kill", "fork"}
+OS_SIDE_EFFECT_PREFIXES = ("exec", "spawn")
+# Methods that write or delete whatever they are called on (pathlib, logging handlers)
+SIDE_EFFECT_METHODS = {"write_text", "write_bytes", "touch", "unlink", "rmdir", "mkdir", "symlink_to", "hardlink_to",
+                       "FileHandler", "RotatingFileHandler", "TimedRotatingFileHandler"}
+
+def _side_effects(tree):
+    """Reasons a script does more than read from devices: file writes, deletes, network or processes."""
+    reasons = []
+    from_os = {alias.asname or alias.name for node in ast.walk(tree)
+               if isinstance(node, ast.ImportFrom) and node.module == "os" for alias in node.names}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names = [alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module or ""]
+            reasons.extend(f"line {node.lineno}: imports {name}" for name in names if name.split(".")[0] in SIDE_EFFECT_MODULES)
+        elif isinstance(node, ast.Dict):
+            if any(isinstance(key, ast.Constant) and key.value == "session_log" for key in node.keys):
+                reasons.append(f"line {node.lineno}: writes a session log")
+        elif isinstance(node, ast.Call):
+            func = node.func
+            name = func.attr if isinstance(func, ast.Attribute) else func.id if isinstance(func, ast.Name) else None
+            keywords = {keyword.arg: keyword.value for keyword in node.keywords}
+            if "session_log" in keywords:
+                reasons.append(f"line {node.lineno}: writes a session log")
+            elif name == "open":
+                # open(path, mode), io.open(path, mode), but Path(path).open(mode)
+                builtin = isinstance(func, ast.Name) or isinstance(func.value, ast.Name) and func.value.id in ("io", "codecs")
+                position = 1 if builtin else 0
+                mode = node.args[position] if len(node.args) > position else keywords.get("mode")
+                if mode is not None and not (isinstance(mode, ast.Constant) and isinstance(mode.value, str)
+                                             and not set(mode.value) & set("wax+")):
+                    reasons.append(f"line {node.lineno}: opens a file for writing")
+            elif name == "basicConfig" and "filename" in keywords:
+                reasons.append(f"line {node.lineno}: logs to a file")
+            elif name in SIDE_EFFECT_METHODS or (
+                    (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "os"
+                     or isinstance(func, ast.Name) and func.id in from_os)
+                    and (name in OS_SIDE_EFFECTS or name.startswith(OS_SIDE_EFFECT_PREFIXES))):
+                reasons.append(f"line {node.lineno}: calls {name}")
+    return reasons
+
+def classify_script(code):
+    """
+    (read_only, reasons) for a script. Commands must be literals, literal
+    lists, names bound only to those (including loop variables over them),
+    or f-strings whose literal prefix is read-only; anything else counts as
+    possibly mutating. So does any side effect outside the devices (see
+    _side_effects), as a cache hit skips running the script.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False, ["script does not parse"]
+    assignments = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    assignments.setdefault(target.id, []).append(node.value)
+        elif isinstance(node, (ast.For, ast.comprehension)) and isinstance(node.target, ast.Name):
+            iterable = node.iter
+            if isinstance(iterable, ast.Name) and iterable.id in assignments:
+                values = assignments[iterable.id]
+            else:
+                values = [iterable]
+            # Each element of a literal list is a possible value of the loop variable
+            assignments.setdefault(node.target.id, []).extend(
+                element for value in values for element in (value.elts if isinstance(value, (ast.List, ast.Tuple)) else [value]))
+    reasons = _side_effects(tree)
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        name = node.func.attr if isinstance(node.func, ast.Attribute) else node.func.id if isinstance(node.func, ast.Name) else None
+        if name in CONFIG_METHODS:
+            reasons.append(f"line {node.lineno}: calls {name}")
+        elif name in SHOW_METHODS:
+            argument = node.args[0] if node.args else next(
+                (k.value for k in node.keywords if k.arg in ("command_string", "command")), None)
+            values = _string_values(argument, assignments) if argument is not None else None
+            if values is None:
+                reasons.append(f"line {node.lineno}: {name} command is not a literal")
+            else:
+                reasons.extend(f"line {node.lineno}: '{value.strip()}' is not read-only" for value in values if not is_read_only(value))
+    return not reasons, reasons
+
+def script_digest(code):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()[:32]
+
+class ResultCache:
+    """
+    SQLite cache of read-only command results per (host, command) and of
+    whole read-only script runs, shared by sessions and by exec_runtime.
+    """
+
+    def __init__(self, path, default_ttl=60.0, read_only=False):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.read_only = read_only
+        self._db = None
+        self._lock = threading.Lock()
+        self.stats = {"script_lookups": 0, "script_hits": 0, "command_lookups": 0, "command_hits": 0}
+
+    def _connect(self):
+        if self._db is None:
+            if self.read_only:
+                # exec_runtime never creates the file; no cache yet means no hits
+                self._db = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._db.executescript("""
+                    CREATE TABLE IF NOT EXISTS results (host TEXT, command TEXT, output TEXT, created REAL, expires REAL,
+                                                        PRIMARY KEY (host, command));
+                    CREATE TABLE IF NOT EXISTS scripts (digest TEXT PRIMARY KEY, stdout TEXT, records TEXT, created REAL, expires REAL);
+                    CREATE TABLE IF NOT EXISTS script_hosts (digest TEXT, host TEXT);
+                    CREATE INDEX IF NOT EXISTS script_hosts_host ON script_hosts (host);
+                """)
+        return self._db
+
+    def get_output(self, host, command):
+        """(output, created) of a fresh cached result, or None."""
+        try:
+            with self._lock:
+                row = self._connect().execute("SELECT output, created FROM results WHERE host = ? AND command = ? AND expires > ?",
+                                              (host, command_key(command), time.time())).fetchone()
+        except sqlite3.Error:
+            return None
+        return row
+
+    def put_output(self, host, command, output, created=None):
+        ttl = command_ttl(command, self.default_ttl)
+        if ttl <= 0:
+            return False
+        created = created or time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", (host, command_key(command), output, created, created + ttl))
+            db.commit()
+        return True
+
+    def get_script(self, digest):
+        """(stdout, records, created) of a fresh cached script run, or None."""
+        self.stats["script_lookups"] += 1
+        with self._lock:
+            row = self._connect().execute("SELECT stdout, records, created FROM scripts WHERE digest = ? AND expires > ?",
+                                          (digest, time.time())).fetchone()
+        if row is None:
+            return None
+        self.stats["script_hits"] += 1
+        return row[0], json.loads(row[1]), row[2]
+
+    def put_script(self, digest, stdout, records):
+        """Cache a read-only run for the shortest TTL of the commands it sent; returns the TTL used."""
+        commands = [record["command"] for record in records if isinstance(record.get("command"), str) and record.get("method") != "connect"]
+        hosts = {record["host"] for record in records if record.get("host")}
+        if not commands or not hosts:
+            return 0
+        ttl = min(command_ttl(command, self.default_ttl) for command in commands)
+        if ttl <= 0:
+            return 0
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO scripts VALUES (?, ?, ?, ?, ?)", (digest, stdout, json.dumps(records), now, now + ttl))
+            db.execute("DELETE FROM script_hosts WHERE digest = ?", (digest,))
+            db.executemany("INSERT INTO script_hosts VALUES (?, ?)", [(digest, host) for host in hosts])
+            db.commit()
+        return ttl
+
+    def invalidate(self, host):
+        """Drop every cached result of a device and every cached script that touched it."""
+        with self._lock:
+            db = self._connect()
+            db.execute("DELETE FROM results WHERE host = ?", (host,))
+            digests = [row[0] for row in db.execute("SELECT digest FROM script_hosts WHERE host = ?", (host,))]
+            db.executemany("DELETE FROM scripts WHERE digest = ?", [(digest,) for digest in digests])
+            db.executemany("DELETE FROM script_hosts WHERE digest = ?", [(digest,) for digest in digests])
+            db.execute("DELETE FROM results WHERE expires <= ?", (time.time(),))
+            db.commit()
+
+    def ingest(self, records):
+        """
+        Fold one run's capture records in, in order: anything that may have
+        changed a device invalidates it, fresh read-only outputs are cached.
+        Returns the number of outputs cached.
+        """
+        cached = 0
+        for record in records:
+            host = record.get("host")
+            command = record.get("command")
+            if not host:
+                continue
+            if changes_device(record.get("method"), command):
+                self.invalidate(host)
+            elif record.get("cached"):
+                self.stats["command_lookups"] += 1
+                self.stats["command_hits"] += 1
+            elif isinstance(command, str) and isinstance(record.get("output"), str):
+                self.stats["command_lookups"] += bool(record.get("cache_miss"))
+                cached += self.put_output(host, command, record["output"], record.get("ts"))
+        return cached
+
+    def hit_rates(self):
+        """Short summary for the usage display, or '' before any lookup."""
+        parts = []
+        if self.stats["script_lookups"]:
+            parts.append(f"{self.stats['script_hits']}/{self.stats['script_lookups']} read-only scripts")
+        if self.stats["command_lookups"]:
+            parts.append(f"{self.stats['command_hits']}/{self.stats['command_lookups']} read-only commands")
+        return ("Result cache hits: " + ", ".join(parts)) if parts else ""
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import math
+import os
+import time
+from rich.console import Console
+from rich.table import Table
+from rich.box import ROUNDED
+
+from captures import new_capture_file, runtime_env, process_capture
+from config import (ROLLOUT_PYTHON, ROLLOUT_CANARY_SIZE, ROLLOUT_WAVE_GROWTH, ROLLOUT_MAX_PARALLEL,
+                    ROLLOUT_FAILURE_THRESHOLD, ROLLOUT_DEVICE_TIMEOUT)
+
+console = Console()
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def plan_waves(count, canary_size=ROLLOUT_CANARY_SIZE, growth=ROLLOUT_WAVE_GROWTH):
+    """Split count devices into waves: a canary wave, then waves growing by the growth factor."""
+    sizes = []
+    size = max(1, canary_size)
+    remaining = count
+    while remaining > 0:
+        sizes.append(min(size, remaining))
+        remaining -= sizes[-1]
+        size = max(size + 1, math.ceil(size * growth))
+    return sizes
+
+async def _run_wave(devices, job, on_result):
+    """
+    Push one wave through a rollout_worker process. on_result is called for
+    every device record and returns True when the rollout must stop; the
+    worker is then told to skip devices that have not started yet.
+    """
+    capture_file = new_capture_file()
+    process = await asyncio.create_subprocess_shell(
+        f"{ROLLOUT_PYTHON} -m rollout_worker",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=ROOT_DIR,
+        env=runtime_env(capture_file),
+        shell=True
+    )
+    process.stdin.write((json.dumps(dict(job, devices=devices)) + "\n").encode())
+    await process.stdin.drain()
+
+    reported = set()
+    timeout = ROLLOUT_DEVICE_TIMEOUT * math.ceil(len(devices) / job["max_parallel"])
+
+    async def read_results():
+        async for line in process.stdout:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            reported.add(record["host"])
+            if on_result(record) and not process.stdin.is_closing():
+                process.stdin.write(b"abort\n")
+                await process.stdin.drain()
+
+    try:
+        await asyncio.wait_for(read_results(), timeout=timeout)
+        _, stderr = await process.communicate()
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        stderr = b""
+    finally:
+        await asyncio.to_thread(process_capture, capture_file)
+
+    # Devices the worker never reported on count as failures
+    for device in devices:
+        host = device.get("host") or device.get("ip")
+        if host not in reported:
+            detail = stderr.decode(errors="replace").strip()[-500:] or f"no result within {timeout:.0f}s"
+            on_result({"host": host, "ok": False, "error": f"Worker did not report this device: {detail}"})
+
+async def run_rollout(devices, config_commands, verify_command=None, verify_expect=None,
+                      max_parallel=ROLLOUT_MAX_PARALLEL, failure_threshold=ROLLOUT_FAILURE_THRESHOLD,
+                      canary_size=ROLLOUT_CANARY_SIZE, growth=ROLLOUT_WAVE_GROWTH, save_config=False):
+    """
+    Push config_commands to devices in waves of growing size. After each
+    device the verify_command is run (and checked for verify_expect). The
+    rollout stops as soon as the share of failed devices among those
+    attempted exceeds failure_threshold; devices not yet started are left
+    untouched. Returns a report with per-wave timing and outcome.
+    """
+    job = {
+        "config_commands": config_commands,
+        "verify_command": verify_command,
+        "verify_expect": verify_expect,
+        "save_config": save_config,
+        "max_parallel": max(1, max_parallel),
+    }
+    report = {"status": "completed", "waves": [], "succeeded": [], "failed": {}, "not_attempted": []}
+    start = time.monotonic()
+    offset = 0
+    aborted = False
+
+    for index, size in enumerate(plan_waves(len(devices), canary_size, growth), 1):
+        wave_devices = devices[offset:offset + size]
+        offset += size
+        wave = {"wave": index, "size": size, "succeeded": 0, "failed": 0, "skipped": 0}
+
+        def on_result(record):
+            nonlocal aborted
+            if record.get("skipped"):
+                wave["skipped"] += 1
+                report["not_attempted"].append(record["host"])
+                return aborted
+            if record["ok"]:
+                wave["succeeded"] += 1
+                report["succeeded"].append(record["host"])
+            else:
+                wave["failed"] += 1
+                report["failed"][record["host"]] = record.get("error", "unknown error")
+            attempted = len(report["succeeded"]) + len(report["failed"])
+            if not aborted and len(report["failed"]) / attempted > failure_threshold:
+                aborted = True
+                report["status"] = "aborted"
+                report["reason"] = (f"failure rate {len(report['failed'])}/{attempted} exceeded "
+                                    f"threshold {failure_threshold:.0%} in wave {index}")
+            return aborted
+
+        console.print(f"Rollout wave {index}: pushing to {size} device(s)", style="bold blue")
+        wave_start = time.monotonic()
+        await _run_wave(wave_devices, job, on_result)
+        wave["elapsed"] = round(time.monotonic() - wave_start, 2)
+        report["waves"].append(wave)
+        if aborted:
+            report["not_attempted"].extend(d.get("host") or d.get("ip") for d in devices[offset:])
+            break
+
+    report["elapsed"] = round(time.monotonic() - start, 2)
+    return report
+
+def display_rollout_report(report):
+    table = Table(box=ROUNDED, title=f"Rollout {report['status']}")
+    table.add_column("Wave", style="cyan")
+    table.add_column("Devices", style="magenta")
+    table.add_column("Succeeded", style="green")
+    table.add_column("Failed", style="red")
+    table.add_column("Skipped", style="yellow")
+    table.add_column("Time (s)", style="green")
+
+    for wave in report["waves"]:
+        table.add_row(str(wave["wave"]), str(wave["size"]), str(wave["succeeded"]), str(wave["failed"]),
+                      str(wave["skipped"]), f"{wave['elapsed']:.1f}")
+
+    console.print(table)
+    if report.get("reason"):
+        console.print(f"Rollout aborted: {report['reason']}", style="bold red")
+
+def format_rollout_report(report):
+    lines = [f"Rollout {report['status']} in {report['elapsed']:.1f}s"]
+    if report.get("reason"):
+        lines.append(f"Reason: {report['reason']}")
+    for wave in report["waves"]:
+        lines.append(f"Wave {wave['wave']}: {wave['size']} devices, {wave['succeeded']} succeeded, "
+                     f"{wave['failed']} failed, {wave['skipped']} skipped, {wave['elapsed']:.1f}s")
+    lines.append(f"Succeeded ({len(report['succeeded'])}): {', '.join(report['succeeded']) or '-'}")
+    for host, error in report["failed"].items():
+        lines.append(f"Failed {host}: {error}")
+    if report["not_attempted"]:
+        lines.append(f"Not attempted ({len(report['not_attempted'])}): {', '.join(report['not_attempted'])}")
+    return "\n".join(lines)
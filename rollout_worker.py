@@ -0,0 +1,86 @@
+"""
+Worker for one rollout wave, started by rollout.py in the 'netmikoai'
+conda environment as
+
+    python -m rollout_worker
+
+The job is read as one JSON line on stdin and names the devices of the
+wave, the config commands, the verification command and the parallelism.
+Each device is pushed and verified on its own thread, and one JSON line per
+device is printed as soon as it finishes, so the scheduler can follow
+progress. A later "abort" line on stdin stops devices that have not started
+yet; pushes already in flight are allowed to finish. Connections go through
+exec_runtime, so learned timing profiles apply here as well.
+"""
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import exec_runtime
+
+# Substrings in device output that mean a config line was rejected
+ERROR_MARKERS = ("% Invalid", "% Incomplete", "% Ambiguous", "% Unknown command", "syntax error", "Error:")
+
+_print_lock = threading.Lock()
+_abort = threading.Event()
+
+def _report(record):
+    with _print_lock:
+        print(json.dumps(record), flush=True)
+
+def push_device(device, job):
+    import netmiko
+    host = device.get("host") or device.get("ip")
+    record = {"host": host, "ok": False}
+    if _abort.is_set():
+        record["skipped"] = True
+        return record
+    start = time.monotonic()
+    try:
+        connection = netmiko.ConnectHandler(**device)
+        try:
+            output = connection.send_config_set(job["config_commands"])
+            record["push_elapsed"] = round(time.monotonic() - start, 3)
+            rejected = [marker for marker in ERROR_MARKERS if marker in output]
+            if rejected:
+                record["error"] = f"Config rejected ({rejected[0]}): {output[-500:]}"
+                return record
+            if job.get("save_config") and hasattr(connection, "save_config"):
+                connection.save_config()
+            if job.get("verify_command"):
+                verify_start = time.monotonic()
+                verify_output = connection.send_command(job["verify_command"])
+                record["verify_elapsed"] = round(time.monotonic() - verify_start, 3)
+                expect = job.get("verify_expect")
+                if expect and expect not in verify_output:
+                    record["error"] = f"Verification failed: {expect!r} not found in output of {job['verify_command']!r}"
+                    record["verify_output"] = verify_output[-500:]
+                    return record
+            record["ok"] = True
+        finally:
+            connection.disconnect()
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        record["elapsed"] = round(time.monotonic() - start, 3)
+    return record
+
+def _watch_stdin():
+    for line in sys.stdin:
+        if line.strip() == "abort":
+            _abort.set()
+            return
+
+def main():
+    job = json.loads(sys.stdin.readline())
+    threading.Thread(target=_watch_stdin, daemon=True).start()
+    exec_runtime.install()
+    with ThreadPoolExecutor(max_workers=max(1, job.get("max_parallel", 1))) as executor:
+        futures = [executor.submit(push_device, device, job) for device in job["devices"]]
+        for future in futures:
+            future.add_done_callback(lambda f: _report(f.result()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import time
+from collections import namedtuple
+from anthropic import APIConnectionError, APIStatusError
+
+from models import MODEL_TIERS, async_client, update_token_usage
+from profiler import profiler
+from config import ROUTE_SUMMARY_MAX_CHARS
+
+Route = namedtuple("Route", ["tier", "max_tokens", "fallbacks"])
+
+# Role -> request shape -> route. "default" applies when no other shape matches.
+ROUTES = {
+    "main": {
+        "default": Route("large", 8000, ()),
+    },
+    "tool_checker": {
+        # Reading a short, successful tool result and deciding what is next
+        "summary": Route("small", 4000, ("large",)),
+        "default": Route("large", 8000, ()),
+    },
+    "code_editor": {
+        "default": Route("large", 8000, ()),
+    },
+    "code_execution": {
+        "default": Route("small", 2000, ("large",)),
+    },
+    "compactor": {
+        # Summarizing old turns into a session state block, off the critical path
+        "default": Route("small", 2000, ("large",)),
+    },
+}
+
+# Errors after which the next model in the fallback chain is tried
+FALLBACK_STATUS_CODES = {403, 404, 500, 502, 503, 529}
+
+decisions = []
+
+def classify_tool_round(tool_results):
+    """Shape of a follow-up request from the tool results it carries."""
+    if any(result.get("is_error") for result in tool_results):
+        return "default"
+    size = sum(len(str(result.get("content", ""))) for result in tool_results)
+    return "summary" if size <= ROUTE_SUMMARY_MAX_CHARS else "default"
+
+def route(role, shape="default"):
+    """Return the list of (model, max_tokens) to try, preferred first."""
+    routes = ROUTES[role]
+    chosen = routes.get(shape, routes["default"])
+    chain = [(MODEL_TIERS[chosen.tier], chosen.max_tokens)]
+    for tier in chosen.fallbacks:
+        model = MODEL_TIERS[tier]
+        if model not in (m for m, _ in chain):
+            chain.append((model, max(chosen.max_tokens, routes["default"].max_tokens)))
+    return chain
+
+def request_options(model):
+    # The 8k output beta header only applies to the original 3.5 Sonnet
+    if model.startswith("claude-3-5-sonnet-20240620"):
+        return {"extra_headers": {"anthropic-beta": "max-tokens-3-5-sonnet-2024-07-15"}}
+    return {}
+
+async def create_routed(limiter, role, shape="default", client=None, **request):
+    """
+    Send a request for a role through the limiter, picking the model and
+    max_tokens from the routing table and falling back down the chain when
+    a model is unavailable or overloaded. Usage, cost and latency are
+    recorded against the role.
+    """
+    client = client or async_client
+    chain = route(role, shape)
+    last_error = None
+    for model, max_tokens in chain:
+        start = time.monotonic()
+        try:
+            with profiler.stage(f"api {role}"):
+                response = await limiter.create_message(client, model=model, max_tokens=max_tokens,
+                                                        **request_options(model), **request)
+        except APIStatusError as e:
+            if e.status_code not in FALLBACK_STATUS_CODES:
+                raise
+            last_error = e
+            continue
+        except APIConnectionError as e:
+            last_error = e
+            continue
+        latency = time.monotonic() - start
+        update_token_usage(role, response.usage.input_tokens, response.usage.output_tokens, model=model, latency=latency)
+        decisions.append({"role": role, "shape": shape, "model": model, "fallback": model != chain[0][0], "latency": latency})
+        del decisions[:-200]
+        return response
+    raise last_error
@@ -0,0 +1,197 @@
+import ast
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from string import Template
+
+from config import SCRIPT_LIBRARY_FILE
+
+# Device fields turned into parameters; secrets never keep an example value
+DEVICE_PARAMS = ("device_type", "host", "ip", "username", "password", "secret", "port")
+SECRET_PARAMS = {"password", "secret"}
+OPTIONAL_PARAMS = {"device_type", "port"}
+COMMAND_METHODS = {"send_command", "send_command_timing", "send_command_expect"}
+CONFIG_METHODS = {"send_config_set"}
+
+class ScriptLibrary:
+    """
+    Library of verified script templates.
+
+    Scripts that ran with return code 0 are generalised into templates: the
+    literals in the device dictionary and the commands sent become
+    parameters, everything else is kept verbatim. Templates are indexed by
+    intent (platform plus commands) so the model can run a known-good script
+    by id instead of writing it again.
+    """
+
+    def __init__(self, path=SCRIPT_LIBRARY_FILE):
+        self.path = path
+        self.templates = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.templates, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add_script(self, code):
+        """Generalise a successful script into a template. Returns the template id, or None."""
+        extracted = parameterize(code)
+        if extracted is None:
+            return None
+        template, params, intent = extracted
+        template_id = hashlib.sha256(template.encode()).hexdigest()[:10]
+        entry = self.templates.get(template_id)
+        if entry:
+            entry["verified_runs"] += 1
+        else:
+            self.templates[template_id] = {
+                "intent": intent,
+                "params": params,
+                "template": template,
+                "verified_runs": 1,
+                "uses": 0,
+                "created": datetime.now().isoformat(),
+            }
+        self._save()
+        return template_id
+
+    def find(self, query="", limit=10):
+        terms = set(re.findall(r"[a-z0-9_-]+", query.lower()))
+        scored = []
+        for template_id, entry in self.templates.items():
+            words = set(re.findall(r"[a-z0-9_-]+", entry["intent"].lower()))
+            score = len(terms & words) if terms else 0
+            if terms and not score:
+                continue
+            scored.append((-score, -entry["uses"] - entry["verified_runs"], template_id))
+        return [template_id for _, _, template_id in sorted(scored)[:limit]]
+
+    def describe(self, template_ids):
+        lines = []
+        for template_id in template_ids:
+            entry = self.templates[template_id]
+            params = ", ".join(
+                f"{name}" + (f" (e.g. {spec['example']!r})" if "example" in spec else "") + ("" if spec["required"] else " [optional]")
+                for name, spec in entry["params"].items()
+            )
+            lines.append(f"{template_id}: {entry['intent']} | params: {params} | verified runs: {entry['verified_runs']}")
+        return "\n".join(lines) if lines else "No matching templates."
+
+    def render(self, template_id, params):
+        entry = self.templates.get(template_id)
+        if entry is None:
+            raise ValueError(f"Unknown template id: {template_id}")
+        values = {}
+        for name, spec in entry["params"].items():
+            if name in params:
+                value = params[name]
+            elif not spec["required"] and "example" in spec:
+                value = spec["example"]
+            else:
+                raise ValueError(f"Missing parameter '{name}' for template {template_id}")
+            if spec["type"] == "array" and not isinstance(value, list):
+                raise ValueError(f"Parameter '{name}' must be a list of strings")
+            values[name] = repr(value)
+        return Template(entry["template"]).substitute(values)
+
+    def record_use(self, template_id):
+        if template_id in self.templates:
+            self.templates[template_id]["uses"] += 1
+            self._save()
+
+def _call_name(node):
+    func = node.func
+    return func.attr if isinstance(func, ast.Attribute) else func.id if isinstance(func, ast.Name) else None
+
+def _is_str(node):
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+def parameterize(code):
+    """
+    Turn a script into (template, params, intent), or None when the script
+    does not have exactly one literal device dictionary and at least one
+    literal command to generalise.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    devices = [node for node in ast.walk(tree) if isinstance(node, ast.Dict)
+               and any(_is_str(key) and key.value == "device_type" for key in node.keys)]
+    if len(devices) != 1:
+        return None
+
+    replacements = []
+    params = {}
+    device_type = ""
+    for key, value in zip(devices[0].keys, devices[0].values):
+        if not (_is_str(key) and key.value in DEVICE_PARAMS and isinstance(value, ast.Constant)):
+            continue
+        name = key.value
+        if name == "device_type":
+            device_type = value.value
+        spec = {"type": "string", "required": name not in OPTIONAL_PARAMS}
+        if name not in SECRET_PARAMS:
+            spec["example"] = value.value
+        params[name] = spec
+        replacements.append((value, name))
+
+    commands = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not node.args:
+            continue
+        method = _call_name(node)
+        argument = node.args[0]
+        if method in COMMAND_METHODS and _is_str(argument):
+            commands.append((argument, "string", argument.value))
+        elif method in CONFIG_METHODS and isinstance(argument, ast.List) and argument.elts and all(_is_str(e) for e in argument.elts):
+            commands.append((argument, "array", [e.value for e in argument.elts]))
+    if not commands:
+        return None
+
+    commands.sort(key=lambda item: (item[0].lineno, item[0].col_offset))
+    for index, (node, kind, value) in enumerate(commands, 1):
+        base = "config_commands" if kind == "array" else "command"
+        name = base if sum(1 for c in commands if c[1] == kind) == 1 else f"{base}_{index}"
+        params[name] = {"type": kind, "required": True, "example": value}
+        replacements.append((node, name))
+
+    # Splice placeholders in by byte offset, back to front so offsets stay valid
+    source = code.encode("utf-8")
+    line_starts = [0]
+    for line in source.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+    spans = sorted(
+        ((line_starts[node.lineno - 1] + node.col_offset, line_starts[node.end_lineno - 1] + node.end_col_offset, name)
+         for node, name in replacements),
+        reverse=True,
+    )
+    template = source
+    cursor = len(source)
+    pieces = []
+    for start, end, name in spans:
+        pieces.append(template[end:cursor].decode("utf-8").replace("$", "$$"))
+        pieces.append("${" + name + "}")
+        cursor = start
+    pieces.append(template[:cursor].decode("utf-8").replace("$", "$$"))
+    template = "".join(reversed(pieces))
+
+    intent_commands = []
+    for _, kind, value in commands:
+        intent_commands.extend(value if kind == "array" else [value])
+    intent = f"{device_type or 'device'}: " + "; ".join(intent_commands)
+    return template, params, intent
+
+script_library = ScriptLibrary()
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+import aiohttp
+
+from config import (TAVILY_API_KEY, TAVILY_BASE_URL, SEARCH_CACHE_FILE, SEARCH_CACHE_TTL,
+                    SEARCH_TIMEOUT, SEARCH_MAX_RESULTS, SEARCH_SNIPPET_CHARS)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "by", "can", "do", "does", "for", "from", "guide", "how",
+    "i", "in", "is", "it", "of", "on", "or", "the", "to", "what", "when", "which", "with",
+}
+
+_session = None
+_in_flight = {}
+
+def normalize_query(query):
+    """
+    Canonical cache key for a query: lower case, punctuation and stopwords
+    dropped, tokens de-duplicated and sorted. Version numbers and interface
+    names such as 17.3 or ios-xe keep their inner dots and dashes, so
+    "Cisco IOS-XE 17.3 OSPF config guide" and "ospf config cisco ios-xe 17.3"
+    share an entry.
+    """
+    tokens = re.findall(r"[a-z0-9]+(?:[./_-][a-z0-9]+)*", query.lower())
+    return " ".join(sorted({token for token in tokens if token not in STOPWORDS}))
+
+class SearchCache:
+    """Persistent query-result cache backed by SQLite, with a per-entry TTL."""
+
+    def __init__(self, path=SEARCH_CACHE_FILE, ttl=SEARCH_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, created REAL, payload TEXT)")
+        return self._db
+
+    def get(self, key):
+        row = self._connect().execute("SELECT created, payload FROM results WHERE key = ?", (key,)).fetchone()
+        if row and time.time() - row[0] < self.ttl:
+            self.hits += 1
+            return json.loads(row[1])
+        self.misses += 1
+        return None
+
+    def put(self, key, payload):
+        db = self._connect()
+        db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (key, time.time(), json.dumps(payload)))
+        db.commit()
+
+    def purge(self):
+        db = self._connect()
+        db.execute("DELETE FROM results WHERE created < ?", (time.time() - self.ttl,))
+        db.commit()
+
+search_cache = SearchCache()
+
+def get_session():
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=SEARCH_TIMEOUT))
+    return _session
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def trim_content(content, query, max_chars=SEARCH_SNIPPET_CHARS):
+    """Keep the sentences that share the most terms with the query, in their original order."""
+    if len(content) <= max_chars:
+        return content.strip()
+    terms = set(normalize_query(query).split())
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", content) if s.strip()]
+    scores = [len(terms & set(normalize_query(sentence).split())) for sentence in sentences]
+    ranked = sorted((i for i in range(len(sentences)) if scores[i]), key=lambda i: (-scores[i], i))
+    keep, size = [], 0
+    for i in ranked or range(len(sentences)):
+        if keep and size + len(sentences[i]) > max_chars:
+            continue
+        keep.append(i)
+        size += len(sentences[i]) + 1
+    text = " ".join(sentences[i] for i in sorted(keep))
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] + " ..."
+    return text
+
+async def _fetch(query):
+    payload = {"api_key": TAVILY_API_KEY, "query": query, "max_results": SEARCH_MAX_RESULTS,
+               "search_depth": "basic", "include_answer": True}
+    headers = {"Authorization": f"Bearer {TAVILY_API_KEY}"}
+    async with get_session().post(f"{TAVILY_BASE_URL}/search", json=payload, headers=headers) as response:
+        response.raise_for_status()
+        data = await response.json()
+    return {
+        "answer": data.get("answer"),
+        "results": [
+            {"title": item.get("title", ""), "url": item.get("url", ""),
+             "content": trim_content(item.get("content", ""), query)}
+            for item in data.get("results", [])[:SEARCH_MAX_RESULTS]
+        ],
+    }
+
+async def search(query):
+    """
+    Search one query, serving it from the cache when a normalized match is
+    still fresh. Concurrent requests for the same key share one HTTP call.
+    """
+    key = normalize_query(query) or query.strip().lower()
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+    if key not in _in_flight:
+        _in_flight[key] = asyncio.ensure_future(_fetch(query))
+    task = _in_flight[key]
+    try:
+        result = await task
+    finally:
+        if _in_flight.get(key) is task and task.done():
+            del _in_flight[key]
+    search_cache.put(key, result)
+    return result
+
+def format_results(query, result):
+    lines = [f"Results for: {query}"]
+    if result.get("answer"):
+        lines.append(f"Answer: {result['answer']}")
+    for index, item in enumerate(result["results"], 1):
+        lines.append(f"{index}. {item['title']} ({item['url']})\n   {item['content']}")
+    return "\n".join(lines)
+
+async def search_many(queries):
+    """Run several queries concurrently; failures are reported per query."""
+    results = await asyncio.gather(*(search(query) for query in queries), return_exceptions=True)
+    sections = []
+    for query, result in zip(queries, results):
+        if isinstance(result, Exception):
+            sections.append(f"Results for: {query}\nError: {str(result) or type(result).__name__}")
+        else:
+            sections.append(format_results(query, result))
+    return "\n\n".join(sections)
@@ -0,0 +1,251 @@
+from rich.console import Console
+from rich.panel import Panel
+from rich.markdown import Markdown
+
+from routing import create_routed, classify_tool_round
+from tools import tool_registry, execute_tool
+from ratelimit import limiter as shared_limiter
+from images import encode_images, image_block
+from utils import display_token_usage
+from journal import SessionJournal, load_journal, repair_journal
+from repoll import OutputHistory
+from compaction import Compactor
+from profiler import profiler
+from config import (load_prompt, BASE_SYSTEM_PROMPT, AUTOMODE_SYSTEM_PROMPT,
+                    CONTINUATION_EXIT_PHRASE, ANALYSIS_MODE, TOOL_LOOP_MAX_DEPTH, TOOL_LOOP_TOKEN_BUDGET)
+
+class ChatSession:
+    """
+    State for a single agent conversation.
+
+    Everything a turn reads or writes lives on the instance, so several
+    sessions can run concurrently (see batch.py) without sharing globals.
+    """
+
+    def __init__(self, console=None, limiter=None, device_pool=None, device=None, show_usage=True,
+                 analysis_mode=ANALYSIS_MODE, journal=None):
+        self.conversation_history = []
+        self.file_contents = {}
+        self.automode = False
+        self.console = console or Console()
+        self.limiter = limiter or shared_limiter
+        self.device_pool = device_pool
+        self.device = device
+        self.show_usage = show_usage
+        self.analysis_mode = analysis_mode
+        self.journal = journal
+        self.output_history = OutputHistory()
+        self.compactor = Compactor(self.limiter)
+        self.pinned_facts = []
+        self.exposed_tools = {}
+        # Tool calls made in the latest turn
+        self.turn_tool_uses = 0
+
+    def reset(self):
+        self.conversation_history = []
+        self.file_contents = {}
+        self.pinned_facts = []
+        self.exposed_tools = {}
+        self.output_history.clear()
+        self.compactor.clear()
+        if self.journal:
+            self.journal.rotate()
+
+    def resume(self, journal_path):
+        """Replace the history with the one recorded in a journal and keep appending to it."""
+        repair_journal(journal_path)
+        self.conversation_history = load_journal(journal_path)
+        self.output_history.clear()
+        self.compactor.clear()
+        if self.journal:
+            self.journal.close()
+            self.journal.path = journal_path
+        else:
+            self.journal = SessionJournal(journal_path)
+        return len(self.conversation_history)
+
+    def record(self, message):
+        if self.journal:
+            self.journal.append(message)
+
+    def add_message(self, conversation, message):
+        conversation.append(message)
+        self.record(message)
+
+    def update_system_prompt(self, current_iteration=None, max_iterations=None):
+        with profiler.stage("prompt"):
+            return self._system_prompt(current_iteration, max_iterations)
+
+    def _system_prompt(self, current_iteration=None, max_iterations=None):
+        chain_of_thought_prompt = load_prompt('chain_of_thought_prompt.txt')
+
+        file_contents_prompt = "\n\nFile Contents:\n"
+        for path, content in self.file_contents.items():
+            file_contents_prompt += f"\n--- {path} ---\n{content}\n"
+        if self.pinned_facts:
+            # Pinned facts stay verbatim here however much of the history is compacted
+            file_contents_prompt += "\n\nPinned Facts:\n" + "\n".join(f"- {fact}" for fact in self.pinned_facts) + "\n"
+
+        if self.automode:
+            iteration_info = ""
+            if current_iteration is not None and max_iterations is not None:
+                iteration_info = f"You are currently on iteration {current_iteration} out of {max_iterations} in automode."
+            return BASE_SYSTEM_PROMPT + file_contents_prompt + "\n\n" + AUTOMODE_SYSTEM_PROMPT.format(iteration_info=iteration_info) + "\n\n" + chain_of_thought_prompt
+        else:
+            return BASE_SYSTEM_PROMPT + file_contents_prompt + "\n\n" + chain_of_thought_prompt
+
+    async def create_message(self, role, shape="default", **kwargs):
+        return await create_routed(self.limiter, role, shape, **kwargs)
+
+    async def chat(self, user_input, image_path=None, current_iteration=None, max_iterations=None):
+        console = self.console
+        current_conversation = []
+        self.turn_tool_uses = 0
+
+        if image_path:
+            image_paths = [image_path] if isinstance(image_path, str) else list(image_path)
+            console.print(Panel("Processing images at paths:\n" + "\n".join(image_paths), title="Image Processing", style="yellow"))
+            try:
+                encoded_images = await encode_images(image_paths)
+            except Exception as e:
+                console.print(Panel(f"Error encoding image: {str(e)}", title="Error", style="bold red"))
+                return "I'm sorry, there was an error processing the image. Please try again.", False
+            image_message = {
+                "role": "user",
+                "content": [image_block(media_type, data) for media_type, data in encoded_images] + [
+                    {"type": "text", "text": f"User input for image: {user_input}"}
+                ]
+            }
+            current_conversation.append(image_message)
+        else:
+            current_conversation.append({"role": "user", "content": user_input})
+
+        with profiler.stage("prompt"):
+            # Swap in a compaction that finished since the last turn
+            self.conversation_history = self.compactor.apply(self.conversation_history)
+
+            # Filter conversation history to maintain context
+            filtered_conversation_history = [
+                message for message in self.conversation_history
+                if not (isinstance(message['content'], list) and
+                        any(content.get('type') == 'tool_result' and
+                            any(keyword in content.get('output', '') for keyword in [
+                                "File contents updated in system prompt",
+                                "File created and added to system prompt",
+                                "has been read and stored in the system prompt"
+                            ]) for content in message['content']))
+            ]
+
+            messages = filtered_conversation_history + current_conversation
+            # One tool set for the whole turn keeps the tools prefix of its requests identical
+            turn_tools = tool_registry.select(self, user_input)
+
+        try:
+            tool_registry.record(turn_tools)
+            response = await self.create_message(
+                "main",
+                system=self.update_system_prompt(current_iteration, max_iterations),
+                messages=messages,
+                tools=turn_tools,
+                tool_choice={"type": "auto"}
+            )
+        except Exception as e:
+            console.print(Panel(f"API Error: {str(e)}", title="API Error", style="bold red"))
+            return "I'm sorry, there was an error communicating with the AI. Please try again.", False
+
+        for message in current_conversation:
+            self.record(message)
+
+        assistant_response = ""
+        exit_continuation = False
+        depth = 0
+        tokens_used = response.usage.input_tokens + response.usage.output_tokens
+        context_tokens = response.usage.input_tokens
+
+        # Keep dispatching tools until the model ends its turn or a limit is hit
+        while True:
+            content = []
+            tool_uses = []
+            text = ""
+            for content_block in response.content:
+                if content_block.type == "text":
+                    text += content_block.text
+                    content.append({"type": "text", "text": content_block.text})
+                elif content_block.type == "tool_use":
+                    tool_uses.append(content_block)
+                    content.append({"type": "tool_use", "id": content_block.id, "name": content_block.name, "input": content_block.input})
+
+            assistant_message = {"role": "assistant", "content": content}
+            if content:
+                current_conversation.append(assistant_message)
+                # A tool_use is journaled together with its tool_results, so a
+                # crash while a tool runs never leaves an unanswered call behind
+                if not tool_uses:
+                    self.record(assistant_message)
+            if text:
+                title = "Claude's Response" if depth == 0 else "Claude's Response to Tool Result"
+                console.print(Panel(Markdown(text), title=title, border_style="blue"))
+                assistant_response += ("\n\n" if assistant_response else "") + text
+                if CONTINUATION_EXIT_PHRASE in text:
+                    exit_continuation = True
+
+            if not tool_uses:
+                break
+            self.turn_tool_uses += len(tool_uses)
+
+            # A response cut short (max_tokens, ...) may end in an incomplete tool call
+            cut_short = response.stop_reason != "tool_use"
+            limit_reached = depth >= TOOL_LOOP_MAX_DEPTH or tokens_used >= TOOL_LOOP_TOKEN_BUDGET
+            tool_results = []
+            for tool_use in tool_uses:
+                if cut_short or limit_reached:
+                    # Every tool_use still needs a matching tool_result
+                    reason = (f"the response stopped ({response.stop_reason}) before the tool call was complete" if cut_short
+                              else "the tool loop limit for this turn was reached")
+                    tool_result = {"content": f"Not executed: {reason}.", "is_error": True}
+                else:
+                    with profiler.stage(f"tool {tool_use.name}"):
+                        tool_result = await execute_tool(tool_use.name, tool_use.input, session=self)
+                    console.print(Panel(str(tool_result["content"]), title="Tool Result", style="green" if not tool_result["is_error"] else "bold red"))
+                tool_results.append({"type": "tool_result", "tool_use_id": tool_use.id, "content": str(tool_result["content"]), "is_error": tool_result["is_error"]})
+            self.record(assistant_message)
+            self.add_message(current_conversation, {"role": "user", "content": tool_results})
+
+            if cut_short or limit_reached:
+                if cut_short:
+                    limit_message = f"Stopped: the response ended ({response.stop_reason}) in the middle of a tool call."
+                else:
+                    limit_message = f"Stopped after {depth} tool rounds ({tokens_used:,} tokens) in this turn."
+                console.print(Panel(limit_message, title="Tool Loop Limit", style="bold yellow"))
+                self.add_message(current_conversation, {"role": "assistant", "content": limit_message})
+                assistant_response += f"\n\n{limit_message}"
+                break
+
+            depth += 1
+            try:
+                tool_registry.record(turn_tools)
+                response = await self.create_message(
+                    "tool_checker",
+                    classify_tool_round(tool_results),
+                    system=self.update_system_prompt(current_iteration, max_iterations),
+                    messages=filtered_conversation_history + current_conversation,
+                    tools=turn_tools,
+                    tool_choice={"type": "auto"}
+                )
+                tokens_used += response.usage.input_tokens + response.usage.output_tokens
+            except Exception as e:
+                error_message = f"Error in tool response: {str(e)}"
+                console.print(Panel(error_message, title="Error", style="bold red"))
+                self.add_message(current_conversation, {"role": "assistant", "content": error_message})
+                assistant_response += f"\n\n{error_message}"
+                break
+
+        self.conversation_history = self.compactor.apply(filtered_conversation_history + current_conversation)
+        self.compactor.maybe_start(self.conversation_history)
+        if self.show_usage:
+            display_token_usage()
+            if self.compactor.compactions:
+                console.print(f"Context this turn: {context_tokens:,} input tokens, "
+                              f"{context_tokens + self.compactor.saved:,} without compaction "
+                              f"({self.compactor.compactions} compaction(s))", style="dim")
+        return assistant_response, exit_continuation
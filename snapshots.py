@@ -0,0 +1,274 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from workers import parallel_map
+from exec_runtime import CONFIG_COMMAND_PATTERN
+from config import SNAPSHOT_DB_FILE, SNAPSHOT_KEYFRAME_EVERY, PARALLEL_MIN_ITEMS
+
+# Lines that change on every read without the configuration changing
+VOLATILE_LINES = re.compile(
+    r"^(Building configuration|Current configuration\s*:|!\s*(Last configuration change|NVRAM config last updated|Time:)|ntp clock-period)",
+    re.I)
+
+def split_stanzas(text):
+    """
+    Split a configuration into stanzas: a top-level line plus the indented
+    lines below it. Comment separators and volatile lines are dropped, and a
+    closing brace at column 0 stays with the stanza it closes.
+    """
+    stanzas = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line.strip() or line.strip() == "!" or VOLATILE_LINES.match(line.strip()):
+            continue
+        if stanzas and (line[0].isspace() or line in ("}", "end-policy", "end-set")):
+            stanzas[-1].append(line)
+        else:
+            stanzas.append([line])
+    return ["\n".join(stanza) for stanza in stanzas]
+
+def block_hash(block):
+    return hashlib.sha256(block.encode("utf-8")).hexdigest()[:20]
+
+def _keyed(stanzas):
+    """Stanzas keyed by header line; repeated headers get an occurrence suffix."""
+    keyed = {}
+    for stanza in stanzas:
+        header = stanza.split("\n", 1)[0]
+        key = header
+        occurrence = 1
+        while key in keyed:
+            occurrence += 1
+            key = f"{header} #{occurrence}"
+        keyed[key] = stanza
+    return keyed
+
+def diff_configs(old_text, new_text):
+    """
+    Return only the stanzas that changed between two configurations, as a
+    list of (kind, header, lines). kind is "+" (added), "-" (removed) or "~"
+    (modified, with the changed child lines prefixed by + or -). Identical
+    stanzas are skipped by comparing hashes, so only changed stanzas are
+    diffed line by line.
+    """
+    old = _keyed(split_stanzas(old_text))
+    new = _keyed(split_stanzas(new_text))
+    old_hashes = {block_hash(stanza) for stanza in old.values()}
+    new_hashes = {block_hash(stanza) for stanza in new.values()}
+    changes = []
+    for key, stanza in old.items():
+        if key not in new and block_hash(stanza) not in new_hashes:
+            changes.append(("-", key, stanza.split("\n")[1:]))
+    for key, stanza in new.items():
+        if key not in old:
+            if block_hash(stanza) not in old_hashes:
+                changes.append(("+", key, stanza.split("\n")[1:]))
+        elif old[key] != stanza:
+            old_lines = old[key].split("\n")[1:]
+            new_lines = stanza.split("\n")[1:]
+            lines = [line for line in difflib.unified_diff(old_lines, new_lines, lineterm="", n=0)
+                     if line[:1] in "+-" and not line.startswith(("+++", "---"))]
+            changes.append(("~", key, lines))
+    return changes
+
+def format_changes(changes):
+    out = []
+    for kind, header, lines in changes:
+        out.append(f"{kind} {header}")
+        if kind == "~":
+            out.extend(f"    {line[0]} {line[1:].strip()}" for line in lines)
+        else:
+            out.extend(f"    {kind} {line.strip()}" for line in lines)
+    return "\n".join(out)
+
+def _diff_pair(pair):
+    return diff_configs(*pair)
+
+def diff_many(pairs, min_items=PARALLEL_MIN_ITEMS):
+    """Diff many (old_text, new_text) pairs, spread over the process pool when there are enough of them."""
+    return parallel_map(_diff_pair, pairs, min_items)
+
+class SnapshotStore:
+    """
+    Content-addressed store of device configuration snapshots.
+
+    A configuration is split into stanzas and every distinct stanza is
+    stored once, compressed, under its hash, so identical blocks shared by
+    many devices or versions cost nothing extra. A version is the ordered
+    list of its block ids, stored as a delta (copy ranges plus new ids)
+    against the previous version of the host, with a full keyframe
+    every SNAPSHOT_KEYFRAME_EVERY versions to bound reconstruction. A
+    configuration identical to the latest version is not stored again.
+    """
+
+    def __init__(self, path=SNAPSHOT_DB_FILE):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS blocks (id INTEGER PRIMARY KEY, hash TEXT UNIQUE, data BLOB)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS versions (host TEXT, version INTEGER, created REAL, "
+                             "digest TEXT, keyframe INTEGER, manifest TEXT, PRIMARY KEY (host, version))")
+        return self._db
+
+    def _manifest(self, host, version):
+        """Rebuild the list of block ids of a version from its keyframe and deltas."""
+        rows = self._connect().execute(
+            "SELECT version, keyframe, manifest FROM versions WHERE host = ? AND version <= ? "
+            "AND version >= (SELECT MAX(version) FROM versions WHERE host = ? AND version <= ? AND keyframe = 1) "
+            "ORDER BY version", (host, version, host, version)).fetchall()
+        manifest = []
+        for _, keyframe, data in rows:
+            ops = json.loads(data)
+            if keyframe:
+                manifest = ops
+                continue
+            rebuilt = []
+            for op in ops:
+                if isinstance(op, list):
+                    rebuilt.extend(manifest[op[0]:op[1]])
+                else:
+                    rebuilt.append(op)
+            manifest = rebuilt
+        return manifest
+
+    def _block_ids(self, hashes):
+        db = self._connect()
+        ids = {}
+        unique = list(set(hashes))
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            ids.update(db.execute(f"SELECT hash, id FROM blocks WHERE hash IN ({','.join('?' * len(chunk))})", chunk))
+        return ids
+
+    def latest_version(self, host):
+        row = self._connect().execute("SELECT MAX(version) FROM versions WHERE host = ?", (host,)).fetchone()
+        return row[0] or 0
+
+    def versions(self, host):
+        return self._connect().execute(
+            "SELECT version, created FROM versions WHERE host = ? ORDER BY version", (host,)).fetchall()
+
+    def hosts(self):
+        return [row[0] for row in self._connect().execute("SELECT DISTINCT host FROM versions ORDER BY host")]
+
+    def add(self, host, text, created=None):
+        """Store a configuration for a host. Returns the version number (unchanged configs reuse the latest)."""
+        with self._lock:
+            db = self._connect()
+            stanzas = split_stanzas(text)
+            hashes = [block_hash(stanza) for stanza in stanzas]
+            digest = hashlib.sha256("\n".join(hashes).encode()).hexdigest()[:20]
+            latest = self.latest_version(host)
+            if latest:
+                row = db.execute("SELECT digest FROM versions WHERE host = ? AND version = ?", (host, latest)).fetchone()
+                if row[0] == digest:
+                    return latest
+            ids = self._block_ids(hashes)
+            missing = {h: stanza for h, stanza in zip(hashes, stanzas) if h not in ids}
+            if missing:
+                db.executemany("INSERT INTO blocks (hash, data) VALUES (?, ?)",
+                               [(h, zlib.compress(stanza.encode("utf-8"))) for h, stanza in missing.items()])
+                ids.update(self._block_ids(list(missing)))
+            ids = [ids[h] for h in hashes]
+            version = latest + 1
+            keyframe = latest == 0 or (version - 1) % SNAPSHOT_KEYFRAME_EVERY == 0
+            if keyframe:
+                manifest = ids
+            else:
+                parent = self._manifest(host, latest)
+                manifest = []
+                for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, parent, ids, autojunk=False).get_opcodes():
+                    if tag == "equal":
+                        manifest.append([i1, i2])
+                    elif tag in ("replace", "insert"):
+                        manifest.extend(ids[j1:j2])
+            db.execute("INSERT INTO versions VALUES (?, ?, ?, ?, ?, ?)",
+                       (host, version, created or time.time(), digest, int(keyframe), json.dumps(manifest, separators=(",", ":"))))
+            db.commit()
+            return version
+
+    def get(self, host, version=None):
+        """Return the configuration text of a version (latest by default), without volatile lines."""
+        with self._lock:
+            version = version or self.latest_version(host)
+            if not version:
+                return None
+            db = self._connect()
+            manifest = self._manifest(host, version)
+            blocks = {}
+            unique = list(set(manifest))
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = db.execute(f"SELECT id, data FROM blocks WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                blocks.update((block_id, zlib.decompress(data).decode("utf-8")) for block_id, data in rows)
+            return "\n".join(blocks[block_id] for block_id in manifest)
+
+    def ingest(self, records):
+        """Snapshot every configuration captured during a run."""
+        stored = 0
+        for record in records:
+            if record.get("host") and "output" in record and CONFIG_COMMAND_PATTERN.match(record.get("command") or ""):
+                if split_stanzas(record["output"]):
+                    self.add(record["host"], record["output"], record.get("ts"))
+                    stored += 1
+        return stored
+
+    def diff(self, hosts=None, from_version=None, to_version=None):
+        """
+        Diff from_version (default: the one before to_version) against
+        to_version (default: latest) for each host. Returns a list of
+        (host, from_version, to_version, changes); hosts with fewer than two
+        versions are skipped.
+        """
+        pairs = []
+        labels = []
+        for host in hosts or self.hosts():
+            new = to_version or self.latest_version(host)
+            old = from_version or new - 1
+            if old < 1 or new < 1 or old == new:
+                continue
+            old_text = self.get(host, old)
+            new_text = self.get(host, new)
+            if old_text is None or new_text is None:
+                continue
+            pairs.append((old_text, new_text))
+            labels.append((host, old, new))
+        return [label + (changes,) for label, changes in zip(labels, diff_many(pairs))]
+
+    def size(self):
+        db = self._connect()
+        blocks = db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM blocks").fetchone()
+        versions = db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(manifest)), 0) FROM versions").fetchone()
+        return {"blocks": blocks[0], "block_bytes": blocks[1], "versions": versions[0], "manifest_bytes": versions[1]}
+
+snapshot_store = SnapshotStore()
+
+def config_diff(hosts=None, from_version=None, to_version=None):
+    """Text report of the changed stanzas per host, for the config_diff tool."""
+    results = snapshot_store.diff(hosts, from_version, to_version)
+    if not results:
+        known = ", ".join(f"{host} ({snapshot_store.latest_version(host)} snapshots)" for host in (hosts or snapshot_store.hosts()))
+        return ("No two snapshots to compare. Snapshots are taken automatically whenever a script runs "
+                "'show running-config' (or the platform equivalent) without filters. Known hosts: " + (known or "none"))
+    out = []
+    unchanged = []
+    for host, old, new, changes in results:
+        if not changes:
+            unchanged.append(host)
+            continue
+        out.append(f"## {host}: v{old} -> v{new} ({len(changes)} stanzas changed)\n{format_changes(changes)}")
+    if unchanged:
+        out.append(f"Unchanged: {', '.join(unchanged)}")
+    return "\n\n".join(out)
@@ -0,0 +1,27 @@
+"""
+Shared setup for the unit tests. Project modules read their configuration
+and prompts at import time, so the environment and a scratch working
+directory are prepared here, before any test module imports them.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+WORKDIR = tempfile.mkdtemp(prefix="netmikoai-tests-")
+os.makedirs(os.path.join(WORKDIR, "prompts"))
+for name in os.listdir(os.path.join(REPO_DIR, "prompts")):
+    # config.load_prompt opens lower case names relative to the working directory
+    for target in {name, name.lower()}:
+        shutil.copy(os.path.join(REPO_DIR, "prompts", name), os.path.join(WORKDIR, "prompts", target))
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+os.environ.setdefault("TAVILY_API_KEY", "test")
+os.environ["NETMIKOAI_DATA_DIR"] = os.path.join(WORKDIR, ".netmikoai")
+
+def pytest_sessionstart(session):
+    # After pytest has resolved its test paths, before test modules are imported
+    os.chdir(WORKDIR)
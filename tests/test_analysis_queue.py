@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from analysis_queue import AnalysisQueue
+
+class FakeBatches:
+    """Stand-in for client.messages.batches: every request succeeds with its custom_id as text."""
+
+    def __init__(self):
+        self.created = {}
+        self.status = {}
+        self.fail_create = False
+
+    async def create(self, requests):
+        if self.fail_create:
+            raise RuntimeError("batch submission failed")
+        batch_id = f"batch_{len(self.created) + 1}"
+        self.created[batch_id] = requests
+        self.status[batch_id] = "in_progress"
+        return SimpleNamespace(id=batch_id)
+
+    async def retrieve(self, batch_id):
+        return SimpleNamespace(id=batch_id, processing_status=self.status[batch_id])
+
+    async def results(self, batch_id):
+        async def entries():
+            for request in self.created[batch_id]:
+                message = SimpleNamespace(
+                    content=[SimpleNamespace(type="text", text=f"analysis of {request['custom_id']}")],
+                    usage=SimpleNamespace(input_tokens=10, output_tokens=5), model="test")
+                yield SimpleNamespace(custom_id=request["custom_id"],
+                                      result=SimpleNamespace(type="succeeded", message=message))
+        return entries()
+
+def make_queue(tmp_path, batches, batch_size=10):
+    client = SimpleNamespace(messages=SimpleNamespace(batches=batches))
+    return AnalysisQueue(results_file=str(tmp_path / "results.jsonl"), batches_file=str(tmp_path / "batches.json"),
+                         batch_size=batch_size, poll_interval=0, client=client)
+
+PARAMS = {"model": "test", "max_tokens": 10, "messages": [{"role": "user", "content": "analyse"}]}
+
+def test_flush_submits_pending_and_survives_restart(tmp_path):
+    batches = FakeBatches()
+    queue = make_queue(tmp_path, batches)
+    ids = [queue.enqueue(PARAMS, {"host": f"r{index}"}) for index in range(3)]
+
+    batch_id = asyncio.run(queue.flush())
+
+    assert [request["custom_id"] for request in batches.created[batch_id]] == ids
+    assert queue.pending == []
+    restarted = make_queue(tmp_path, batches)
+    assert restarted.submitted[batch_id]["metadata"][ids[0]] == {"host": "r0"}
+    assert asyncio.run(restarted.flush()) is None
+
+def test_failed_flush_keeps_requests_pending(tmp_path):
+    batches = FakeBatches()
+    batches.fail_create = True
+    queue = make_queue(tmp_path, batches)
+    custom_id = queue.enqueue(PARAMS)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(queue.flush())
+
+    assert [item["custom_id"] for item in queue.pending] == [custom_id]
+    assert queue.submitted == {}
+
+def test_collect_stores_only_ended_batches(tmp_path):
+    batches = FakeBatches()
+    queue = make_queue(tmp_path, batches)
+    first = queue.enqueue(PARAMS, {"host": "r1"})
+    ended = asyncio.run(queue.flush())
+    queue.enqueue(PARAMS)
+    running = asyncio.run(queue.flush())
+    batches.status[ended] = "ended"
+
+    assert asyncio.run(queue.collect()) == 1
+
+    assert list(queue.submitted) == [running]
+    results = queue.load_results()
+    assert results[first]["text"] == f"analysis of {first}"
+    assert results[first]["metadata"] == {"host": "r1"}
+    assert results[first]["batch_id"] == ended
+
+def test_enqueue_flushes_when_batch_is_full(tmp_path):
+    batches = FakeBatches()
+    queue = make_queue(tmp_path, batches, batch_size=2)
+
+    async def fill():
+        queue.enqueue(PARAMS)
+        queue.enqueue(PARAMS)
+        await queue._flush_task
+
+    asyncio.run(fill())
+    assert len(batches.created) == 1
+    assert queue.pending == []
@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+import exec_runtime
+from captures import process_capture, read_capture
+from timing_profiles import TimingProfileStore
+
+class FakeConnection:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.calls = []
+
+    def send_command(self, command_string, **kwargs):
+        self.calls.append((command_string, kwargs))
+        return f"output of {command_string}"
+
+    def send_config_set(self, config_commands, **kwargs):
+        self.calls.append((config_commands, kwargs))
+        return "config applied"
+
+@pytest.fixture
+def runtime(tmp_path, monkeypatch):
+    """exec_runtime as a fresh script process sees it, capturing to a file; returns the capture path."""
+    capture_file = str(tmp_path / "capture.jsonl")
+    monkeypatch.setenv(exec_runtime.CAPTURE_FILE_ENV, capture_file)
+    monkeypatch.setattr(exec_runtime, "_profiles", {})
+    monkeypatch.setattr(exec_runtime, "_cache", None)
+    monkeypatch.setattr(exec_runtime, "_cassette", None)
+    monkeypatch.setattr(exec_runtime, "_configured", set())
+    monkeypatch.setattr(exec_runtime, "_looked_up", set())
+    return capture_file
+
+def test_connect_and_commands_are_captured(runtime):
+    ConnectHandler = exec_runtime._wrap_connect_handler(FakeConnection)
+    connection = ConnectHandler(device_type="cisco_ios", host="10.0.0.1")
+    assert connection.send_command("show version") == "output of show version"
+    connection.send_config_set(["interface Gi0/1", "shutdown"])
+
+    records = read_capture(runtime)
+
+    assert [(record["host"], record["method"]) for record in records] == [
+        ("10.0.0.1", "connect"), ("10.0.0.1", "send_command"), ("10.0.0.1", "send_config_set")]
+    assert all(record["elapsed"] >= 0 and record["ts"] > 0 for record in records)
+    assert records[1]["command"] == "show version"
+    assert records[1]["output"] == "output of show version"
+    assert records[2]["command"] == ["interface Gi0/1", "shutdown"]
+    assert exec_runtime._configured == {"10.0.0.1"}
+
+def test_learned_timeouts_only_extend_netmiko_defaults(runtime, monkeypatch):
+    monkeypatch.setattr(exec_runtime, "_profiles", {
+        "slow": {"read_timeout": 30.0, "conn_timeout": 25.0, "fast_cli": False, "global_delay_factor": 3},
+        "fast": {"read_timeout": 2.0, "conn_timeout": 4.0, "fast_cli": True, "global_delay_factor": 1},
+    })
+    ConnectHandler = exec_runtime._wrap_connect_handler(FakeConnection)
+
+    slow = ConnectHandler(host="slow")
+    slow.send_command("show tech")
+    fast = ConnectHandler(host="fast", fast_cli=False)
+    fast.send_command("show clock")
+
+    assert slow.kwargs == {"host": "slow", "conn_timeout": 25.0, "fast_cli": False, "global_delay_factor": 3}
+    assert slow.calls == [("show tech", {"read_timeout": 30.0})]
+    # Below the defaults nothing is injected, and the script's own arguments win
+    assert fast.kwargs == {"host": "fast", "fast_cli": False, "global_delay_factor": 1}
+    assert fast.calls == [("show clock", {})]
+
+def test_explicit_read_timeout_is_kept(runtime, monkeypatch):
+    monkeypatch.setattr(exec_runtime, "_profiles", {"slow": {"read_timeout": 30.0}})
+    connection = exec_runtime._wrap_connect_handler(FakeConnection)(host="slow")
+    connection.send_command("show tech", read_timeout=90)
+    assert connection.calls == [("show tech", {"read_timeout": 90})]
+
+def test_nothing_is_captured_without_a_capture_file(runtime, monkeypatch):
+    monkeypatch.delenv(exec_runtime.CAPTURE_FILE_ENV)
+    exec_runtime._wrap_connect_handler(FakeConnection)(host="10.0.0.1").send_command("show version")
+    assert not os.path.exists(runtime)
+
+def test_read_capture_of_missing_file_is_empty(tmp_path):
+    assert read_capture(str(tmp_path / "missing.jsonl")) == []
+
+def test_process_capture_hands_records_on_and_deletes_the_file(runtime):
+    connection = exec_runtime._wrap_connect_handler(FakeConnection)(host="10.0.0.9")
+    connection.send_command("show clock")
+
+    records = process_capture(runtime)
+
+    assert [record["method"] for record in records] == ["connect", "send_command"]
+    assert not os.path.exists(runtime)
+
+def test_profiles_are_learned_from_capture_records(tmp_path):
+    store = TimingProfileStore(str(tmp_path / "timing.json"))
+    records = [{"host": "r1", "method": "connect", "elapsed": 12.0}]
+    records += [{"host": "r1", "method": "send_command", "elapsed": elapsed, "output": "Gi0/1 up"} for elapsed in (0.1, 0.2, 9.0)]
+    records += [{"host": "r2", "method": "send_command", "elapsed": 0.1}, {"host": "r2", "method": "send_command", "cached": True}]
+
+    assert store.ingest(records) == 2
+
+    # The 95th percentile of 9.0s with a margin of 2, and a fast median
+    assert store.profiles["r1"] == {"read_timeout": 18.0, "fast_cli": True, "global_delay_factor": 1}
+    assert "r2" not in store.profiles
+    assert TimingProfileStore(str(tmp_path / "timing.json")).profiles == store.profiles
+
+def test_learned_read_timeout_is_floored_at_the_default(tmp_path):
+    store = TimingProfileStore(str(tmp_path / "timing.json"))
+    store.ingest([{"host": "r1", "method": "send_command", "elapsed": 1.5, "output": "Gi0/1 up"} for _ in range(3)])
+    assert store.profiles["r1"] == {"read_timeout": 10.0, "fast_cli": False, "global_delay_factor": 3}
+
+def test_long_outputs_do_not_make_a_device_slow(tmp_path):
+    store = TimingProfileStore(str(tmp_path / "timing.json"))
+    config = "interface GigabitEthernet1/0/1\n description uplink\n!\n" * 2000
+    records = [{"host": "r1", "method": "send_command", "elapsed": 4.0, "output": config} for _ in range(5)]
+    store.ingest(records)
+    # Only durations are known, so Netmiko's own fast_cli and delay factor are kept
+    assert store.profiles["r1"] == {"read_timeout": 10.0}
+
+    store.ingest([{"host": "r1", "method": "send_command", "elapsed": 0.05, "output": "*10:00:00.000 UTC Mon Mar 1 2027"}
+                  for _ in range(3)])
+    assert store.profiles["r1"] == {"read_timeout": 10.0, "fast_cli": True, "global_delay_factor": 1}
@@ -0,0 +1,44 @@
+from clustering import cluster_outputs, condense_output, normalize_output
+
+VERSION = """Cisco IOS Software, C2960X Software (C2960X-UNIVERSALK9-M), Version 15.2(7)E4, RELEASE SOFTWARE (fc2)
+{name} uptime is 3 weeks, 2 days, 4 hours, 12 minutes
+System image file is "flash:c2960x-universalk9-mz.152-7.E4.bin"
+Processor board ID FOC{serial}X1Y
+"""
+
+def fleet(count=5):
+    hosts = [f"10.0.0.{index}" for index in range(1, count + 1)]
+    records = [{"host": host, "method": "send_command", "command": "show version",
+                "output": VERSION.format(name=f"sw{index}", serial=f"{1900 + index}")}
+               for index, host in enumerate(hosts, 1)]
+    return hosts, records
+
+def test_masked_shapes_group_identical_devices():
+    hosts, records = fleet()
+    outputs = {record["host"]: record["output"] for record in records}
+    assert len({normalize_output(text) for text in outputs.values()}) == 1
+    clusters = cluster_outputs(outputs)
+    assert len(clusters) == 1
+    assert sorted(clusters[0]["members"]) == hosts
+
+def test_banner_lines_are_folded_into_the_clusters():
+    hosts, records = fleet()
+    stdout = "".join(f"===== Output from {record['host']} =====\n{record['output'].strip()}\n" for record in records)
+
+    condensed = condense_output(stdout, records)
+
+    assert condensed.startswith("[The script printed a header line per device")
+    assert "===== Output from" not in condensed
+
+def test_lines_with_more_than_a_device_name_are_kept():
+    hosts, records = fleet()
+    failure = "Config push FAILED on 10.0.0.3 (authentication rejected)"
+    stdout = "".join(f"===== {record['host']} =====\n{record['output'].strip()}\n" for record in records)
+    stdout += failure + "\n"
+
+    condensed = condense_output(stdout, records)
+
+    assert condensed != stdout
+    assert failure in condensed
+    assert "===== 10.0.0.1 =====" in condensed
+    assert "[output of 'show version': cluster 1, shown below]" in condensed
@@ -0,0 +1,100 @@
+import pytest
+
+from compliance import CompiledRules, format_report
+
+CONFIG = """hostname r1
+!
+service password-encryption
+snmp-server community PUBLIC RO
+logging buffered 4096
+ntp server 10.0.0.1
+!
+interface GigabitEthernet0/1
+ description uplink uplink
+ mtu 1400
+ ip address 10.0.0.2 255.255.255.0
+!
+interface GigabitEthernet0/2
+ shutdown
+!
+line vty 0 4
+ transport input telnet
+"""
+
+def violations(rules, text=CONFIG, platform="cisco_ios"):
+    return [(v.rule, v.message) for v in CompiledRules(rules).evaluate("r1", platform, text)]
+
+def test_required_and_forbidden_lines():
+    rules = [
+        {"id": "encryption", "type": "required", "line": "service password-encryption"},
+        {"id": "aaa", "type": "required", "line": "aaa new-model"},
+        {"id": "ntp", "type": "required", "pattern": r"^ntp server ", "min_count": 2},
+        {"id": "telnet", "type": "forbidden", "pattern": r"transport input .*telnet"},
+    ]
+    assert violations(rules) == [
+        ("aaa", "missing a line matching 'aaa new-model'"),
+        ("ntp", "missing at least 2 lines matching /^ntp server /"),
+        ("telnet", "forbidden line present: transport input telnet"),
+    ]
+
+def test_threshold():
+    rules = [
+        {"id": "buffer", "type": "threshold", "pattern": r"^logging buffered (\d+)", "min": 8192},
+        {"id": "mtu", "type": "threshold", "pattern": r"^mtu (\d+)", "min": 1500, "stanza": r"^interface "},
+        {"id": "timeout", "type": "threshold", "pattern": r"^exec-timeout (\d+)", "max": 10},
+    ]
+    assert violations(rules) == [
+        ("buffer", "value 4096 outside [8192, ]: logging buffered 4096"),
+        ("mtu", "value 1400 outside [1500, ] in 'interface GigabitEthernet0/1': mtu 1400"),
+    ]
+
+def test_stanza_scope_with_unless_and_platforms():
+    rules = [
+        {"id": "description", "type": "required", "pattern": r"^description ", "stanza": r"^interface ",
+         "unless": r"^shutdown$"},
+        {"id": "junos-only", "type": "required", "line": "set system host-name r1", "platforms": ["juniper*"]},
+    ]
+    assert violations(rules) == []
+    assert violations(rules, platform="juniper_junos") == [
+        ("junos-only", "missing a line matching 'set system host-name r1'")]
+
+def test_inline_flags_apply_to_their_own_rule_only():
+    rules = [
+        {"id": "community", "type": "forbidden", "pattern": r"(?i)^snmp-server community public"},
+        {"id": "logging", "type": "forbidden", "pattern": r"^LOGGING"},
+        {"id": "vty", "type": "forbidden", "pattern": r"(?i)^TRANSPORT input telnet", "stanza": r"(?i)^LINE vty"},
+    ]
+    assert violations(rules) == [
+        ("community", "forbidden line present: snmp-server community PUBLIC RO"),
+        ("vty", "forbidden line present in 'line vty 0 4': transport input telnet"),
+    ]
+
+def test_backreferences_and_shared_group_names():
+    rules = [
+        {"id": "first", "type": "threshold", "pattern": r"^logging buffered (\d+)", "max": 100000},
+        {"id": "repeated", "type": "forbidden", "pattern": r"^description (\w+) \1$", "stanza": r"^interface "},
+        {"id": "named-a", "type": "required", "pattern": r"^ntp server (?P<addr>\S+)"},
+        {"id": "named-b", "type": "required", "pattern": r"^ip name-server (?P<addr>\S+)"},
+    ]
+    assert violations(rules) == [
+        ("named-b", "missing a line matching /^ip name-server (?P<addr>\\S+)/"),
+        ("repeated", "forbidden line present in 'interface GigabitEthernet0/1': description uplink uplink"),
+    ]
+
+@pytest.mark.parametrize("spec, error", [
+    ({"id": "bad", "pattern": "("}, "Rule bad: invalid regular expression"),
+    ({"id": "bad", "type": "threshold", "pattern": r"^mtu \d+", "min": 1}, "Rule bad: a threshold pattern needs"),
+    ({"id": "bad", "type": "optional", "line": "x"}, "Rule bad: type must be one of"),
+])
+def test_invalid_rules_name_the_rule(spec, error):
+    with pytest.raises(ValueError, match=error):
+        CompiledRules([spec])
+
+def test_report():
+    rules = [{"id": "telnet", "type": "forbidden", "severity": "high", "pattern": r"telnet"}]
+    report = format_report(CompiledRules(rules).evaluate("r1", None, CONFIG), checked=2)
+    assert report.splitlines() == [
+        "2 device(s) checked, 1 compliant, 1 with violations, 1 violation(s) in total",
+        "By rule: telnet [high] on 1 device(s)",
+        "r1: telnet [high] forbidden line present: transport input telnet",
+    ]
@@ -0,0 +1,107 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+from rich.console import Console
+
+import goals as goals_module
+from config import AUTOMODE_PLAN_PROMPT, CONTINUATION_EXIT_PHRASE
+from goals import goal_levels, parse_plan
+from session import ChatSession
+from utils import execute_goals
+
+PLAN = """I will split the audit into goals:
+- **Goal 1:** Collect the NTP servers of site A
+- **Goal 2:** Collect the NTP servers of site B
+Goal 3: Compare the NTP servers found in Goal 1 and Goal 2"""
+
+class StubModel:
+    """
+    Limiter stand-in that answers every routed request without an API: a
+    plan to the top-level planning request, and a one-line result to each
+    goal session, after a short delay so goal sessions overlap.
+    """
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create_message(self, client, **request):
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.02)
+        finally:
+            self.in_flight -= 1
+        match = re.search(r"You are working on Goal (\d+)", request_text(request))
+        if not match:
+            text = PLAN
+        elif int(match.group(1)) in self.failing:
+            text = f"Goal {match.group(1)}: still waiting for the device."
+        else:
+            text = f"Goal {match.group(1)} done: servers 10.0.0.{match.group(1)}. {CONTINUATION_EXIT_PHRASE}"
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)], stop_reason="end_turn",
+                               usage=SimpleNamespace(input_tokens=100, output_tokens=20))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+def request_text(request):
+    texts = []
+    for message in request["messages"]:
+        content = message["content"]
+        texts.extend([content] if isinstance(content, str) else [block.get("text", "") for block in content])
+    return "\n".join(texts)
+
+def goal_requests(model, number):
+    return [request for request in model.requests
+            if f"You are working on Goal {number} " in request_text(request)]
+
+def test_plan_runs_as_dependency_waves_of_sub_sessions(monkeypatch):
+    monkeypatch.setattr(goals_module.console, "quiet", True)
+    model = StubModel()
+    parent = ChatSession(console=Console(quiet=True), limiter=model, show_usage=False)
+    parent.automode = True
+
+    async def run():
+        response, _ = await parent.chat("Audit NTP on both sites\n\n" + AUTOMODE_PLAN_PROMPT, current_iteration=1, max_iterations=5)
+        plan = parse_plan(response)
+        assert [goal["depends"] for goal in plan] == [[], [], [1, 2]]
+        assert goal_levels(plan) == [[1, 2], [3]]
+        return plan, await execute_goals(plan, parent)
+
+    plan, (results, merged) = asyncio.run(run())
+
+    assert parent.turn_tool_uses == 0
+    assert [result["status"] for result in results] == ["complete"] * 3
+    # Goals 1 and 2 ran side by side, and Goal 3 was given both of their results
+    assert model.max_in_flight == 2
+    first_of_goal_3 = goal_requests(model, 3)[0]["messages"][0]["content"]
+    assert "Result of Goal 1:\nGoal 1 done: servers 10.0.0.1." in first_of_goal_3
+    assert "Result of Goal 2:\nGoal 2 done: servers 10.0.0.2." in first_of_goal_3
+    assert all(f"## Goal {number} (complete)" in merged for number in (1, 2, 3))
+    # Only the top-level planning request asks for a plan
+    assert sum(AUTOMODE_PLAN_PROMPT in request_text(request) for request in model.requests) == 1
+    assert not any(AUTOMODE_PLAN_PROMPT in request["system"] for request in model.requests)
+
+def test_goal_after_an_incomplete_dependency_is_skipped(monkeypatch):
+    monkeypatch.setattr(goals_module.console, "quiet", True)
+    model = StubModel(failing={1})
+    parent = ChatSession(console=Console(quiet=True), limiter=model, show_usage=False)
+    plan = parse_plan(PLAN)
+
+    async def run():
+        return await goals_module.run_goals(plan, parent, max_parallel=4, max_iterations=2)
+
+    results = asyncio.run(run())
+
+    assert [result["status"] for result in results] == ["incomplete", "complete", "skipped"]
+    assert len(goal_requests(model, 1)) == 2
+    assert goal_requests(model, 3) == []
+    assert results[2]["response"] == "Skipped: Goal 1 did not complete."
@@ -0,0 +1,105 @@
+import json
+
+from journal import SessionJournal, export_markdown, iter_journal, load_journal, repair_journal
+
+def tool_use(tool_id, name="execute_code"):
+    return {"type": "tool_use", "id": tool_id, "name": name, "input": {"code": "print(1)"}}
+
+def write_journal(path, messages):
+    journal = SessionJournal(str(path), fsync_every=100, fsync_interval=60)
+    for message in messages:
+        journal.append(message)
+    journal.close()
+
+def test_resume_returns_messages_in_order(tmp_path):
+    path = tmp_path / "session.jsonl"
+    messages = [
+        {"role": "user", "content": "show vlans on r1"},
+        {"role": "assistant", "content": [tool_use("t1")]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t1", "content": "VLAN 10"}]},
+        {"role": "assistant", "content": "r1 has VLAN 10."},
+    ]
+    write_journal(path, messages)
+    assert load_journal(str(path)) == messages
+
+def test_partial_last_line_is_skipped(tmp_path):
+    path = tmp_path / "session.jsonl"
+    write_journal(path, [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "hi"}])
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"role": "user", "content": "cut off"})[:20])
+    assert [message["content"] for message in iter_journal(str(path))] == ["hello", "hi"]
+
+def test_corrupt_line_is_skipped(tmp_path):
+    path = tmp_path / "session.jsonl"
+    write_journal(path, [{"role": "user", "content": "hello"}])
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("not json\n")
+    write_journal(path, [{"role": "assistant", "content": "hi"}])
+    assert [message["content"] for message in load_journal(str(path))] == ["hello", "hi"]
+
+def test_trailing_tool_use_gets_error_results(tmp_path):
+    path = tmp_path / "session.jsonl"
+    write_journal(path, [
+        {"role": "user", "content": "push the config"},
+        {"role": "assistant", "content": [{"type": "text", "text": "Pushing."}, tool_use("t1"), tool_use("t2")]},
+    ])
+
+    history = load_journal(str(path))
+
+    results = history[2]["content"]
+    assert history[2]["role"] == "user"
+    assert [result["tool_use_id"] for result in results] == ["t1", "t2"]
+    assert all(result["is_error"] for result in results)
+    assert history[3]["role"] == "assistant"
+    assert len(history) == 4
+
+def test_rotate_continues_in_a_new_file(tmp_path):
+    journal = SessionJournal(str(tmp_path / "session_first.jsonl"))
+    journal.append({"role": "user", "content": "before reset"})
+    first = journal.path
+    journal.rotate()
+    journal.append({"role": "user", "content": "after reset"})
+    journal.close()
+    assert journal.path != first
+    assert [message["content"] for message in load_journal(journal.path)] == ["after reset"]
+
+def test_export_markdown(tmp_path):
+    path = tmp_path / "session.jsonl"
+    write_journal(path, [{"role": "user", "content": "hello"}, {"role": "assistant", "content": [tool_use("t1")]}])
+    markdown = export_markdown(str(path), str(tmp_path / "chat.md"))
+    text = open(markdown, encoding='utf-8').read()
+    assert "## User\n\nhello" in text
+    assert "**Tool use:** `execute_code`" in text
+
+def test_resume_after_torn_line_keeps_new_records(tmp_path):
+    path = tmp_path / "session.jsonl"
+    write_journal(path, [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "hi"}])
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"role": "user", "content": "cut off"})[:20])
+
+    # A small block size makes the search for the last newline cross blocks
+    assert repair_journal(str(path), block_size=8) == 0
+    write_journal(path, [{"role": "user", "content": "show vlans"}, {"role": "assistant", "content": "VLAN 10"}])
+
+    assert [message["content"] for message in load_journal(str(path))] == ["hello", "hi", "show vlans", "VLAN 10"]
+
+def test_resume_writes_the_tool_use_answer_to_the_journal(tmp_path):
+    path = tmp_path / "session.jsonl"
+    write_journal(path, [{"role": "user", "content": "push the config"}, {"role": "assistant", "content": [tool_use("t1")]}])
+    resumed = load_journal(str(path))
+
+    assert repair_journal(str(path)) == 2
+    assert list(iter_journal(str(path))) == resumed
+    write_journal(path, [{"role": "user", "content": "try again"}])
+
+    history = load_journal(str(path))
+    assert history[:4] == resumed
+    assert history[4] == {"role": "user", "content": "try again"}
+    assert repair_journal(str(path)) == 0
+    assert len(load_journal(str(path))) == 5
+
+def test_repair_of_a_single_torn_line_empties_the_journal(tmp_path):
+    path = tmp_path / "session.jsonl"
+    path.write_text('{"role": "user", "con')
+    repair_journal(str(path), block_size=4)
+    assert path.read_text() == ""
@@ -0,0 +1,55 @@
+import sys
+
+import pytest
+
+import preflight
+from preflight import check_script
+
+@pytest.fixture(autouse=True)
+def modules(monkeypatch):
+    """The execution environment as seen by the import check: the standard library and netmiko."""
+    monkeypatch.setattr(preflight, "_installed_modules", set(sys.stdlib_module_names) | {"netmiko"})
+
+def check(code):
+    warnings = []
+    return check_script(code, warnings), warnings
+
+HEADER = "from netmiko import ConnectHandler\n"
+
+def test_valid_script_passes():
+    errors, warnings = check(HEADER + 'ConnectHandler(device_type="cisco_ios", host="10.0.0.1", username="u", password="p")\n')
+    assert errors == [] and warnings == []
+
+def test_syntax_error_and_missing_module_are_rejected():
+    assert check("print(\n")[0][0].startswith("SyntaxError at line 1")
+    assert check("import paramiko_ng\n")[0] == ["line 1: module 'paramiko_ng' is not installed in the 'netmikoai' environment"]
+    assert check("try:\n    import paramiko_ng\nexcept ImportError:\n    pass\n")[0] == []
+
+def test_bad_parameters_of_a_device_literal_are_rejected():
+    errors, _ = check(HEADER + 'device = {"device_type": "cisco_ios", "host": "10.0.0.256", "usrname": "u"}\n'
+                               'ConnectHandler(**device)\n')
+    assert errors == ["line 3: '10.0.0.256' is not a valid IPv4 address",
+                      "line 3: unknown ConnectHandler parameter 'usrname' in ConnectHandler call"]
+
+def test_missing_host_is_only_a_warning():
+    errors, warnings = check(HEADER + 'ConnectHandler(device_type="cisco_ios", username="u", password="p")\n')
+    assert errors == []
+    assert warnings == ["line 2: ConnectHandler call has no 'host' or 'ip'"]
+
+@pytest.mark.parametrize("change", [
+    'device["host"] = host',
+    'device.update(host=host)',
+    'device = {**device, "host": host}',
+    'device |= {"host": host}',
+])
+def test_dict_completed_before_the_call_is_not_flagged(change):
+    code = (HEADER + 'device = {"device_type": "cisco_ios", "username": "u", "password": "p"}\n'
+            f'for host in ["10.0.0.1", "10.0.0.2"]:\n    {change}\n    ConnectHandler(**device)\n')
+    assert check(code) == ([], [])
+
+def test_inventory_records_only_warn():
+    errors, warnings = check(HEADER + 'devices = [{"device_type": "cisco_ios", "host": "0.0.0.0", "site": "nyc"}]\n'
+                                      'for device in devices:\n    ConnectHandler(**device)\n')
+    assert errors == []
+    assert warnings == ["line 2: '0.0.0.0' cannot be used as a device address",
+                        "line 2: unknown ConnectHandler parameter 'site' in device dictionary"]
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+from anthropic import APIConnectionError, APIStatusError, AsyncAnthropic, RateLimitError
+
+from ratelimit import RateLimiter, TokenBucket, estimate_input_tokens, retry_after_seconds
+
+def status_error(code, headers=None):
+    response = SimpleNamespace(status_code=code, headers=headers or {}, request=None)
+    return APIStatusError(f"status {code}", response=response, body=None)
+
+class FakeRaw:
+    def __init__(self, input_tokens, output_tokens, headers=None):
+        self.headers = headers or {}
+        self._usage = SimpleNamespace(input_tokens=input_tokens, output_tokens=output_tokens)
+
+    async def parse(self):
+        return SimpleNamespace(usage=self._usage)
+
+class FakeClient:
+    """Answers messages.with_raw_response.create with each outcome in turn, raising exceptions."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.messages = SimpleNamespace(with_raw_response=SimpleNamespace(create=self._create))
+
+    async def _create(self, **request):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+def make_limiter(**overrides):
+    settings = dict(max_concurrency=2, requests_per_minute=600, input_tokens_per_minute=60000,
+                    output_tokens_per_minute=60000, max_retries=3, backoff_base=0.0, backoff_max=0.0)
+    settings.update(overrides)
+    return RateLimiter(**settings)
+
+REQUEST = {"model": "test", "max_tokens": 10, "messages": [{"role": "user", "content": "x" * 8000}]}
+
+def test_bucket_delay_consume_and_refund():
+    bucket = TokenBucket(60)
+    assert bucket.delay_for(10) == 0.0
+    bucket.consume(70)
+    assert bucket.level == pytest.approx(-10, abs=0.1)
+    # 10 below zero plus the 5 asked for, at one unit per second
+    assert bucket.delay_for(5) == pytest.approx(15, abs=0.1)
+    bucket.refund(100)
+    assert bucket.level == 60
+
+def test_bucket_delay_is_capped_at_capacity():
+    bucket = TokenBucket(60)
+    bucket.consume(60)
+    assert bucket.delay_for(1000) == pytest.approx(60, abs=0.1)
+
+def test_bucket_sync_with_exhausted_window_waits_for_reset():
+    bucket = TokenBucket(60)
+    bucket.sync(120, 0, reset_at=time.time() + 30)
+    assert bucket.capacity == 120
+    assert bucket.delay_for(1) == pytest.approx(30.5, abs=0.1)
+
+def test_limiter_reads_rate_limit_headers():
+    limiter = make_limiter()
+    limiter.update_from_headers({"anthropic-ratelimit-input-tokens-limit": "1000",
+                                 "anthropic-ratelimit-input-tokens-remaining": "250"})
+    assert limiter.buckets["input_tokens"].capacity == 1000
+    assert limiter.buckets["input_tokens"].level == pytest.approx(250, abs=1)
+    assert limiter.buckets["requests"].capacity == 600
+
+def test_retry_after_prefers_milliseconds():
+    assert retry_after_seconds({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert retry_after_seconds({"retry-after": "2"}) == 2.0
+    assert retry_after_seconds({"retry-after": "soon"}) is None
+    assert retry_after_seconds(None) is None
+
+def test_retries_rate_limit_and_keeps_one_reservation():
+    limiter = make_limiter()
+    client = FakeClient(status_error(429), status_error(529), FakeRaw(500, 20))
+    estimated = estimate_input_tokens(REQUEST)
+    assert estimated > 1000
+
+    asyncio.run(limiter.create_message(client, **REQUEST))
+
+    assert client.calls == 3
+    assert limiter.stats["retries"] == 2
+    assert limiter.stats["requests"] == 1
+    # Failed attempts gave their reservation back; the success is reconciled to actual usage
+    assert limiter.buckets["input_tokens"].level == pytest.approx(60000 - 500, abs=10)
+    assert limiter.buckets["output_tokens"].level == pytest.approx(60000 - 20, abs=10)
+    assert limiter._semaphore._value == 2
+
+def test_connection_errors_are_retried():
+    limiter = make_limiter()
+    client = FakeClient(APIConnectionError(request=None), FakeRaw(10, 1))
+    asyncio.run(limiter.create_message(client, **REQUEST))
+    assert client.calls == 2
+    assert limiter.stats["retries"] == 1
+
+def test_non_retryable_error_is_raised_at_once():
+    limiter = make_limiter()
+    client = FakeClient(status_error(400), FakeRaw(10, 1))
+    with pytest.raises(APIStatusError):
+        asyncio.run(limiter.create_message(client, **REQUEST))
+    assert client.calls == 1
+    assert limiter.stats == {"requests": 0, "retries": 0, "failures": 1, "wait_seconds": 0.0}
+    assert limiter.buckets["input_tokens"].level == pytest.approx(60000, abs=10)
+    assert limiter._semaphore._value == 2
+
+def test_gives_up_after_max_retries():
+    limiter = make_limiter(max_retries=2)
+    client = FakeClient(*(status_error(529) for _ in range(3)))
+    with pytest.raises(APIStatusError):
+        asyncio.run(limiter.create_message(client, **REQUEST))
+    assert client.calls == 3
+    assert limiter.stats["retries"] == 2
+    assert limiter.stats["failures"] == 1
+    assert limiter.buckets["input_tokens"].level == pytest.approx(60000, abs=10)
+
+def test_rate_limit_holds_back_other_callers():
+    limiter = make_limiter(max_retries=0)
+    client = FakeClient(status_error(429, {"retry-after": "30"}))
+    with pytest.raises(APIStatusError):
+        asyncio.run(limiter.create_message(client, **REQUEST))
+    assert limiter.buckets["requests"].delay_for(1) == pytest.approx(30, abs=0.5)
+
+class StubAPI:
+    """
+    Messages endpoint on a local port answering with each (status, headers)
+    in turn, so the limiter is driven through the real SDK and HTTP stack.
+    """
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.times = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("content-length", 0)))
+                stub.times.append(time.monotonic())
+                status, headers = stub.replies.pop(0)
+                if status == 200:
+                    payload = {"id": "msg_1", "type": "message", "role": "assistant", "model": "test",
+                               "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn",
+                               "stop_sequence": None, "usage": {"input_tokens": 900, "output_tokens": 5}}
+                else:
+                    payload = {"type": "error", "error": {"type": "rate_limit_error", "message": "slow down"}}
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+def send_through_sdk(limiter, stub):
+    async def send():
+        async with AsyncAnthropic(api_key="test", base_url=stub.url, max_retries=0) as client:
+            return await limiter.create_message(client, **REQUEST)
+    return asyncio.run(send())
+
+def test_http_429_waits_for_retry_after_and_syncs_headers():
+    reset = datetime.fromtimestamp(time.time() + 60, timezone.utc).isoformat().replace("+00:00", "Z")
+    throttled = {"retry-after-ms": "300", "retry-after": "1",
+                 "anthropic-ratelimit-requests-limit": "50", "anthropic-ratelimit-requests-remaining": "10",
+                 "anthropic-ratelimit-requests-reset": reset}
+    accepted = {"anthropic-ratelimit-input-tokens-limit": "20000",
+                "anthropic-ratelimit-input-tokens-remaining": "15000",
+                "anthropic-ratelimit-input-tokens-reset": reset}
+    stub = StubAPI((429, throttled), (200, accepted))
+    limiter = make_limiter(max_retries=1)
+    try:
+        response = send_through_sdk(limiter, stub)
+    finally:
+        stub.close()
+
+    assert response.content[0].text == "ok"
+    assert len(stub.times) == 2
+    # retry-after-ms wins over retry-after
+    assert 0.3 <= stub.times[1] - stub.times[0] < 1.0
+    assert limiter.stats["retries"] == 1 and limiter.stats["requests"] == 1
+    assert limiter.buckets["requests"].capacity == 50
+    assert limiter.buckets["input_tokens"].capacity == 20000
+    assert limiter.buckets["input_tokens"].level == pytest.approx(15000 - (900 - estimate_input_tokens(REQUEST)), abs=10)
+
+def test_http_429_without_retries_left_holds_back_the_next_call():
+    stub = StubAPI((429, {"retry-after": "30", "anthropic-ratelimit-requests-limit": "60",
+                          "anthropic-ratelimit-requests-remaining": "0"}))
+    limiter = make_limiter(max_retries=0)
+    try:
+        with pytest.raises(RateLimitError) as raised:
+            send_through_sdk(limiter, stub)
+    finally:
+        stub.close()
+
+    assert raised.value.status_code == 429
+    assert limiter.stats["failures"] == 1
+    assert limiter.buckets["requests"].capacity == 60
+    assert limiter.buckets["requests"].delay_for(1) == pytest.approx(30, abs=1)
@@ -0,0 +1,46 @@
+from repoll import OutputHistory, format_delta
+
+TABLE = "\n".join(f"Gi0/{port}  connected  {port}  a-full  a-1000" for port in range(1, 25))
+
+def record(host, output, ts, command="show interfaces status"):
+    return {"host": host, "method": "send_command", "command": command, "output": output, "ts": ts}
+
+def history(tmp_path):
+    return OutputHistory(output_dir=str(tmp_path / "outputs"), max_age=3600, min_chars=50)
+
+def test_repeated_poll_is_sent_as_a_delta(tmp_path):
+    outputs = history(tmp_path)
+    assert outputs.condense(TABLE + "\n", [record("r1", TABLE, 1000.0)]) == TABLE + "\n"
+
+    changed = TABLE.replace("Gi0/7  connected", "Gi0/7  notconnect")
+    stdout = outputs.condense("r1:\n" + changed + "\n", [record("r1", changed, 1060.0)])
+
+    assert stdout.startswith("r1:\n[show interfaces status on r1: 1 line(s) changed since the run at ")
+    assert "~ Gi0/7: connected -> notconnect" in stdout
+    assert outputs.condense(changed, [record("r1", changed, 1120.0)]).startswith(
+        "[show interfaces status on r1: unchanged since the run at ")
+    assert (outputs.served, outputs.unchanged) == (2, 1)
+
+def test_outputs_not_printed_are_not_remembered(tmp_path):
+    outputs = history(tmp_path)
+    # The script only printed a summary, so the model never saw the table
+    assert outputs.condense("24 ports up\n", [record("r1", TABLE, 1000.0)]) == "24 ports up\n"
+    assert outputs.entries == {}
+
+    assert outputs.condense(TABLE, [record("r1", TABLE, 1060.0)]) == TABLE
+    assert outputs.served == 0
+
+def test_identical_outputs_of_several_hosts_keep_their_labels(tmp_path):
+    outputs = history(tmp_path)
+    outputs.condense(TABLE, [record("r1", TABLE, 1000.0)])
+
+    stdout = outputs.condense(TABLE + "\n" + TABLE, [record("r1", TABLE, 1060.0), record("r2", TABLE, 1060.0)])
+
+    assert stdout.startswith("[show interfaces status on r1: unchanged")
+    assert stdout.endswith("\n" + TABLE)
+    assert set(outputs.entries) == {("r1", "show interfaces status"), ("r2", "show interfaces status")}
+
+def test_format_delta_labels_rows_by_their_first_field():
+    delta, changed = format_delta("a 1 2\nb 3 4", "a 1 5\nb 3 4\nc 6 7")
+    assert delta == "~ a: 2 -> 5\n+ c 6 7"
+    assert changed == 2
@@ -0,0 +1,57 @@
+import pytest
+
+from result_cache import changes_device, classify_script, command_ttl, is_read_only
+
+HEADER = """from netmiko import ConnectHandler
+connection = ConnectHandler(device_type="cisco_ios", host="10.0.0.1", username="u", password="p")
+output = connection.send_command("show version")
+"""
+
+def test_read_only_commands():
+    assert is_read_only("show ip interface brief")
+    assert is_read_only("display current-configuration")
+    assert not is_read_only("show running-config | redirect flash:backup.cfg")
+    assert not is_read_only("write memory")
+    assert command_ttl("show version", 60) == 3600
+    assert command_ttl("show clock", 60) == 0
+
+def test_changes_device():
+    assert changes_device("send_config_set", ["ntp server 10.0.0.1"])
+    assert changes_device("send_command", "copy running-config startup-config")
+    assert not changes_device("send_command", "show version")
+    assert not changes_device("connect", "")
+
+def test_show_only_script_is_cacheable():
+    code = HEADER + """for command in ["show clock", "show ip route"]:
+    print(connection.send_command(command))
+print(output.replace("Cisco", "cisco"))
+hosts = ["a", "b"]
+hosts.remove("a")
+with open("inventory.txt") as f:
+    print(f.read())
+"""
+    assert classify_script(code) == (True, [])
+
+def test_config_and_unknown_commands_are_not_cacheable():
+    read_only, reasons = classify_script(HEADER + 'connection.send_config_set(["ntp server 10.0.0.1"])\n'
+                                                  'connection.send_command(input())\n')
+    assert not read_only
+    assert reasons == ["line 4: calls send_config_set", "line 5: send_command command is not a literal"]
+
+@pytest.mark.parametrize("code, reason", [
+    ('with open("backup.cfg", "w") as f:\n    f.write(output)\n', "opens a file for writing"),
+    ('open("log.txt", mode="a").write(output)\n', "opens a file for writing"),
+    ('from pathlib import Path\nPath("backup.cfg").write_text(output)\n', "calls write_text"),
+    ('from pathlib import Path\nPath("backup.cfg").open("w").write(output)\n', "opens a file for writing"),
+    ('import os\nos.remove("old.cfg")\n', "calls remove"),
+    ('from os import system\nsystem("logger done")\n', "calls system"),
+    ('import subprocess\nsubprocess.run(["logger", output])\n', "imports subprocess"),
+    ('import requests\nrequests.post("https://hooks.example.com", json={"text": output})\n', "imports requests"),
+    ('from urllib.request import urlopen\nurlopen("https://hooks.example.com")\n', "imports urllib.request"),
+    ('import shutil\nshutil.rmtree("old")\n', "imports shutil"),
+    ('ConnectHandler(device_type="cisco_ios", host="10.0.0.2", session_log="s.log")\n', "writes a session log"),
+])
+def test_side_effects_outside_the_devices_are_not_cacheable(code, reason):
+    read_only, reasons = classify_script(HEADER + code)
+    assert not read_only
+    assert any(r.endswith(reason) for r in reasons), reasons
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+import rollout
+from rollout import format_rollout_report, plan_waves, run_rollout
+
+@pytest.fixture
+def waves(monkeypatch):
+    """
+    Replace the worker process with a stub that fails the hosts in the
+    returned set and, like rollout_worker, skips the rest of a wave once told
+    to stop. Returns the set and the hosts of every wave that ran.
+    """
+    failing = set()
+    ran = []
+
+    async def fake_run_wave(devices, job, on_result):
+        ran.append([device["host"] for device in devices])
+        stop = False
+        for device in devices:
+            if stop:
+                on_result({"host": device["host"], "skipped": True})
+            else:
+                stop = on_result({"host": device["host"], "ok": device["host"] not in failing, "error": "verify failed"})
+
+    monkeypatch.setattr(rollout, "_run_wave", fake_run_wave)
+    return failing, ran
+
+def fleet(count):
+    return [{"host": f"r{index}", "device_type": "cisco_ios"} for index in range(count)]
+
+def test_plan_waves_grows_after_the_canary():
+    assert plan_waves(20, canary_size=1, growth=2.0) == [1, 2, 4, 8, 5]
+    assert plan_waves(3, canary_size=5, growth=2.0) == [3]
+    # A growth factor at or below 1 still makes progress
+    assert plan_waves(6, canary_size=1, growth=1.0) == [1, 2, 3]
+    assert plan_waves(0) == []
+
+def test_clean_rollout_reaches_every_device(waves):
+    _, ran = waves
+    report = asyncio.run(run_rollout(fleet(7), ["ntp server 10.0.0.1"], canary_size=1, growth=2.0))
+    assert report["status"] == "completed"
+    assert ran == [["r0"], ["r1", "r2"], ["r3", "r4", "r5", "r6"]]
+    assert len(report["succeeded"]) == 7
+    assert report["not_attempted"] == []
+
+def test_failed_canary_stops_the_rollout(waves):
+    failing, ran = waves
+    failing.add("r0")
+    report = asyncio.run(run_rollout(fleet(7), ["ntp server 10.0.0.1"], failure_threshold=0.2, canary_size=1, growth=2.0))
+    assert report["status"] == "aborted"
+    assert ran == [["r0"]]
+    assert report["failed"] == {"r0": "verify failed"}
+    assert report["not_attempted"] == ["r1", "r2", "r3", "r4", "r5", "r6"]
+    assert "1/1 exceeded threshold 20% in wave 1" in report["reason"]
+
+def test_abort_mid_wave_skips_devices_not_started(waves):
+    failing, ran = waves
+    failing.update({"r3", "r4"})
+    report = asyncio.run(run_rollout(fleet(10), ["ntp server 10.0.0.1"], failure_threshold=0.25, canary_size=1, growth=2.0))
+    # 1/4 attempted failed is at the threshold, 2/5 is past it
+    assert report["status"] == "aborted"
+    assert len(ran) == 3
+    assert report["succeeded"] == ["r0", "r1", "r2"]
+    assert sorted(report["failed"]) == ["r3", "r4"]
+    assert report["not_attempted"] == ["r5", "r6", "r7", "r8", "r9"]
+    assert report["waves"][-1] == {"wave": 3, "size": 4, "succeeded": 0, "failed": 2, "skipped": 2,
+                                   "elapsed": report["waves"][-1]["elapsed"]}
+
+def test_failures_within_threshold_do_not_abort(waves):
+    failing, _ = waves
+    failing.add("r5")
+    report = asyncio.run(run_rollout(fleet(10), ["ntp server 10.0.0.1"], failure_threshold=0.2, canary_size=2, growth=2.0))
+    assert report["status"] == "completed"
+    assert len(report["succeeded"]) == 9
+    assert "Failed r5: verify failed" in format_rollout_report(report)
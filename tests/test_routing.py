@@ -0,0 +1,58 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from anthropic import APIStatusError
+
+import routing
+from models import MODEL_TIERS
+from routing import classify_tool_round, create_routed, route
+
+def status_error(code):
+    response = SimpleNamespace(status_code=code, headers={}, request=None)
+    return APIStatusError(f"status {code}", response=response, body=None)
+
+class StubLimiter:
+    """Records the model of each request and answers with the next outcome, raising exceptions."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.models = []
+
+    async def create_message(self, client, **request):
+        self.models.append(request["model"])
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+def response(input_tokens=10, output_tokens=5):
+    return SimpleNamespace(usage=SimpleNamespace(input_tokens=input_tokens, output_tokens=output_tokens))
+
+def test_short_successful_results_are_summaries():
+    assert classify_tool_round([{"content": "ok"}]) == "summary"
+    assert classify_tool_round([{"content": "ok", "is_error": True}]) == "default"
+    assert classify_tool_round([{"content": "x" * (routing.ROUTE_SUMMARY_MAX_CHARS + 1)}]) == "default"
+
+def test_route_chains_fallback_tiers():
+    assert route("tool_checker", "summary") == [(MODEL_TIERS["small"], 4000), (MODEL_TIERS["large"], 8000)]
+    assert route("tool_checker", "unknown") == [(MODEL_TIERS["large"], 8000)]
+
+def test_overloaded_model_falls_back_to_next_tier():
+    limiter = StubLimiter(status_error(529), response())
+    asyncio.run(create_routed(limiter, "code_execution", client=object(), messages=[]))
+    assert limiter.models == [MODEL_TIERS["small"], MODEL_TIERS["large"]]
+    assert routing.decisions[-1]["model"] == MODEL_TIERS["large"]
+    assert routing.decisions[-1]["fallback"] is True
+
+def test_client_errors_do_not_fall_back():
+    limiter = StubLimiter(status_error(400), response())
+    with pytest.raises(APIStatusError):
+        asyncio.run(create_routed(limiter, "code_execution", client=object(), messages=[]))
+    assert limiter.models == [MODEL_TIERS["small"]]
+
+def test_last_error_is_raised_when_the_chain_is_exhausted():
+    limiter = StubLimiter(status_error(503), status_error(529))
+    with pytest.raises(APIStatusError) as raised:
+        asyncio.run(create_routed(limiter, "compactor", client=object(), messages=[]))
+    assert raised.value.status_code == 529
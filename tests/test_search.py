@@ -0,0 +1,152 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+import search
+from search import SearchCache, normalize_query, trim_content
+
+@pytest.fixture
+def fetches(tmp_path, monkeypatch):
+    """Replace the HTTP call with a stub and give each test its own cache; returns the fetched queries."""
+    queries = []
+
+    async def fake_fetch(query):
+        queries.append(query)
+        await asyncio.sleep(0.01)
+        if "fail" in query:
+            raise RuntimeError("search failed")
+        return {"answer": f"answer to {query}", "results": []}
+
+    monkeypatch.setattr(search, "_fetch", fake_fetch)
+    monkeypatch.setattr(search, "search_cache", SearchCache(str(tmp_path / "search.db"), ttl=3600))
+    return queries
+
+@pytest.fixture
+def tavily(tmp_path, monkeypatch):
+    """
+    Point the client at a local aiohttp server standing in for Tavily; returns
+    its start coroutine and the list of (peer port, headers, payload) it
+    received. A query containing "slow" is answered late, "broken" with a
+    500.
+    """
+    received = []
+
+    async def handle(request):
+        payload = await request.json()
+        received.append((request.transport.get_extra_info("peername")[1], dict(request.headers), payload))
+        if "slow" in payload["query"]:
+            await asyncio.sleep(1)
+        if "broken" in payload["query"]:
+            return web.json_response({"detail": "internal error"}, status=500)
+        content = "Unrelated filler text here. " * 40 + f"The answer about {payload['query']} is here."
+        return web.json_response({"answer": f"answer to {payload['query']}", "results": [
+            {"title": f"Result {i}", "url": f"https://example.com/{i}", "content": content} for i in range(8)]})
+
+    async def start():
+        app = web.Application()
+        app.router.add_post("/search", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(search, "TAVILY_BASE_URL", f"http://127.0.0.1:{port}")
+        return runner
+
+    monkeypatch.setattr(search, "TAVILY_API_KEY", "tvly-test")
+    monkeypatch.setattr(search, "SEARCH_TIMEOUT", 0.5)
+    monkeypatch.setattr(search, "_session", None)
+    monkeypatch.setattr(search, "search_cache", SearchCache(str(tmp_path / "search.db"), ttl=3600))
+    return SimpleNamespace(start=start, received=received)
+
+def run_against(server, coroutine):
+    async def run():
+        runner = await server.start()
+        try:
+            return await coroutine()
+        finally:
+            await search.close_session()
+            await runner.cleanup()
+    return asyncio.run(run())
+
+def test_fetch_sends_the_tavily_request_over_one_session(tavily):
+    async def queries():
+        return [await search.search("ospf hello timers"), await search.search("bgp timers")]
+
+    first, second = run_against(tavily, queries)
+
+    assert first["answer"] == "answer to ospf hello timers"
+    assert len(first["results"]) == search.SEARCH_MAX_RESULTS
+    assert first["results"][0]["content"].endswith("The answer about ospf hello timers is here.")
+    assert len(first["results"][0]["content"]) <= search.SEARCH_SNIPPET_CHARS
+    (port, headers, payload), (second_port, _, _) = tavily.received
+    assert headers["Authorization"] == "Bearer tvly-test"
+    assert payload == {"api_key": "tvly-test", "query": "ospf hello timers", "max_results": search.SEARCH_MAX_RESULTS,
+                       "search_depth": "basic", "include_answer": True}
+    # The shared session keeps the connection alive between queries
+    assert second_port == port
+    assert search._session is None
+
+def test_errors_and_timeouts_are_reported_per_query(tavily):
+    async def queries():
+        return await search.search_many(["broken query", "slow query", "ospf area"])
+
+    text = run_against(tavily, queries)
+
+    assert "Results for: broken query\nError: 500, message='Internal Server Error'" in text
+    assert "Results for: slow query\nError: TimeoutError" in text
+    assert "Answer: answer to ospf area" in text
+    assert len(tavily.received) == 3
+    # Failures are not cached
+    assert search.search_cache.get("broken query") is None
+
+def test_normalize_query_ignores_order_case_and_stopwords():
+    assert normalize_query("Cisco IOS-XE 17.3 OSPF config guide") == normalize_query("ospf config cisco ios-xe 17.3")
+    assert normalize_query("How do I configure OSPF?") == "configure ospf"
+    assert normalize_query("ios-xe 17.3") == "17.3 ios-xe"
+
+def test_cache_expires_after_ttl(tmp_path, monkeypatch):
+    cache = SearchCache(str(tmp_path / "search.db"), ttl=60)
+    cache.put("ospf", {"answer": "a", "results": []})
+    assert cache.get("ospf") == {"answer": "a", "results": []}
+    assert cache.get("bgp") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    now = search.time.time()
+    monkeypatch.setattr(search.time, "time", lambda: now + 61)
+    assert cache.get("ospf") is None
+    cache.purge()
+    monkeypatch.undo()
+    assert cache.get("ospf") is None
+
+def test_cache_persists_across_instances(tmp_path):
+    SearchCache(str(tmp_path / "search.db"), ttl=60).put("ospf", {"answer": "a", "results": []})
+    assert SearchCache(str(tmp_path / "search.db"), ttl=60).get("ospf") == {"answer": "a", "results": []}
+
+def test_equivalent_queries_are_served_from_cache(fetches):
+    first = asyncio.run(search.search("Cisco OSPF config"))
+    second = asyncio.run(search.search("config for ospf on cisco"))
+    assert second == first
+    assert fetches == ["Cisco OSPF config"]
+    assert search.search_cache.hits == 1
+
+def test_concurrent_identical_queries_share_one_fetch(fetches):
+    async def run():
+        return await asyncio.gather(*(search.search("show ip route") for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(fetches) == 1
+    assert all(result == results[0] for result in results)
+    assert search._in_flight == {}
+
+def test_search_many_reports_failures_per_query(fetches):
+    text = asyncio.run(search.search_many(["ospf timers", "fail please"]))
+    assert "Answer: answer to ospf timers" in text
+    assert "Results for: fail please\nError: search failed" in text
+
+def test_trim_content_keeps_relevant_sentences():
+    content = "Unrelated filler text here. " * 20 + "OSPF hello timers default to 10 seconds."
+    trimmed = trim_content(content, "ospf hello timers", max_chars=100)
+    assert trimmed == "OSPF hello timers default to 10 seconds."
@@ -0,0 +1,55 @@
+from topology import TopologyGraph, is_empty_listing, parse_neighbors
+
+DETAIL = """-------------------------
+Device ID: sw2.example.net
+Entry address(es):
+  IP address: 10.0.0.12
+Platform: cisco WS-C3850,  Capabilities: Switch IGMP
+Interface: GigabitEthernet1/0/1,  Port ID (outgoing port): GigabitEthernet1/0/48
+
+Total cdp entries displayed : 1
+"""
+
+TABLE_HEADER = "Device ID        Local Intrfce     Holdtme    Capability  Platform  Port ID\n"
+
+def record(output, host="10.0.0.11", command="show cdp neighbors detail"):
+    return {"host": host, "method": "send_command", "command": command, "output": output, "ts": 1000.0}
+
+def graph(tmp_path):
+    return TopologyGraph(path=str(tmp_path / "topology.json"))
+
+def test_detail_output_adds_links(tmp_path):
+    topology = graph(tmp_path)
+    assert topology.ingest([record(DETAIL), record("hostname sw1\n", command="show running-config")]) == 1
+
+    assert topology.resolve("10.0.0.11") == "sw1"
+    assert topology.neighbors("sw1") == [("sw2", [("gi1/0/1", "gi1/0/48")])]
+    assert graph(tmp_path).neighbors("sw1") == topology.neighbors("sw1")
+
+def test_errors_keep_existing_links(tmp_path):
+    topology = graph(tmp_path)
+    topology.ingest([record(DETAIL)])
+
+    for output in ["% CDP is not enabled", "% Invalid input detected at '^' marker.", "Unrecognised format\n"]:
+        assert parse_neighbors(output) == [] and not is_empty_listing(output)
+        assert topology.ingest([record(output)]) == 0
+    assert topology.neighbors("10.0.0.11") == [("sw2", [("gi1/0/1", "gi1/0/48")])]
+
+def test_empty_listing_clears_links(tmp_path):
+    topology = graph(tmp_path)
+    topology.ingest([record(DETAIL)])
+    assert topology.ingest([record("\nTotal cdp entries displayed : 0\n")]) == 1
+    assert topology.neighbors("10.0.0.11") == []
+
+    topology.ingest([record(DETAIL)])
+    assert topology.ingest([record(TABLE_HEADER + "\nTotal cdp entries displayed : 0", command="show cdp neighbors")]) == 1
+    assert topology.neighbors("10.0.0.11") == []
+
+def test_ingest_saves_once(tmp_path, monkeypatch):
+    topology = graph(tmp_path)
+    saves = []
+    monkeypatch.setattr(topology, "_save", lambda: saves.append(1))
+    topology.ingest([record(DETAIL, host=f"10.0.1.{i}") for i in range(50)])
+    assert len(saves) == 1
+    topology.ingest([record("% CDP is not enabled")])
+    assert len(saves) == 1
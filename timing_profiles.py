@@ -0,0 +1,108 @@
+import json
+import math
+import os
+
+from exec_runtime import NETMIKO_DEFAULT_TIMEOUTS
+from config import (TIMING_PROFILES_FILE, TIMING_MAX_SAMPLES, TIMING_MIN_SAMPLES, TIMING_PERCENTILE,
+                    TIMING_MARGIN, TIMING_MAX_READ_TIMEOUT, TIMING_FAST_RTT, TIMING_PROMPT_MAX_CHARS)
+
+# Commands whose duration is one round trip to the prompt when their output is short
+PROMPT_METHODS = ("send_command", "send_command_timing")
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+class TimingProfileStore:
+    """
+    Per-host Netmiko timing learned from observed round-trip times.
+
+    exec_runtime appends one capture record per connect and per command to a
+    capture file; after each run captures.process_capture folds those samples
+    in here (bounded per host) and the derived profile is written next to
+    them. exec_runtime reads the "profiles" section on the next run and
+    injects the values into ConnectHandler and send_command, unless the
+    script sets them explicitly.
+    """
+
+    def __init__(self, path=TIMING_PROFILES_FILE):
+        self.path = path
+        data = self._load()
+        self.samples = data.get("samples", {})
+        self.profiles = data.get("profiles", {})
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"profiles": self.profiles, "samples": self.samples}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def record(self, host, kind, elapsed):
+        host_samples = self.samples.setdefault(host, {})
+        host_samples.setdefault(kind, []).append(round(elapsed, 4))
+        del host_samples[kind][:-TIMING_MAX_SAMPLES]
+
+    def ingest(self, records):
+        """Fold the samples of one run's capture records in and refresh the affected profiles."""
+        hosts = set()
+        for record in records:
+            host = record.get("host")
+            if not host or "elapsed" not in record:
+                continue
+            self.record(host, "connect" if record["method"] == "connect" else "command", record["elapsed"])
+            output = record.get("output")
+            if record["method"] in PROMPT_METHODS and isinstance(output, str) and len(output) <= TIMING_PROMPT_MAX_CHARS:
+                self.record(host, "prompt", record["elapsed"])
+            hosts.add(host)
+        for host in hosts:
+            profile = self.compute(host)
+            if profile:
+                self.profiles[host] = profile
+        if hosts:
+            self._save()
+        return len(hosts)
+
+    def compute(self, host):
+        """
+        Derive a timing profile from the samples of a host, or None while
+        there are too few of them. read_timeout is the chosen percentile of
+        command RTTs times a safety margin, never below Netmiko's default: a
+        host that only ran quick commands so far may still be sent a long
+        one, and a shorter timeout would save nothing. How fast the device
+        answers is judged from prompt round trips only, commands whose
+        output is at most TIMING_PROMPT_MAX_CHARS, as the duration of a
+        show run or show tech is dominated by its size. Hosts whose median
+        prompt round trip is below TIMING_FAST_RTT get fast_cli, slower ones
+        a proportional global_delay_factor; without enough prompt samples
+        Netmiko's defaults are left alone.
+        """
+        host_samples = self.samples.get(host, {})
+        commands = host_samples.get("command", [])
+        connects = host_samples.get("connect", [])
+        prompts = host_samples.get("prompt", [])
+        if len(commands) < TIMING_MIN_SAMPLES:
+            return None
+        read_timeout = percentile(commands, TIMING_PERCENTILE) * TIMING_MARGIN
+        profile = {
+            "read_timeout": round(min(max(read_timeout, NETMIKO_DEFAULT_TIMEOUTS["read_timeout"]), TIMING_MAX_READ_TIMEOUT), 2),
+        }
+        if len(prompts) >= TIMING_MIN_SAMPLES:
+            median = percentile(prompts, 50)
+            profile["fast_cli"] = median < TIMING_FAST_RTT
+            profile["global_delay_factor"] = 1 if median < TIMING_FAST_RTT else min(math.ceil(median / TIMING_FAST_RTT), 8)
+        if len(connects) >= TIMING_MIN_SAMPLES:
+            profile["conn_timeout"] = round(max(percentile(connects, TIMING_PERCENTILE) * TIMING_MARGIN,
+                                                NETMIKO_DEFAULT_TIMEOUTS["conn_timeout"]), 2)
+        return profile
+
+timing_profiles = TimingProfileStore()
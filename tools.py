@@ -5,25 +5,47 @@ import subprocess
 from rich.console import Console
 from rich.panel import Panel
 from rich.syntax import Syntax
-from typing import Dict, Any
+from typing import Dict, Any, List
+import time
 import uuid
-from models import update_token_usage
 
 from utils import read_file, read_multiple_files, list_files
-from models import client, CODEEXECUTIONMODEL
+from routing import create_routed, route
+from ratelimit import limiter as shared_limiter
+from analysis_queue import analysis_queue
+from search import search_many
+from preflight import check_script
+from script_library import script_library
+from rollout import run_rollout, display_rollout_report, format_rollout_report
+from snapshots import config_diff
+from inventory import Inventory, format_devices
+from compliance import load_rules, check_compliance
+from topology import topology, topology_query
+from clustering import condense_output
+from repoll import store_output
+from captures import new_capture_file, runtime_env, process_capture, result_cache
+from result_cache import classify_script, script_digest
+from toolsets import ToolRegistry
+from config import ANALYSIS_MODE, INVENTORY_SOURCES, EXEC_PYTHON, API_CASSETTE_MODE
 
 console = Console()
 
+device_inventory = Inventory(INVENTORY_SOURCES)
+
 tools = [
     {
         "name": "execute_code",
-        "description": "Execute a Netmiko script in the 'code_execution_env' virtual environment and return the output. This tool should be used when you need to run Netmiko scripts and see their output or check for errors. All script execution happens exclusively in this isolated environment. The tool will return the standard output, standard error, and return code of the executed script. Long-running processes will return a process ID for later management.",
+        "description": "Execute a Netmiko script in the 'code_execution_env' virtual environment and return the output. This tool should be used when you need to run Netmiko scripts and see their output or check for errors. All script execution happens exclusively in this isolated environment. The tool will return the standard output, standard error, and return code of the executed script. When the same command runs on several devices, outputs printed verbatim are grouped by shape: one representative per cluster, member lists, and outliers as diffs. Read-only scripts (only show/display commands) and read-only commands are answered from a shared cache when a recent result exists, and the result is marked 'cached'; pushing configuration to a device drops its cached results. Long-running processes will return a process ID for later management.",
         "input_schema": {
             "type": "object",
             "properties": {
                 "code": {
                     "type": "string",
                     "description": "The Netmiko script to execute in the 'code_execution_env' virtual environment. Include all necessary imports, device connection details, and ensure the script is complete and self-contained."
+                },
+                "fresh": {
+                    "type": "boolean",
+                    "description": "Bypass the result cache and query the devices even if a recent result exists. Default false."
                 }
             },
             "required": ["code"]
@@ -96,6 +118,190 @@ tools = [
                 "query": {
                     "type": "string",
                     "description": "The network-related search query. Be as specific as possible, including device models, software versions, protocol names, or exact error messages to get the most relevant results. For example: 'Cisco IOS XE 17.3 OSPF configuration guide' or 'Juniper MX Series MPLS troubleshooting'."
+                },
+                "queries": {
+                    "type": "array",
+                    "items": {
+                        "type": "string"
+                    },
+                    "description": "Optional additional queries to run at the same time as 'query', e.g. the same question for several platforms. Results are returned per query."
+                }
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "list_templates",
+        "description": "Search the library of verified Netmiko script templates. Templates are created automatically from scripts that previously ran successfully, with the device details and commands turned into parameters. Use this before writing a routine script (e.g. running show commands on a device) to find a template that can be run with run_template instead. Returns template ids, their intent, and their parameters with example values.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Words describing the task, such as the platform and commands, e.g. 'cisco_ios show ip interface brief'. Leave empty to list the most used templates."
+                }
+            }
+        }
+    },
+    {
+        "name": "run_template",
+        "description": "Run a verified script template from the library in the 'code_execution_env' virtual environment, with the given parameters substituted. This behaves exactly like execute_code but only requires the template id and parameter values. Optional parameters fall back to the template's example values; required parameters without a value cause an error.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "template_id": {
+                    "type": "string",
+                    "description": "The template id returned by list_templates."
+                },
+                "params": {
+                    "type": "object",
+                    "description": "Parameter values keyed by parameter name, e.g. {\"host\": \"10.0.0.1\", \"username\": \"admin\", \"password\": \"...\", \"command\": \"show version\"}. Array parameters take a list of strings."
+                },
+                "fresh": {
+                    "type": "boolean",
+                    "description": "Bypass the result cache, as for execute_code. Default false."
+                }
+            },
+            "required": ["template_id", "params"]
+        }
+    },
+    {
+        "name": "rollout_config",
+        "description": "Push the same configuration change to many devices in waves of growing size: a small canary wave first, then waves that grow by a factor, each pushed in parallel. After each device a verification command is run. The rollout stops as soon as the share of failed devices exceeds the failure threshold, so a bad change never reaches the remaining devices. Use this instead of writing a script that loops over devices. Target devices either by an inventory selector or by explicit connection dictionaries. Returns per-wave timing, the devices that succeeded or failed (with the error), and the devices that were not attempted.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "selector": {
+                    "type": "string",
+                    "description": "Inventory selector for the target devices, e.g. 'site=nyc and role=access'. Credentials come from the inventory."
+                },
+                "devices": {
+                    "type": "array",
+                    "items": {"type": "object"},
+                    "description": "Netmiko connection dictionaries, one per device, e.g. {\"device_type\": \"cisco_ios\", \"host\": \"10.0.0.1\", \"username\": \"admin\", \"password\": \"...\"}."
+                },
+                "config_commands": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "The configuration commands passed to send_config_set on every device."
+                },
+                "verify_command": {
+                    "type": "string",
+                    "description": "A show command run after the change on each device, e.g. 'show running-config | include ntp server'."
+                },
+                "verify_expect": {
+                    "type": "string",
+                    "description": "Text that must appear in the verify_command output for the device to count as successful."
+                },
+                "max_parallel": {
+                    "type": "integer",
+                    "description": "Maximum number of devices pushed at the same time within a wave."
+                },
+                "failure_threshold": {
+                    "type": "number",
+                    "description": "Share of failed devices (0-1) above which the rollout is stopped. Defaults to 0.1."
+                },
+                "canary_size": {
+                    "type": "integer",
+                    "description": "Number of devices in the first wave. Defaults to 1."
+                },
+                "save_config": {
+                    "type": "boolean",
+                    "description": "Save the running configuration on each device after a successful push."
+                }
+            },
+            "required": ["config_commands"]
+        }
+    },
+    {
+        "name": "config_diff",
+        "description": "Compare stored configuration snapshots and return only the stanzas that changed (added, removed, or modified with the changed lines). Snapshots are taken automatically whenever an executed script runs 'show running-config' (or the platform equivalent) without filters, so run one before and one after a change to get a pre/post comparison without reading full configurations. Without versions, the latest snapshot is compared with the one before it. Without hosts, every host with at least two snapshots is compared.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "hosts": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Hosts to compare, as used in the 'host' field of the connection. Leave empty to compare all hosts."
+                },
+                "from_version": {
+                    "type": "integer",
+                    "description": "Snapshot version to compare from. Defaults to the version before to_version."
+                },
+                "to_version": {
+                    "type": "integer",
+                    "description": "Snapshot version to compare to. Defaults to the latest version."
+                }
+            }
+        }
+    },
+    {
+        "name": "inventory_query",
+        "description": "Look up devices in the local inventory with a selector expression. Selectors combine field=value and field!=value tests on name, host, platform, site, role, tag and subnet with and/or/not and parentheses; values may be globs (platform=cisco_*) or comma separated alternatives (site=nyc,lon), and subnet takes a prefix (subnet=10.20.0.0/16). Returns the number of matches and the matching devices without credentials. Executed scripts can load the same devices, credentials included, with: from inventory import load_inventory; devices = load_inventory().netmiko_params('<selector>'), each entry being a ConnectHandler dictionary. Prefer this over asking the user for hosts and credentials.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "selector": {
+                    "type": "string",
+                    "description": "The selector, e.g. 'site=nyc and role=access and not tag=lab'. Empty selects every device."
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of devices to list. Defaults to 50; the total count is always returned."
+                }
+            }
+        }
+    },
+    {
+        "name": "compliance_check",
+        "description": "Check device configurations against compliance rules locally, without reading the configurations into the conversation. Rules are evaluated against the latest config snapshot of each device (snapshots are taken automatically whenever a script runs 'show running-config'), and only violations are returned, grouped by rule. Rules come from the local rules file, or can be passed inline. Rule fields: id, type ('required', 'forbidden' or 'threshold'), 'line' (exact line) or 'pattern' (regex), optional 'stanza' (regex on the stanza header, e.g. '^interface ', to check each matching stanza's lines), optional 'unless' (regex; skip stanzas containing a matching line, e.g. '^shutdown'), 'min_count' for required rules, 'min'/'max' for threshold rules (the pattern's first capture group is the number), optional 'platforms' (globs such as 'cisco_*') and 'severity' (low, medium, high, critical).",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "selector": {
+                    "type": "string",
+                    "description": "Inventory selector for the devices to check, e.g. 'site=nyc'. Defaults to every device with a config snapshot."
+                },
+                "hosts": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Explicit hosts to check instead of a selector."
+                },
+                "rules": {
+                    "type": "array",
+                    "items": {"type": "object"},
+                    "description": "Inline rules to evaluate instead of the rules file, e.g. [{\"id\": \"no-telnet\", \"type\": \"forbidden\", \"pattern\": \"transport input .*telnet\", \"stanza\": \"^line vty\", \"severity\": \"high\"}]."
+                },
+                "rule_ids": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Only evaluate these rule ids."
+                }
+            }
+        }
+    },
+    {
+        "name": "topology_query",
+        "description": "Answer questions about the network topology from the locally stored adjacency graph, instead of reading neighbor tables. The graph is updated automatically whenever an executed script runs 'show cdp neighbors [detail]' or 'show lldp neighbors [detail]', and device hostnames are learned from 'show running-config'. Queries: 'neighbors' (links of a node with local and remote interfaces), 'path' (shortest path from node to target, with the interfaces of each hop), 'blast_radius' (nodes that lose their path to root if node fails), 'summary' (size, connected components, best connected nodes).",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "enum": ["neighbors", "path", "blast_radius", "summary"],
+                    "description": "The kind of question."
+                },
+                "node": {
+                    "type": "string",
+                    "description": "Hostname or management address of the node the question is about."
+                },
+                "target": {
+                    "type": "string",
+                    "description": "Destination node for 'path'."
+                },
+                "root": {
+                    "type": "string",
+                    "description": "For 'blast_radius': the node that must stay reachable, e.g. the core or the WAN edge. Defaults to the best connected node."
                 }
             },
             "required": ["query"]
@@ -103,12 +309,83 @@ tools = [
     }
 ]
 
-async def execute_code(code: str, timeout: int = 10) -> Dict[str, Any]:
+# Which tools a turn is offered, see toolsets.ToolRegistry
+TOOL_METADATA = {
+    "execute_code": {"core": True},
+    "stop_process": {"core": True},
+    "read_file": {"core": True},
+    "list_files": {"core": True},
+    "read_multiple_files": {"intents": r"\bfiles\b|\blogs\b|\bconfigs\b|\bdirector(y|ies)\b"},
+    "tavily_search": {"intents": r"\bsearch|\bdocs?\b|documentation|best practice|how (do|to|can)|release notes|\bcve\b|advisor|\bbug\b|vendor|recommend",
+                      # No web research in the middle of pushing changes to devices
+                      "exclude": ("rollout",)},
+    "list_templates": {"intents": r"templat|library|\breuse|\bbackup|\baudit|\bstandard"},
+    "run_template": {"intents": r"templat|library|\breuse|\bbackup|\baudit|\bstandard"},
+    "rollout_config": {"intents": r"\broll ?outs?\b|\bdeploy|\bpush|\bapply|\bconfigur|\bchange|\bfleet|\bevery (switch|router|device)|\ball (the )?(switches|routers|devices)",
+                       # A batch session works on its own device only
+                       "exclude": ("batch",)},
+    "config_diff": {"intents": r"\bdiff|\bdrift|\bchanged\b|snapshot|\bcompare|\bprevious|\bhistory|\bbefore\b"},
+    "inventory_query": {"intents": r"inventor|\bdevices\b|\bsites?\b|\bfleet|\bswitches\b|\brouters\b|\bhosts\b|\bselector",
+                        "exclude": ("batch",)},
+    "compliance_check": {"intents": r"complian|\baudit|\bpolic(y|ies)|\bstandard|harden|\bcis\b|\bsecurity|\bbaseline"},
+    "topology_query": {"intents": r"topolog|neighbou?r|\bcdp\b|\blldp\b|\bpath\b|upstream|downstream|blast|\buplinks?\b|adjacen|connected to"},
+}
+
+tool_registry = ToolRegistry(tools, TOOL_METADATA)
+
+def condense_result(stdout, records, output_history=None, console: Console = console):
+    """Shrink the stdout of a run before it reaches the model, using the run's capture records."""
+    if output_history is not None:
+        # Re-polled show commands only carry what changed since the model last saw them
+        served = output_history.served
+        stdout = output_history.condense(stdout, records)
+        if output_history.served > served:
+            console.print(f"Sent {output_history.served - served} re-polled output(s) as deltas", style="bold green")
+    # Fleet-wide runs print the same output shape per device; send one per cluster
+    names = {host: [name for name in (topology.resolve(host),) if name and name != host]
+             for host in {record.get("host") for record in records} if host}
+    condensed = condense_output(stdout, records, names, store=store_output)
+    if len(condensed) < len(stdout):
+        console.print(f"Clustered repeated device outputs: {len(stdout)} -> {len(condensed)} characters", style="bold green")
+        stdout = condensed
+    return stdout
+
+async def execute_code(code: str, timeout: int = 10, console: Console = console, output_history=None, fresh: bool = False) -> Dict[str, Any]:
     process_id = str(uuid.uuid4())
     
     # Display the code before writing it to a file
     syntax = Syntax(code, "python", theme="monokai", line_numbers=True)
     console.print(Panel(syntax, title="Code to be executed", expand=False))
+
+    # Reject scripts that cannot run before paying for a conda process
+    preflight_warnings = []
+    preflight_errors = await asyncio.to_thread(check_script, code, preflight_warnings)
+    if preflight_errors:
+        return {
+            "stdout": "",
+            "stderr": "Pre-flight check failed, the script was not executed:\n" + "\n".join(preflight_errors),
+            "return_code": "preflight"
+        }
+    # Device-like dicts that may never reach ConnectHandler only warn
+    warnings = {"preflight_warnings": preflight_warnings} if preflight_warnings else {}
+    if preflight_warnings:
+        console.print("Pre-flight warnings:\n" + "\n".join(preflight_warnings), style="bold yellow")
+
+    # A read-only script that ran recently is answered from the result cache
+    read_only = not fresh and classify_script(code)[0]
+    digest = script_digest(code)
+    cached = await asyncio.to_thread(result_cache.get_script, digest) if read_only else None
+    if cached:
+        stdout, records, created = cached
+        age = int(time.time() - created)
+        console.print(f"Read-only script served from the result cache ({age}s old); nothing was executed", style="bold green")
+        return {
+            "stdout": condense_result(stdout, records, output_history, console),
+            "stderr": "",
+            "return_code": 0,
+            "cached": f"result of an identical run {age}s ago; pass fresh=true to run it again",
+            **warnings
+        }
     
     # Write the code to a temporary file
     with open(f"{process_id}.py", "w") as f:
@@ -116,17 +393,21 @@ async def execute_code(code: str, timeout: int = 10) -> Dict[str, Any]:
     
     console.print(f"Code written to file: {process_id}.py", style="bold green")
     
-    # Prepare the command to run the code
+    # Prepare the command to run the code; exec_runtime injects the learned
+    # timing profiles, records command round-trip times and answers
+    # read-only commands from the result cache
     if sys.platform == "win32":
-        command = f'conda run -n netmikoai python "{process_id}.py"'
+        command = f'{EXEC_PYTHON} -m exec_runtime "{process_id}.py"'
     else:
-        command = f'conda run -n netmikoai python {process_id}.py'
+        command = f'{EXEC_PYTHON} -m exec_runtime {process_id}.py'
+    capture_file = new_capture_file()
     
     # Create a process to run the command
     process = await asyncio.create_subprocess_shell(
         command,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
+        env=runtime_env(capture_file, use_cache=not fresh),
         shell=True
     )
     
@@ -136,6 +417,10 @@ async def execute_code(code: str, timeout: int = 10) -> Dict[str, Any]:
         stdout = stdout.decode()
         stderr = stderr.decode()
         return_code = process.returncode
+        records = await asyncio.to_thread(process_capture, capture_file)
+        if read_only and return_code == 0:
+            await asyncio.to_thread(result_cache.put_script, digest, stdout, records)
+        stdout = condense_result(stdout, records, output_history, console)
     except asyncio.TimeoutError:
         # If we timeout, it means the process is still running
         stdout = "Process started and running in the background."
@@ -145,28 +430,99 @@ async def execute_code(code: str, timeout: int = 10) -> Dict[str, Any]:
     return {
         "stdout": stdout,
         "stderr": stderr,
-        "return_code": return_code
+        "return_code": return_code,
+        **warnings
     }
 
 def stop_process(process_id: str) -> str:
     # Implement the stop_process logic here
     pass
 
-async def tavily_search(query: str) -> Dict[str, Any]:
-    # Implement the Tavily search functionality here
-    # For now, we'll return a placeholder message
-    return {"result": f"Tavily search results for query: {query}"}
+async def tavily_search(query: str, queries: List[str] = None) -> str:
+    all_queries = [query] + [q for q in (queries or []) if q != query]
+    return await search_many(all_queries)
+
+async def run_code(code: str, session=None, fresh: bool = False) -> Dict[str, Any]:
+    if session is None:
+        return await execute_code(code, fresh=fresh)
+    if session.device_pool is None:
+        return await execute_code(code, console=session.console, output_history=session.output_history, fresh=fresh)
+    host = session.device.get("host") if session.device else None
+    async with session.device_pool.connection(host):
+        return await execute_code(code, console=session.console, output_history=session.output_history, fresh=fresh)
+
+async def execute_and_analyze(code: str, session=None, fresh: bool = False):
+    execution_result = await run_code(code, session, fresh)
+    if execution_result["return_code"] == "preflight":
+        return execution_result, True
+    if "cached" in execution_result:
+        # The identical run was analyzed when it executed
+        return execution_result, False
+    analysis_task = asyncio.create_task(send_to_ai_for_executing(code, str(execution_result), session))
+    analysis = await analysis_task
+    if execution_result["return_code"] == 0:
+        template_id = script_library.add_script(code)
+        if template_id:
+            execution_result["template_id"] = template_id
+    return execution_result, False
 
-async def execute_tool(tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+async def execute_tool(tool_name: str, tool_input: Dict[str, Any], session=None) -> Dict[str, Any]:
     try:
         result = None
         is_error = False
 
         if tool_name == "execute_code":
-            execution_result = await execute_code(tool_input["code"])
-            analysis_task = asyncio.create_task(send_to_ai_for_executing(tool_input["code"], str(execution_result)))
-            analysis = await analysis_task
-            result = execution_result
+            result, is_error = await execute_and_analyze(tool_input["code"], session, tool_input.get("fresh", False))
+        elif tool_name == "list_templates":
+            result = script_library.describe(script_library.find(tool_input.get("query", "")))
+        elif tool_name == "run_template":
+            code = script_library.render(tool_input["template_id"], tool_input["params"])
+            result, is_error = await execute_and_analyze(code, session, tool_input.get("fresh", False))
+            if not is_error:
+                script_library.record_use(tool_input["template_id"])
+        elif tool_name == "rollout_config":
+            devices = tool_input.get("devices") or []
+            if tool_input.get("selector"):
+                devices = devices + device_inventory.netmiko_params(tool_input["selector"])
+            if not devices:
+                return {"content": "No target devices: give a selector that matches inventory devices, or a devices list.", "is_error": True}
+            report = await run_rollout(
+                devices,
+                tool_input["config_commands"],
+                verify_command=tool_input.get("verify_command"),
+                verify_expect=tool_input.get("verify_expect"),
+                **{key: tool_input[key] for key in ("max_parallel", "failure_threshold", "canary_size", "save_config") if key in tool_input}
+            )
+            display_rollout_report(report)
+            for host in list(report["succeeded"]) + list(report["failed"]):
+                result_cache.invalidate(host)
+            result = format_rollout_report(report)
+            is_error = report["status"] != "completed"
+        elif tool_name == "inventory_query":
+            selector = tool_input.get("selector", "")
+            result = format_devices(device_inventory.select(selector, limit=tool_input.get("limit", 50)), device_inventory.count(selector))
+            if device_inventory.errors:
+                result += "\n" + "\n".join(f"Inventory source {path} failed to load: {error}" for path, error in device_inventory.errors.items())
+        elif tool_name == "compliance_check":
+            specs = tool_input.get("rules") or load_rules()
+            if tool_input.get("rule_ids"):
+                specs = [spec for spec in specs if spec.get("id") in tool_input["rule_ids"]]
+            if not specs:
+                return {"content": "No compliance rules to evaluate: pass inline rules or add them to the rules file.", "is_error": True}
+            hosts = tool_input.get("hosts")
+            platforms = {}
+            if tool_input.get("selector"):
+                devices = device_inventory.select(tool_input["selector"])
+                hosts = [device.host for device in devices]
+                platforms = {device.host: device.platform for device in devices}
+            else:
+                for device in device_inventory.select():
+                    platforms[device.host] = device.platform
+            result = await asyncio.to_thread(check_compliance, specs, hosts, platforms)
+        elif tool_name == "topology_query":
+            result = topology_query(tool_input["query"], tool_input.get("node"), tool_input.get("target"), tool_input.get("root"))
+        elif tool_name == "config_diff":
+            result = await asyncio.to_thread(config_diff, tool_input.get("hosts"), tool_input.get("from_version"), tool_input.get("to_version"))
         elif tool_name == "stop_process":
             result = stop_process(tool_input["process_id"])
         elif tool_name == "read_file":
@@ -176,7 +532,7 @@ async def execute_tool(tool_name: str, tool_input: Dict[str, Any]) -> Dict[str,
         elif tool_name == "list_files":
             result = list_files(tool_input.get("path", "."))
         elif tool_name == "tavily_search":
-            result = await tavily_search(tool_input["query"])
+            result = await tavily_search(tool_input["query"], tool_input.get("queries"))
         else:
             is_error = True
             result = f"Unknown tool: {tool_name}"
@@ -196,17 +552,23 @@ async def execute_tool(tool_name: str, tool_input: Dict[str, Any]) -> Dict[str,
             "is_error": True
         }
 
-async def send_to_ai_for_executing(code, execution_result):
+async def send_to_ai_for_executing(code, execution_result, session=None):
+    analysis_mode = session.analysis_mode if session else ANALYSIS_MODE
+    limiter = session.limiter if session else shared_limiter
     try:
-        response = client.messages.create(
-            model=CODEEXECUTIONMODEL,
-            max_tokens=2000,
+        request = dict(
             system="",
             messages=[
                 {"role": "user", "content": f"Analyze this Netmiko script execution from the 'code_execution_env' virtual environment:\n\nScript:\n{code}\n\nExecution Result:\n{execution_result}"}
             ]
         )
-        update_token_usage("code_execution", response.usage.input_tokens, response.usage.output_tokens)
+        # Message batches are not recorded, so cassette runs analyse interactively
+        if analysis_mode == "batch" and not API_CASSETTE_MODE:
+            model, max_tokens = route("code_execution")[0]
+            custom_id = analysis_queue.enqueue(dict(request, model=model, max_tokens=max_tokens),
+                                               {"host": session.device.get("host") if session and session.device else None})
+            return f"Analysis queued for batch processing as {custom_id}"
+        response = await create_routed(limiter, "code_execution", **request)
         return response
     except Exception as e:
         return f"Error sending to AI for executing: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,118 @@
+import json
+import re
+
+from config import TOOLSET_SELECTION, TOOLSET_INTENT_TURNS, TOOLSET_STICKY_TURNS, CONTINUATION_PROMPT
+
+# Requests that put the session in a mode, besides the tools it uses
+MODE_INTENTS = {
+    "rollout": re.compile(r"\broll ?outs?\b|\bdeploy|\bpush(ing)?\b.*\b(config|change)", re.I),
+}
+
+def schema_tokens(tool):
+    """Estimated tokens of one tool definition, at four characters per token as the API limiter counts."""
+    return len(json.dumps(tool)) // 4 + 1
+
+def _text(message):
+    content = message["content"]
+    if isinstance(content, str):
+        return content
+    return "\n".join(block.get("text", "") for block in content if block.get("type") == "text")
+
+def _tool_uses(message):
+    content = message["content"]
+    if isinstance(content, str):
+        return []
+    return [block["name"] for block in content if block.get("type") == "tool_use"]
+
+class ToolRegistry:
+    """
+    Tool definitions with per-tool metadata, and the choice of which of
+    them to send with each turn.
+
+    Metadata per tool name:
+      core     always exposed
+      intents  regex over the recent user turns and the last reply that
+               exposes the tool (its own name always matches too)
+      exclude  modes in which the tool is never offered
+
+    Modes are 'automode', 'batch' (a session bound to one device) and
+    'rollout' (a rollout was asked for or ran in the last
+    TOOLSET_INTENT_TURNS turns). The choice is made once per turn and kept
+    for its whole tool loop, exposed tools stay for TOOLSET_STICKY_TURNS
+    turns, tools already used in the history stay while it is sent (even
+    in a mode that excludes them), and the selection keeps the order of
+    the full list, so the tools prefix of a request only changes when the
+    set does.
+    """
+
+    def __init__(self, tools, metadata, enabled=TOOLSET_SELECTION):
+        self.tools = tools
+        self.metadata = metadata
+        self.enabled = enabled
+        self.intents = {tool["name"]: re.compile(rf"\b{tool['name']}\b" + (f"|{metadata[tool['name']]['intents']}"
+                                                                          if metadata.get(tool["name"], {}).get("intents") else ""), re.I)
+                        for tool in tools}
+        self.tokens = {tool["name"]: schema_tokens(tool) for tool in tools}
+        self.full_tokens = sum(self.tokens.values())
+        self.stats = {"requests": 0, "tokens": 0}
+
+    def modes(self, session, recent, recent_used):
+        modes = set()
+        if session.automode:
+            modes.add("automode")
+        if session.device:
+            modes.add("batch")
+        if "rollout_config" in recent_used or MODE_INTENTS["rollout"].search(recent):
+            modes.add("rollout")
+        return modes
+
+    def select(self, session, user_input):
+        """Tool definitions for the turn that starts with user_input."""
+        if not self.enabled:
+            return self.tools
+        history = session.conversation_history
+        starts = [index for index, message in enumerate(history)
+                  if message["role"] == "user" and isinstance(message["content"], str) and message["content"] != CONTINUATION_PROMPT]
+        turns = [_text(history[index]) for index in starts]
+        replies = [_text(message) for message in history if message["role"] == "assistant"]
+        recent = "\n".join(turns[-(TOOLSET_INTENT_TURNS - 1):] if TOOLSET_INTENT_TURNS > 1 else [])
+        recent += "\n" + user_input + "\n" + (replies[-1] if replies else "")
+        used = {name for message in history for name in _tool_uses(message)}
+        # Modes follow the same recent turns as intents, so one rollout does not change the rest of the session
+        since = (starts[-(TOOLSET_INTENT_TURNS - 1):] or [len(history)])[0] if TOOLSET_INTENT_TURNS > 1 else len(history)
+        recent_used = {name for message in history[since:] for name in _tool_uses(message)}
+        modes = self.modes(session, recent, recent_used)
+
+        exposed = session.exposed_tools
+        for name in list(exposed):
+            exposed[name] -= 1
+            if exposed[name] <= 0:
+                del exposed[name]
+        selected = []
+        for tool in self.tools:
+            name = tool["name"]
+            meta = self.metadata.get(name, {})
+            if modes & set(meta.get("exclude", ())):
+                exposed.pop(name, None)
+                # A tool the history already calls keeps its definition
+                if name in used:
+                    selected.append(tool)
+                continue
+            if meta.get("core") or self.intents[name].search(recent):
+                exposed[name] = TOOLSET_STICKY_TURNS
+            if name in exposed or name in used:
+                selected.append(tool)
+        return selected
+
+    def record(self, selected):
+        """Count the schema tokens of one request."""
+        self.stats["requests"] += 1
+        self.stats["tokens"] += sum(self.tokens[tool["name"]] for tool in selected)
+
+    def summary(self):
+        """Short summary for the usage display, or '' before any request."""
+        if not self.enabled or not self.stats["requests"]:
+            return ""
+        average = self.stats["tokens"] / self.stats["requests"]
+        return (f"Tool schemas: {average:,.0f} of {self.full_tokens:,} tokens per request on average "
+                f"({1 - average / self.full_tokens:.0%} saved over {self.stats['requests']} requests)")
@@ -0,0 +1,372 @@
+import ipaddress
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from exec_runtime import CONFIG_COMMAND_PATTERN, NEIGHBOR_COMMAND_PATTERN
+from config import TOPOLOGY_FILE
+
+# Lines that start a new neighbor entry in detail output (CDP, IOS/EOS LLDP)
+_ENTRY_START = re.compile(r"^\s*(Device ID\s*:|Local Intf\s*:|Interface\s+\S+\s+detected\s+\d+)", re.I)
+_SEPARATOR = re.compile(r"^\s*-{5,}\s*$")
+_P = r"^\s*(?:-\s*)?"  # EOS prefixes some detail lines with "- "
+_FIELDS = {
+    "name": [re.compile(_P + r"Device ID\s*:\s*(\S+)", re.I | re.M),
+             re.compile(_P + r"System Name\s*:\s*\"?([^\"\s]+)", re.I | re.M)],
+    "local": [re.compile(_P + r"Interface\s*:\s*([^,\s]+)", re.I | re.M),
+              re.compile(_P + r"Local Intf\s*:\s*(\S+)", re.I | re.M),
+              re.compile(_P + r"Local Port id\s*:\s*(\S+)", re.I | re.M),
+              re.compile(_P + r"Interface\s+(\S+)\s+detected", re.I | re.M)],
+    "remote": [re.compile(r"Port ID \(outgoing port\)\s*:\s*(\S+)", re.I),
+               re.compile(_P + r"Port id\s*:\s*\"?([^\"\s]+)", re.I | re.M)],
+    "ip": [re.compile(_P + r"(?:IP(?:v4)? address|IP|Management Address(?:es)?)\s*:\s*(?:ip\s+)?(\d+\.\d+\.\d+\.\d+)", re.I | re.M)],
+    "platform": [re.compile(_P + r"Platform\s*:\s*([^,\n]+)", re.I | re.M)],
+}
+# Column headers of the brief (table) formats, mapped to fields
+_COLUMNS = {
+    "device id": "name", "system name": "name",
+    "local intrfce": "local", "local intf": "local", "local interface": "local",
+    "port id": "remote", "port info": "remote",
+}
+_HEADER = re.compile(r"^(?=.*(device id|system name))(?=.*(local intrfce|local intf|local interface)).*$", re.I | re.M)
+# The footer of a neighbor listing with no entries ("Total cdp entries displayed : 0")
+_NO_ENTRIES = re.compile(r"^\s*total\s+(?:cdp\s+|lldp\s+)?(?:entries|neighbors)(?:\s+displayed)?\s*:\s*0\s*$", re.I | re.M)
+
+def normalize_node(name):
+    """Canonical node id: lower case, without domain or a trailing (serial)."""
+    name = re.sub(r"\(.*\)$", "", name.strip()).lower()
+    try:
+        ipaddress.ip_address(name)
+        return name
+    except ValueError:
+        return name.split(".")[0]
+
+def normalize_interface(name):
+    """Canonical interface id, so 'Gi1/0/1', 'Gig 1/0/1' and 'GigabitEthernet1/0/1' match."""
+    name = name.strip().replace(" ", "")
+    if re.match(r"^[a-z]{2}-\d", name, re.I):
+        return name.lower()
+    match = re.match(r"^([A-Za-z-]+?)(\d.*)$", name)
+    if not match:
+        return name.lower()
+    return match.group(1)[:2].lower() + match.group(2)
+
+def _first(block, field):
+    for pattern in _FIELDS[field]:
+        match = pattern.search(block)
+        if match:
+            return match.group(1).strip()
+    return None
+
+def _parse_table(output):
+    """Parse a brief neighbor table by the column positions of its header line."""
+    header = _HEADER.search(output)
+    header_line = header.group(0)
+    # Columns are separated by two or more spaces; names may contain one
+    columns = [(m.group(0).lower(), m.start()) for m in re.finditer(r"\S+(?: \S+)*", header_line)]
+    fields = [_COLUMNS.get(name) for name, _ in columns]
+    entries = []
+    carried = None
+    for line in output[header.end():].splitlines():
+        if not line.strip() or line.lower().startswith("total"):
+            continue
+        # Values may start a little left of their header; move each cut to the start of the token it splits
+        cuts = []
+        for _, start in columns:
+            while 0 < start < len(line) and not line[start - 1].isspace():
+                start -= 1
+            cuts.append(start)
+        row = {}
+        for i, field in enumerate(fields):
+            if field:
+                end = cuts[i + 1] if i + 1 < len(cuts) else None
+                row[field] = line[cuts[i]:end].strip()
+        if row.get("name") and not row.get("local"):
+            # A long device id on its own line, with the rest of the row below
+            carried = row["name"]
+            continue
+        if carried and not row.get("name"):
+            row["name"] = carried
+        carried = None
+        if row.get("name") and row.get("local") and row.get("remote"):
+            entries.append({"name": row["name"], "local": row["local"], "remote": row["remote"]})
+    return entries
+
+def parse_neighbors(output):
+    """
+    Parse CDP/LLDP neighbor output (detail or brief tables, IOS, NX-OS, EOS
+    and Junos style) into a list of {name, local, remote, ip, platform}.
+    """
+    entries = []
+    blocks = []
+    current = []
+    for line in output.splitlines():
+        if _SEPARATOR.match(line) or _ENTRY_START.match(line):
+            if current:
+                blocks.append("\n".join(current))
+            current = [] if _SEPARATOR.match(line) else [line]
+        elif re.match(r"^\s*Chassis id\s*:", line, re.I) and any(re.match(r"^\s*Chassis id\s*:", l, re.I) for l in current):
+            blocks.append("\n".join(current))
+            current = [line]
+        else:
+            current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+    for block in blocks:
+        entry = {field: _first(block, field) for field in _FIELDS}
+        if entry["name"] and entry["local"] and entry["remote"]:
+            entries.append(entry)
+    if not entries and _HEADER.search(output):
+        entries = _parse_table(output)
+    return entries
+
+def is_empty_listing(output):
+    """Whether output is a neighbor listing that genuinely has no entries."""
+    return bool(_HEADER.search(output) or _NO_ENTRIES.search(output))
+
+class TopologyGraph:
+    """
+    Adjacency graph built from neighbor output.
+
+    Every device that reported neighbors keeps its own list of links; the
+    undirected adjacency is the union of those reports, reference counted,
+    so new output from a device only replaces that device's links. Devices
+    are identified by hostname; the address used to connect and neighbor
+    management addresses are kept as aliases. The reports are persisted as
+    JSON and the adjacency is rebuilt from them on load.
+    """
+
+    def __init__(self, path=TOPOLOGY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        data = self._load()
+        self.aliases = data.get("aliases", {})
+        self.nodes = data.get("nodes", {})
+        self.reports = data.get("reports", {})
+        self._rebuild()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"aliases": self.aliases, "nodes": self.nodes, "reports": self.reports}, f)
+        os.replace(tmp_path, self.path)
+
+    def _rebuild(self):
+        self.adjacency = {}
+        for reporter, report in self.reports.items():
+            self._link(reporter, report["links"], 1)
+
+    def _link(self, reporter, links, delta):
+        for local_if, neighbor, remote_if in links:
+            for a, b, key in ((reporter, neighbor, (local_if, remote_if)), (neighbor, reporter, (remote_if, local_if))):
+                counter = self.adjacency.setdefault(a, {}).setdefault(b, Counter())
+                counter[key] += delta
+                if counter[key] <= 0:
+                    del counter[key]
+                if not counter:
+                    del self.adjacency[a][b]
+
+    def resolve(self, name):
+        """Node id for a hostname, FQDN or address, or None."""
+        if not name:
+            return None
+        if name in self.adjacency or name in self.nodes:
+            return name
+        if name in self.aliases:
+            return self.aliases[name]
+        node = normalize_node(name)
+        if node in self.adjacency or node in self.nodes:
+            return node
+        return self.aliases.get(node)
+
+    def _alias(self, alias, node):
+        """Record that alias (an address) names node, merging a node that was only known by the alias."""
+        if not alias or alias == node or self.aliases.get(alias) == node:
+            return False
+        self.aliases[alias] = node
+        merged = False
+        if alias in self.reports:
+            report = self.reports.pop(alias)
+            self.reports.setdefault(node, report)
+            merged = True
+        for report in self.reports.values():
+            for link in report["links"]:
+                if link[1] == alias:
+                    link[1] = node
+                    merged = True
+        if alias in self.nodes:
+            self.nodes.setdefault(node, {}).update(self.nodes.pop(alias))
+        return merged
+
+    def _update(self, host, entries, seen):
+        reporter = self.resolve(host) or normalize_node(host)
+        self.nodes.setdefault(reporter, {})
+        if host != reporter:
+            self.aliases[host] = reporter
+        rebuild = False
+        links = []
+        for entry in entries:
+            neighbor = normalize_node(entry["name"])
+            info = self.nodes.setdefault(neighbor, {})
+            if entry.get("ip"):
+                info["ip"] = entry["ip"]
+                rebuild |= self._alias(entry["ip"], neighbor)
+            if entry.get("platform"):
+                info["platform"] = entry["platform"]
+            links.append([normalize_interface(entry["local"]), neighbor, normalize_interface(entry["remote"])])
+        old = self.reports.get(reporter, {}).get("links", [])
+        self.reports[reporter] = {"seen": seen or time.time(), "links": links}
+        if rebuild:
+            self._rebuild()
+        else:
+            self._link(reporter, old, -1)
+            self._link(reporter, links, 1)
+
+    def _learn_hostname(self, host, hostname):
+        node = normalize_node(hostname)
+        self.nodes.setdefault(node, {})
+        if self._alias(host, node):
+            self._rebuild()
+
+    def update(self, host, entries, seen=None):
+        """Replace the links reported by host with the parsed neighbor entries."""
+        with self._lock:
+            self._update(host, entries, seen)
+            self._save()
+
+    def learn_hostname(self, host, hostname):
+        with self._lock:
+            self._learn_hostname(host, hostname)
+            self._save()
+
+    def ingest(self, records):
+        """
+        Fold the neighbor tables (and hostnames from configs) captured during
+        a run into the graph, saving it once. Output that yields no neighbors
+        only clears a device's links when it is recognisably an empty
+        listing, not an error such as "% CDP is not enabled".
+        """
+        updated = 0
+        changed = False
+        with self._lock:
+            for record in records:
+                host = record.get("host")
+                command = record.get("command") or ""
+                if not host or "output" not in record:
+                    continue
+                if CONFIG_COMMAND_PATTERN.match(command):
+                    match = re.search(r"^(?:hostname|host-name|set system host-name)\s+\"?([^\"\s;]+)", record["output"], re.M)
+                    if match:
+                        self._learn_hostname(host, match.group(1))
+                        changed = True
+                elif NEIGHBOR_COMMAND_PATTERN.match(command):
+                    entries = parse_neighbors(record["output"])
+                    if not entries and not is_empty_listing(record["output"]):
+                        continue
+                    self._update(host, entries, record.get("ts"))
+                    changed = True
+                    updated += 1
+            if changed:
+                self._save()
+        return updated
+
+    def neighbors(self, node):
+        return sorted((neighbor, sorted(links)) for neighbor, links in self.adjacency.get(node, {}).items())
+
+    def _bfs(self, start, removed=None):
+        parents = {start: None}
+        queue = deque([start])
+        while queue:
+            current = queue.popleft()
+            for neighbor in self.adjacency.get(current, {}):
+                if neighbor not in parents and neighbor != removed:
+                    parents[neighbor] = current
+                    queue.append(neighbor)
+        return parents
+
+    def shortest_path(self, source, target):
+        """Shortest path by hop count as a list of nodes, or None."""
+        parents = self._bfs(source)
+        if target not in parents:
+            return None
+        path = [target]
+        while parents[path[-1]] is not None:
+            path.append(parents[path[-1]])
+        return path[::-1]
+
+    def blast_radius(self, node, root=None):
+        """
+        Nodes that lose their path to root if node fails. root defaults to
+        the best connected other node. Returns (root, cut off nodes).
+        """
+        if root is None:
+            candidates = [(len(links), other) for other, links in self.adjacency.items() if other != node]
+            if not candidates:
+                return None, []
+            root = max(candidates)[1]
+        reachable = self._bfs(root, removed=node)
+        return root, sorted(other for other in self.adjacency if other not in reachable and other != node)
+
+    def components(self):
+        seen = set()
+        components = []
+        for node in self.adjacency:
+            if node not in seen:
+                component = set(self._bfs(node))
+                seen |= component
+                components.append(component)
+        return components
+
+topology = TopologyGraph()
+
+def topology_query(query, node=None, target=None, root=None):
+    """Text answer to a topology_query tool call."""
+    graph = topology
+    if query == "summary":
+        edges = sum(len(neighbors) for neighbors in graph.adjacency.values()) // 2
+        components = sorted(graph.components(), key=len, reverse=True)
+        top = sorted(graph.adjacency, key=lambda n: -len(graph.adjacency[n]))[:5]
+        return (f"{len(graph.adjacency)} nodes, {edges} links, {len(components)} connected component(s) "
+                f"(largest {len(components[0]) if components else 0}); {len(graph.reports)} devices reported neighbors.\n"
+                f"Best connected: " + ", ".join(f"{n} ({len(graph.adjacency[n])})" for n in top))
+    resolved = graph.resolve(node)
+    if resolved is None:
+        return (f"Unknown node '{node}'. The graph is built from 'show cdp neighbors detail' / 'show lldp neighbors detail' "
+                "output of executed scripts; run those on the device first.")
+    if query == "neighbors":
+        neighbors = graph.neighbors(resolved)
+        lines = [f"{resolved}: {len(neighbors)} neighbor(s)"]
+        for neighbor, links in neighbors:
+            lines.append(f"  {neighbor}: " + ", ".join(f"{local} -> {remote}" for local, remote in links))
+        return "\n".join(lines)
+    if query == "path":
+        destination = graph.resolve(target)
+        if destination is None:
+            return f"Unknown target node '{target}'."
+        path = graph.shortest_path(resolved, destination)
+        if path is None:
+            return f"No path between {resolved} and {destination} in the known topology."
+        hops = []
+        for a, b in zip(path, path[1:]):
+            local, remote = sorted(graph.adjacency[a][b])[0]
+            hops.append(f"{a} {local} -> {remote} {b}")
+        return f"{len(path) - 1} hop(s): " + " | ".join(hops) if hops else f"{resolved} is the target."
+    if query == "blast_radius":
+        chosen_root, cut_off = graph.blast_radius(resolved, graph.resolve(root) if root else None)
+        if chosen_root is None:
+            return f"{resolved} has no other nodes to compare against."
+        direct = len(graph.adjacency.get(resolved, {}))
+        return (f"If {resolved} fails, {len(cut_off)} node(s) lose their path to {chosen_root} "
+                f"({direct} direct neighbor(s)): " + (", ".join(cut_off) or "none"))
+    return f"Unknown query '{query}'; use neighbors, path, blast_radius or summary."
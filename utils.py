@@ -1,52 +1,50 @@
-import base64
-from PIL import Image
-import io
 import os
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from rich.box import ROUNDED
 from datetime import datetime
-from models import get_total_token_usage, TOKEN_COST
+from models import get_total_token_usage
+from ratelimit import limiter
+from images import encode_image
+from journal import export_markdown
+from preflight import stats as preflight_stats
+from captures import result_cache
 
 console = Console()
 
 def encode_image_to_base64(image_path):
     try:
-        with Image.open(image_path) as img:
-            max_size = (1024, 1024)
-            img.thumbnail(max_size, Image.DEFAULT_STRATEGY)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='JPEG')
-            return base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
+        return encode_image(image_path)[1]
     except Exception as e:
         return f"Error encoding image: {str(e)}"
 
 def parse_goals(response):
-    import re
-    goals = re.findall(r'Goal \d+: (.+)', response)
-    return goals
-
-def execute_goals(goals):
-    # This function should be implemented based on your specific requirements
-    # It might involve calling the chat_with_claude function for each goal
-    pass
-
-def save_chat(conversation_history):
+    from goals import parse_plan
+    return [goal["text"] for goal in parse_plan(response)]
+
+async def execute_goals(goals, session, max_parallel=None):
+    """
+    Run the goals of a plan (a response with 'Goal N:' lines, or parsed
+    goals) as concurrent sub-sessions of session, following the
+    dependencies between them. Returns the results and the message that
+    merges them back into the main conversation.
+    """
+    # goals imports session, which imports this module
+    from goals import parse_plan, run_goals, merge_results
+    from config import GOAL_MAX_PARALLEL
+    if isinstance(goals, str):
+        goals = parse_plan(goals)
+    results = await run_goals(goals, session, max_parallel=max_parallel or GOAL_MAX_PARALLEL)
+    return results, merge_results(results)
+
+def save_chat(journal):
     now = datetime.now()
     filename = f"Chat_{now.strftime('%Y%m%d_%H%M%S')}.md"
-    
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write("# Netmiko AI Chat Log\n\n")
-        for message in conversation_history:
-            if message['role'] == 'user':
-                f.write(f"## User\n\n{message['content']}\n\n")
-            elif message['role'] == 'assistant':
-                f.write(f"## Assistant\n\n{message['content']}\n\n")
-    
-    return filename
+    journal.sync()
+    if not os.path.exists(journal.path):
+        raise FileNotFoundError("Nothing has been recorded in this session yet")
+    return export_markdown(journal.path, filename)
 
 def read_file(path):
     try:
@@ -87,26 +85,32 @@ def display_token_usage():
     table.add_column("Input", style="magenta")
     table.add_column("Output", style="magenta")
     table.add_column("Total", style="green")
+    table.add_column("Calls", style="cyan")
+    table.add_column("Avg (s)", style="cyan")
     table.add_column("Cost ($)", style="red")
 
     token_usage = get_total_token_usage()
     total_cost = 0
+    total_latency = 0
 
     for model, tokens in token_usage.items():
         input_tokens = tokens['input']
         output_tokens = tokens['output']
         total_tokens = input_tokens + output_tokens
 
-        input_cost = (input_tokens / 1_000_000) * TOKEN_COST[model]["input"]
-        output_cost = (output_tokens / 1_000_000) * TOKEN_COST[model]["output"]
-        model_cost = input_cost + output_cost
+        # Cost is accumulated per call at the price of the model that served it
+        model_cost = tokens['cost']
         total_cost += model_cost
+        total_latency += tokens['latency']
+        average_latency = tokens['latency'] / tokens['calls'] if tokens['calls'] else 0
 
         table.add_row(
             model.replace("MODEL", "").capitalize(),
             f"{input_tokens:,}",
             f"{output_tokens:,}",
             f"{total_tokens:,}",
+            f"{tokens['calls']:,}",
+            f"{average_latency:.2f}",
             f"${model_cost:.4f}"
         )
 
@@ -115,8 +119,24 @@ def display_token_usage():
         "",
         "",
         "",
+        "",
+        f"{total_latency:.1f} total",
         f"${total_cost:.4f}",
         style="bold"
     )
 
+    caption = []
+    if limiter.stats["retries"] or limiter.stats["wait_seconds"]:
+        caption.append(f"API retries: {limiter.stats['retries']}, throttled wait: {limiter.stats['wait_seconds']:.1f}s")
+    if preflight_stats["spawns_avoided"]:
+        caption.append(f"Pre-flight: {preflight_stats['spawns_avoided']}/{preflight_stats['checked']} executions rejected before spawning")
+    if result_cache.hit_rates():
+        caption.append(result_cache.hit_rates())
+    # tools imports this module
+    from tools import tool_registry
+    if tool_registry.summary():
+        caption.append(tool_registry.summary())
+    if caption:
+        table.caption = "\n".join(caption)
+
     console.print(table)
\ No newline at end of file
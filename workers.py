@@ -0,0 +1,24 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from config import WORKER_PROCESSES, PARALLEL_MIN_ITEMS
+
+_pool = None
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=WORKER_PROCESSES)
+    return _pool
+
+def parallel_map(func, items, min_items=PARALLEL_MIN_ITEMS):
+    """
+    Return [func(item) for item in items], spread over the shared process
+    pool when there are at least min_items items. func must be a module-level
+    function so it can be pickled; small inputs run in-process because
+    shipping them to workers costs more than it saves.
+    """
+    items = list(items)
+    if len(items) < min_items or WORKER_PROCESSES <= 1:
+        return [func(item) for item in items]
+    chunksize = max(1, len(items) // (WORKER_PROCESSES * 4))
+    return list(get_pool().map(func, items, chunksize=chunksize))